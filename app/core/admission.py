@@ -0,0 +1,226 @@
+"""基于预计完成时间的准入控制"""
+import math
+import re
+import threading
+import uuid
+from typing import Any, Optional
+
+from app.core.config import settings
+from app.core.metrics import ADMISSION_REJECTIONS
+from app.core.request_queue import PRIORITY_BATCH, PRIORITY_CLASSES, PRIORITY_INTERACTIVE
+from app.services.text_frontend import text_frontend
+
+_CJK = re.compile(r"[\u3400-\u9fff]")
+_NON_SPACE = re.compile(r"\S")
+
+# 非中文字符（拉丁字母、数字等）折算为中文字符的发音时长比例
+_LATIN_UNIT = 0.35
+# 每个中文字符的默认音频时长（秒，语速 1.0）
+_DEFAULT_AUDIO_PER_UNIT = 0.24
+# 使用音色自身估计前需要的最少样本数
+_MIN_VOICE_SAMPLES = 3
+
+
+def text_units(text: str) -> float:
+    """文本的发音长度单位：中文字符计 1，其余非空白字符按比例折算"""
+    cjk = len(_CJK.findall(text))
+    other = len(_NON_SPACE.findall(text)) - cjk
+    return cjk + other * _LATIN_UNIT
+
+
+class AdmissionRejected(Exception):
+    """预计完成时间超出 SLO，请求被拒绝"""
+
+    def __init__(self, estimated_completion: float, slo: float):
+        self.estimated_completion = estimated_completion
+        self.slo = slo
+        self.retry_after = max(1, math.ceil(estimated_completion - slo))
+        super().__init__(
+            f"服务繁忙：预计 {estimated_completion:.0f} 秒后才能完成（上限 {slo:.0f} 秒），"
+            f"请 {self.retry_after} 秒后重试"
+        )
+
+
+class QueueFull(AdmissionRejected):
+    """等待队列条数已达上限"""
+
+    def __init__(self, max_size: int, estimated_wait: float):
+        self.estimated_completion = estimated_wait
+        self.slo = 0.0
+        self.retry_after = max(1, math.ceil(estimated_wait))
+        Exception.__init__(self, f"队列已满（最大 {max_size}），请 {self.retry_after} 秒后重试")
+
+
+class _RateModel:
+    """单个音色的指数滑动平均：每单位文本的音频时长、实时率（所在批次的推理秒数 / 音频秒数）"""
+
+    def __init__(self, audio_per_unit: float, rtf: float):
+        self.audio_per_unit = audio_per_unit
+        self.rtf = rtf
+        self.samples = 0
+
+    def update(self, audio_per_unit: float, rtf: float, alpha: float):
+        if self.samples == 0:
+            self.audio_per_unit, self.rtf = audio_per_unit, rtf
+        else:
+            self.audio_per_unit += alpha * (audio_per_unit - self.audio_per_unit)
+            self.rtf += alpha * (rtf - self.rtf)
+        self.samples += 1
+
+
+class AdmissionController:
+    """
+    准入控制器
+
+    按规范化后的文本长度、语速和音色的滑动平均实时率估计每个请求的推理耗时，
+    累计已接纳但未完成请求的积压；新请求的预计完成时间（积压 / 并发槽位 + 自身耗时
+    + emotion=auto 的情感分析耗时）超过 SLO 时拒绝，而不是只看队列条数。
+    并发槽位 = 副本数 × 有效批大小，有效批大小按积压任务数估计，不超过 batch_size：
+    积压少时批次凑不满，吞吐按实际可合批的任务数计。
+    interactive 请求可以越过 batch 请求，因此只计 interactive 积压；batch 请求计全部积压。
+    空闲时（无积压）总是接纳，避免单个超长请求永远无法提交。
+    """
+
+    def __init__(
+        self,
+        slo_seconds: float,
+        batch_slo_seconds: float,
+        default_rtf: float = 0.5,
+        alpha: float = 0.2
+    ):
+        self.slo = {PRIORITY_INTERACTIVE: slo_seconds, PRIORITY_BATCH: batch_slo_seconds}
+        self.alpha = alpha
+        self.parallelism = 1
+        self.batch_size = 1
+        self._global = _RateModel(_DEFAULT_AUDIO_PER_UNIT, default_rtf)
+        self._voices: dict[str, _RateModel] = {}
+        self._sentiment_seconds = 0.0
+        self._backlog: dict[str, tuple[str, float, int]] = {}  # ticket -> (优先级, 预计推理秒数, 任务数)
+        self._lock = threading.Lock()
+        self.stats = {"admitted": 0, "rejected": 0}
+
+    def _model(self, voice_id: str) -> _RateModel:
+        model = self._voices.get(voice_id)
+        if model is None or model.samples < _MIN_VOICE_SAMPLES:
+            return self._global
+        return model
+
+    def estimate(self, text: str, voice_id: str, speed: float = 1.0) -> tuple[float, float]:
+        """
+        估计 (音频秒数, 推理秒数)；语速只影响音频时长，推理按原速音频计
+
+        text 为原始输入，按与推理相同的规则规范化后再计算长度，与 observe 的口径一致
+        """
+        model = self._model(voice_id)
+        base_audio = text_units(text_frontend.normalize(text)) * model.audio_per_unit
+        return base_audio / max(speed, 0.1), base_audio * model.rtf
+
+    @staticmethod
+    def _job_count(text: str) -> int:
+        """请求拆成的推理任务数（长文本按句切分后各段独立入队）"""
+        length = len(text_frontend.normalize(text))
+        if length <= settings.long_text_threshold:
+            return 1
+        return max(1, math.ceil(length / max(1, settings.stream_segment_max_chars)))
+
+    def _slots(self, jobs: int) -> float:
+        """同时推理的任务数：副本数 × 有效批大小"""
+        replicas = max(1, self.parallelism)
+        return replicas * min(max(1, self.batch_size), max(1.0, jobs / replicas))
+
+    def _wait_locked(self, priority: str) -> float:
+        entries = [
+            (cost, jobs) for p, cost, jobs in self._backlog.values()
+            if priority != PRIORITY_INTERACTIVE or p == PRIORITY_INTERACTIVE
+        ]
+        backlog = sum(cost for cost, _ in entries)
+        return backlog / self._slots(sum(jobs for _, jobs in entries))
+
+    def estimated_wait(self, priority: str = PRIORITY_INTERACTIVE) -> float:
+        """新请求开始推理前的预计等待秒数"""
+        with self._lock:
+            return self._wait_locked(priority)
+
+    def admit(
+        self,
+        text: str,
+        voice_id: str,
+        emotion: str = "default",
+        speed: float = 1.0,
+        priority: str = PRIORITY_INTERACTIVE,
+        enforce: bool = True
+    ) -> str:
+        """
+        接纳请求并登记其预计耗时，返回凭据（完成后调用 release）
+
+        Raises:
+            AdmissionRejected: enforce 为 True 且预计完成时间超出 SLO
+        """
+        _, cost = self.estimate(text, voice_id, speed)
+        jobs = self._job_count(text)
+        with self._lock:
+            wait = self._wait_locked(priority)
+            # 自身的多个片段可并行占用多个槽位
+            own = cost / max(1, min(jobs, max(1, self.parallelism) * max(1, self.batch_size)))
+            completion = wait + own + (self._sentiment_seconds if emotion == "auto" else 0.0)
+            slo = self.slo.get(priority, 0)
+            if enforce and slo > 0 and self._backlog and completion > slo:
+                self.stats["rejected"] += 1
+                ADMISSION_REJECTIONS.inc(priority=priority)
+                raise AdmissionRejected(completion, slo)
+            ticket = uuid.uuid4().hex
+            self._backlog[ticket] = (priority, cost, jobs)
+            self.stats["admitted"] += 1
+        return ticket
+
+    def release(self, ticket: Optional[str]):
+        if ticket is None:
+            return
+        with self._lock:
+            self._backlog.pop(ticket, None)
+
+    def observe(self, voice_id: str, text: str, audio_seconds: float, inference_seconds: float):
+        """
+        记录一次推理的实际结果
+
+        Args:
+            text: 实际推理的文本（规范化后再次规范化结果不变）
+            audio_seconds: 原速（speed=1.0）下的音频秒数
+            inference_seconds: 该任务所在批次的推理耗时（不按批大小分摊，批处理的收益由并发槽位体现）
+        """
+        units = text_units(text_frontend.normalize(text))
+        if units <= 0 or audio_seconds <= 0:
+            return
+        audio_per_unit = audio_seconds / units
+        rtf = inference_seconds / audio_seconds
+        with self._lock:
+            self._global.update(audio_per_unit, rtf, self.alpha)
+            model = self._voices.setdefault(voice_id, _RateModel(audio_per_unit, rtf))
+            model.update(audio_per_unit, rtf, self.alpha)
+
+    def observe_sentiment(self, seconds: float):
+        with self._lock:
+            self._sentiment_seconds += self.alpha * (seconds - self._sentiment_seconds)
+
+    def get_status(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "estimated_wait_by_priority": {
+                    priority: round(self._wait_locked(priority), 2) for priority in PRIORITY_CLASSES
+                },
+                "backlog_seconds": round(sum(cost for _, cost, _ in self._backlog.values()), 2),
+                "parallelism": self.parallelism,
+                "batch_size": self.batch_size,
+                "rtf": round(self._global.rtf, 3),
+                "audio_per_char": round(self._global.audio_per_unit, 3),
+                "slo_seconds": dict(self.slo),
+                **self.stats,
+            }
+
+
+# 全局单例
+admission = AdmissionController(
+    slo_seconds=settings.admission_slo_seconds,
+    batch_slo_seconds=settings.admission_batch_slo_seconds,
+    default_rtf=settings.admission_default_rtf
+)
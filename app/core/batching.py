@@ -0,0 +1,209 @@
+"""动态微批处理调度器"""
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+
+from app.core.metrics import DROPPED_JOBS, INFERENCE_SECONDS, QUEUE_WAIT_SECONDS
+from app.core.request_queue import QueueItem, TTSQueue
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求在截止时间前未能完成"""
+
+
+class InferenceJob:
+    """一次待推理的合成任务"""
+
+    def __init__(
+        self,
+        text: str,
+        ref_audio_path: str,
+        speed: float = 1.0,
+        temperature: float = 1.0,
+        top_p: float = 0.8,
+        top_k: int = 20,
+        repetition_penalty: float = 1.0,
+        request_id: Optional[str] = None,
+        seed: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ):
+        self.request_id = request_id or str(uuid.uuid4())
+        self.text = text
+        self.ref_audio_path = ref_audio_path
+        self.speed = speed
+        self.temperature = temperature
+        self.top_p = top_p
+        self.top_k = top_k
+        self.repetition_penalty = repetition_penalty
+        self.seed = seed
+        self.deadline = deadline  # 截止时间（time.time() 时间戳），None 表示不限
+        self.created_at = time.time()
+        self.queue_wait = 0.0  # 入队到被调度取出的等待时间（秒）
+        self.inference_seconds = 0.0  # 所在批次的推理耗时（秒）
+        self.batch_size = 1  # 所在批次的任务数
+        self.future: asyncio.Future = asyncio.get_event_loop().create_future()
+
+    @property
+    def batch_key(self) -> tuple:
+        """
+        采样参数（含随机种子）一致的任务才能合并为一个批次
+
+        模型按批次设置一次随机种子，带各自种子的任务（RESULT_CACHE_DETERMINISTIC）只能单独推理
+        """
+        return (self.temperature, self.top_p, self.top_k, self.repetition_penalty, self.seed)
+
+    @property
+    def expired(self) -> bool:
+        return self.deadline is not None and time.time() >= self.deadline
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        等待方已放弃（客户端断开、整体请求失败等导致 Future 被取消）或已过截止时间
+
+        推理线程在下发批次前、单条推理的每个自回归生成步骤（IndexTTS2 经 stopping_criteria）和后处理前检查该标志；
+        多任务批次（仅 MockIndexTTS）整批推理完成后才检查。副本进程中的任务不携带 Future，只检查截止时间
+        """
+        return (self.future is not None and self.future.done()) or self.expired
+
+    def __getstate__(self) -> dict[str, Any]:
+        # 发往副本进程时不携带 Future
+        state = self.__dict__.copy()
+        state["future"] = None
+        return state
+
+    def set_result(self, audio: np.ndarray):
+        if not self.future.done():
+            self.future.set_result(audio)
+
+    def set_exception(self, exc: BaseException):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+BatchDispatcher = Callable[[list[InferenceJob]], Awaitable[list[np.ndarray]]]
+
+
+class BatchScheduler:
+    """
+    动态微批处理调度器
+
+    从 TTSQueue 按优先级取出队首任务，并在 max_wait_ms 的窗口内继续收集
+    采样参数一致的后续任务（最多 max_batch_size 个），作为一次批量调用交给模型，
+    再把结果分发回各自等待的协程。max_batch_size 为 1 时退化为逐条串行推理。
+    concurrency 大于 1 时（多模型副本）同时运行多个调度协程，每个协程各自收集并下发批次。
+    """
+
+    def __init__(
+        self,
+        queue: TTSQueue,
+        dispatch: BatchDispatcher,
+        max_batch_size: int = 1,
+        max_wait_ms: int = 0,
+        concurrency: int = 1
+    ):
+        self.queue = queue
+        self._dispatch = dispatch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_ms = max(0, max_wait_ms)
+        self.concurrency = max(1, concurrency)
+        self._workers: list[asyncio.Task] = []
+        self.batches_dispatched = 0
+        self.jobs_dispatched = 0
+        self.jobs_dropped = 0
+
+    def ensure_running(self):
+        """按需启动后台调度协程"""
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        loop = asyncio.get_event_loop()
+        while len(self._workers) < self.concurrency:
+            self._workers.append(loop.create_task(self._run()))
+
+    @staticmethod
+    def _take(item: QueueItem) -> InferenceJob:
+        job: InferenceJob = item.payload
+        job.queue_wait = time.time() - item.created_at
+        QUEUE_WAIT_SECONDS.observe(job.queue_wait, priority=item.priority)
+        return job
+
+    async def _collect_batch(self) -> list[InferenceJob]:
+        first = self._take(await self.queue.get())
+        batch = [first]
+
+        if self.max_batch_size <= 1:
+            return batch
+
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            # 队首不兼容时立即结束收集，保持优先级和先来先服务顺序
+            item = await self.queue.get_matching(
+                lambda it: it.payload.batch_key == first.batch_key,
+                timeout=max(0.0, deadline - loop.time())
+            )
+            if item is None:
+                break
+            batch.append(self._take(item))
+        return batch
+
+    def _drop_stale(self, batch: list[InferenceJob]) -> list[InferenceJob]:
+        """丢弃等待方已放弃或已过截止时间的任务，不再交给模型"""
+        live = []
+        for job in batch:
+            if job.future.done():
+                DROPPED_JOBS.inc(reason="cancelled")
+            elif job.expired:
+                DROPPED_JOBS.inc(reason="deadline")
+                job.set_exception(DeadlineExceeded("请求在开始推理前已超过截止时间"))
+            else:
+                live.append(job)
+        if len(live) < len(batch):
+            self.jobs_dropped += len(batch) - len(live)
+            logger.info(f"丢弃 {len(batch) - len(live)} 个已取消或超时的任务")
+        return live
+
+    async def _run(self):
+        while True:
+            batch = self._drop_stale(await self._collect_batch())
+            if not batch:
+                continue
+
+            self.batches_dispatched += 1
+            self.jobs_dispatched += len(batch)
+            if len(batch) > 1:
+                logger.info(f"批量推理: {len(batch)} 个请求合并为一个批次")
+
+            try:
+                started = time.perf_counter()
+                try:
+                    results = await self._dispatch(batch)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    INFERENCE_SECONDS.observe(elapsed, batch_size=len(batch))
+                    for job in batch:
+                        job.inference_seconds = elapsed
+                        job.batch_size = len(batch)
+                if len(results) != len(batch):
+                    raise RuntimeError(f"批量推理返回 {len(results)} 个结果，期望 {len(batch)} 个")
+                for job, audio in zip(batch, results):
+                    job.set_result(audio)
+            except Exception as e:
+                for job in batch:
+                    job.set_exception(e)
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取调度统计"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "concurrency": self.concurrency,
+            "batches_dispatched": self.batches_dispatched,
+            "jobs_dispatched": self.jobs_dispatched,
+            "jobs_dropped": self.jobs_dropped,
+        }
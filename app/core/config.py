@@ -19,16 +19,74 @@ class Settings(BaseSettings):
     index_tts_repo_dir: Path = Path("./index-tts")
     generated_audio_dir: Path = Path("./generated_audio")
     char_dir: Path = Path("./char")
+    speaker_cache_dir: Path = Path("./cache/speaker_features")
+    result_cache_dir: Path = Path("./cache/results")
 
     # 模型配置
     model_name: str = "indextts-2.0"
     device: str = "auto"
     default_voice: str = "default.wav"
+    enable_speaker_feature_cache: bool = False  # 说话人特征持久化到磁盘，重启/多实例复用
+    speaker_cache_device_budget_mb: int = 2048  # 设备（显存）说话人缓存预算，超出按 LRU 转存到主机内存（IndexTTS2 不适用）
+    speaker_cache_host_budget_mb: int = 4096  # 主机内存说话人缓存预算，超出后丢弃
+    speaker_cache_pinned_voices: list[str] = []  # 常驻设备的音色/角色 ID
 
     # 音频配置
     sample_rate: int = 24000
     max_text_length: int = 5000
 
+    # 模型副本配置（单进程内多副本，替代多实例集群）
+    model_replicas: int = 1  # 模型副本数，大于 1 时每个副本运行在独立的工作进程中
+    replica_devices: list[str] = []  # 各副本使用的设备，如 ["cuda:0","cuda:1"]；为空时按 device 自动分配
+
+    # 准入控制配置（按预计完成时间而非队列条数拒绝请求）
+    admission_slo_seconds: float = 60.0  # interactive 请求预计完成时间上限（秒），超出返回 429；0 表示不限制
+    admission_batch_slo_seconds: float = 1800.0  # batch 优先级请求的上限（批量任务条目只登记、不拒绝）
+    admission_default_rtf: float = 0.5  # 尚无观测数据时假定的推理耗时与音频时长之比
+
+    # 取消配置
+    disconnect_check_interval: float = 0.5  # 非流式请求合成期间检查客户端是否断开的间隔（秒）
+
+    # 批处理配置
+    batch_max_size: int = 4  # 单批最大请求数（IndexTTS2 没有批量推理接口，自动为 1）
+    batch_max_wait_ms: int = 10  # 收集批次的最长等待时间（毫秒）
+
+    # 合成结果缓存配置（默认关闭：命中时返回上次的采样结果，相同请求不再有变化）
+    enable_result_cache: bool = False
+    result_cache_max_mb: int = 1024  # 磁盘占用上限，超出按 LRU 淘汰
+    # 以缓存键派生随机种子，保证缓存结果与重新合成一致；每个请求的种子不同，
+    # 开启后请求之间无法合并为一个推理批次，因此默认关闭
+    result_cache_deterministic: bool = False
+
+    # 批量任务配置
+    batch_jobs_db: Path = Path("./cache/batch_jobs.db")  # 批量任务状态库（SQLite）
+    batch_job_concurrency: int = 2  # 批量任务同时送入推理队列的条目数（所有批次共享）
+    batch_job_max_items: int = 10000  # 单个批次的最大条目数
+
+    # 编码配置
+    encoder_workers: int = 4  # 编码线程池大小（MP3/Opus 等编码在池中执行，不阻塞事件循环）
+
+    # 文本前端配置
+    enable_text_normalization: bool = True  # 合成前规范化文本（数字/日期/单位读法、全角转半角、折叠重复标点）
+    text_frontend_cache_size: int = 2048  # 规范化结果的 LRU 缓存条目数
+
+    # 请求追踪配置
+    request_trace_file: str = "request_traces.jsonl"  # 每个合成请求一行 JSON 阶段耗时记录（位于 logs_dir），留空关闭
+
+    # 分段合成配置
+    stream_segment_max_chars: int = 120  # 分句片段的最大字符数（流式与长文本分段共用）
+    long_text_threshold: int = 200  # 超过该字符数的非流式请求按句切分后并行合成
+    long_text_max_inflight: int = 8  # 单个长文本请求同时在队列中的片段数上限
+    segment_silence_ms: int = 150  # 片段拼接处插入的静音时长（毫秒），0 表示直接交叉淡化
+    segment_crossfade_ms: int = 10  # 片段拼接处的交叉淡化/淡入淡出时长（毫秒）
+
+    # 音色目录配置
+    catalogue_poll_interval: float = 5.0  # 未安装 watchfiles 时的目录轮询间隔（秒）
+
+    # 集群预热分片配置（与代理的音色粘性路由配合，实例只预热归属自己的音色）
+    warmup_shard_index: int = 0  # 本实例在集群中的序号（从 0 开始）
+    warmup_shard_count: int = 1  # 集群实例总数，1 表示预热全部音色
+
     # 上传配置
     max_upload_size: int = 50 * 1024 * 1024  # 50MB
     allowed_audio_formats: list[str] = [".wav"]
@@ -40,6 +98,13 @@ class Settings(BaseSettings):
     sentiment_llm_model: str = "gemini-1.5-flash"
     sentiment_labels: list[str] = ["happy", "sad", "angry", "fear", "surprise", "neutral", "default"]
     sentiment_timeout: int = 10  # LLM 请求超时时间（秒）
+    sentiment_backend: str = "llm"  # 分类后端: llm / lexicon(本地词典) / hybrid(词典优先，置信度低时请求 LLM)
+    sentiment_lexicon_min_confidence: float = 0.6  # hybrid 模式下直接采用词典结果的最低置信度
+    sentiment_batch_max_size: int = 8  # 单次 LLM 请求合并分析的最大文本数，1 表示逐条请求
+    sentiment_batch_wait_ms: int = 20  # 收集待分析文本的最长等待时间（毫秒）
+    sentiment_cache_size: int = 4096  # 情感标签缓存条目数（内存 LRU）
+    sentiment_cache_ttl: int = 7 * 24 * 3600  # 情感标签缓存有效期（秒）
+    sentiment_cache_path: str = "./cache/sentiment.db"  # 持久化缓存（SQLite），留空则只缓存在内存
 
     class Config:
         env_file = ".env"
@@ -6,14 +6,39 @@ import os
 import sys
 import time
 import uuid
-from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, AsyncIterator, Callable
 import torch
 import numpy as np
 import soundfile as sf
 
+from app.core.admission import QueueFull, admission
+from app.core.batching import BatchScheduler, DeadlineExceeded, InferenceJob
 from app.core.config import settings
+from app.core.metrics import (
+    AUDIO_SECONDS,
+    EMOTION_SECONDS,
+    MOCK_FALLBACKS,
+    QUEUE_REJECTIONS,
+    REALTIME_FACTOR,
+    RESAMPLE_SECONDS,
+    SPEED_ADJUST_SECONDS,
+)
+from app.core.replicas import ReplicaPool
+from app.core.request_queue import PRIORITY_INTERACTIVE, TTSQueue
+from app.core.speaker_cache import (
+    IndexTTS2SpeakerSlot,
+    SpeakerCacheManager,
+    SpeakerFeatureStore,
+    model_fingerprint,
+)
+from app.core.tracing import record_stage, trace_stage
+from app.services.catalogue import voice_catalogue
+from app.services.text_frontend import text_frontend
+from app.utils.audio import join_segments
+from app.utils.dsp import resample, time_stretch
+from app.utils.hashing import bytes_sha256, file_sha256
+from app.utils.hashring import affinity_key, shard_node_name, shard_ring
 
 logger = logging.getLogger(__name__)
 
@@ -21,71 +46,30 @@ logger = logging.getLogger(__name__)
 MAX_QUEUE_SIZE = 50
 
 
-class QueueItem:
-    """队列项"""
-    def __init__(self, request_id: str):
-        self.request_id = request_id
-        self.created_at = time.time()
-        self.status = "pending"  # pending, processing, completed, error
-
-
-class TTSQueue:
-    """TTS 请求队列管理器"""
-
-    def __init__(self, max_size: int = MAX_QUEUE_SIZE):
-        self.max_size = max_size
-        self._queue: OrderedDict[str, QueueItem] = OrderedDict()
-        self._lock = asyncio.Lock()
-        self._current_processing: Optional[str] = None
-
-    async def add(self, request_id: str) -> tuple[bool, int]:
-        """添加请求到队列，返回 (是否成功, 位置)"""
-        async with self._lock:
-            if len(self._queue) >= self.max_size:
-                return False, -1
-
-            item = QueueItem(request_id)
-            self._queue[request_id] = item
-            position = list(self._queue.keys()).index(request_id) + 1
-            return True, position
-
-    async def remove(self, request_id: str):
-        """从队列移除请求"""
-        async with self._lock:
-            if request_id in self._queue:
-                del self._queue[request_id]
-            if self._current_processing == request_id:
-                self._current_processing = None
-
-    async def set_processing(self, request_id: str):
-        """设置正在处理的请求"""
-        async with self._lock:
-            self._current_processing = request_id
-            if request_id in self._queue:
-                self._queue[request_id].status = "processing"
-
-    async def get_status(self) -> Dict[str, Any]:
-        """获取队列状态"""
-        async with self._lock:
-            return {
-                "queue_length": len(self._queue),
-                "max_queue_size": self.max_size,
-                "is_processing": self._current_processing is not None,
-                "current_processing": self._current_processing,
-                "can_submit": len(self._queue) < self.max_size,
-            }
-
-    async def get_position(self, request_id: str) -> int:
-        """获取请求在队列中的位置 (1-based), 如果不在队列中返回 -1"""
-        async with self._lock:
-            if request_id not in self._queue:
-                return -1
-            return list(self._queue.keys()).index(request_id) + 1
-
-
 # 全局队列实例
 tts_queue = TTSQueue(MAX_QUEUE_SIZE)
 
+# IndexTTS2 预热时用于触发特征计算的文本
+_WARMUP_TEXT = "你好。"
+
+
+def _stopping_criteria(should_stop: Callable[[], bool]) -> Optional[Any]:
+    """
+    在自回归生成的每一步检查 should_stop 的 transformers 停止条件
+
+    IndexTTS2.infer 把多余的关键字参数转交 GPT 的 generate()，任务被放弃后当前片段在下一个 token 处结束
+    """
+    try:
+        from transformers import StoppingCriteria, StoppingCriteriaList
+    except ImportError:
+        return None
+
+    class _Cancelled(StoppingCriteria):
+        def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> torch.Tensor:
+            return torch.full((input_ids.shape[0],), should_stop(), dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([_Cancelled()])
+
 
 class TTSModelEngine:
     """TTS 模型推理引擎（单例模式）"""
@@ -95,13 +79,34 @@ class TTSModelEngine:
         self.device = settings.device
         self.inference_lock = asyncio.Lock()  # 显存保护锁
         self.is_loaded = False
+        self._feature_store: Optional[SpeakerFeatureStore] = None
+        self._fingerprint: Optional[str] = None
+        self.speaker_cache: Optional[SpeakerCacheManager] = None
+        self.speaker_slot: Optional[IndexTTS2SpeakerSlot] = None
+        self.feature_cache_stats = {"loaded": 0, "computed": 0}
+        self.replicas: Optional[ReplicaPool] = None
+        self.scheduler = BatchScheduler(
+            tts_queue,
+            self._dispatch_batch,
+            max_batch_size=1,
+            max_wait_ms=settings.batch_max_wait_ms
+        )
 
-    def load_model(self):
-        """加载模型到 GPU"""
+    def load_model(self, warmup_files: Optional[list[Path]] = None):
+        """
+        加载模型到 GPU
+
+        warmup_files 为需要预热的参考音频，默认取音色目录中归属本实例的全部音频；
+        MODEL_REPLICAS 大于 1 时改为启动模型副本池
+        """
         if self.is_loaded:
             logger.info("模型已加载，跳过重复加载")
             return
 
+        if settings.model_replicas > 1 and warmup_files is None:
+            self._load_replicas()
+            return
+
         requested_device = self.device
         if requested_device == "auto":
             if torch.cuda.is_available():
@@ -207,33 +212,250 @@ class TTSModelEngine:
             except ImportError as ie:
                 logger.warning(f"无法导入 IndexTTS: {ie}")
                 logger.warning("回退到 Mock 模式（仅用于测试）")
+                MOCK_FALLBACKS.inc()
                 self.model = MockIndexTTS(self.device)
             except Exception as e:
                 logger.error(f"IndexTTS 加载失败: {e}")
                 logger.warning("回退到 Mock 模式（仅用于测试）")
+                MOCK_FALLBACKS.inc()
                 self.model = MockIndexTTS(self.device)
 
             self.is_loaded = True
-            logger.info("✓ 模型加载完成")
+            if not self._supports_batching():
+                # IndexTTS2 只有单条 infer()：调度器仍负责优先级、就绪跟踪与取消，推理逐条执行
+                logger.info(
+                    f"{type(self.model).__name__} 未提供批量推理接口，BATCH_MAX_SIZE 不生效，"
+                    f"批处理调度器逐条下发推理"
+                )
+            self.scheduler.max_batch_size = self._resolve_max_batch_size()
+            admission.batch_size = self.scheduler.max_batch_size
+            logger.info(f"✓ 模型加载完成 (批处理上限: {self.scheduler.max_batch_size})")
+
+            if SpeakerCacheManager.is_supported(self.model):
+                self.speaker_cache = SpeakerCacheManager(
+                    self.model,
+                    loader=self._warmup_voice,
+                    device_budget_bytes=settings.speaker_cache_device_budget_mb * 1024 * 1024,
+                    host_budget_bytes=settings.speaker_cache_host_budget_mb * 1024 * 1024,
+                    pinned_voices=settings.speaker_cache_pinned_voices
+                )
+            elif IndexTTS2SpeakerSlot.is_supported(self.model):
+                # IndexTTS2 只缓存最近使用的一个参考音频，磁盘特征缓存在推理前后读写这个槽位
+                self.speaker_slot = IndexTTS2SpeakerSlot(self.model)
+                logger.info(
+                    "IndexTTS2 显存中只保留最近使用的一个音色特征，"
+                    "说话人缓存预算 (SPEAKER_CACHE_DEVICE/HOST_BUDGET_MB, PINNED_VOICES) 不适用"
+                )
+            else:
+                logger.warning(
+                    f"{type(self.model).__name__} 未提供说话人特征导入/导出接口，"
+                    f"说话人显存缓存预算 (SPEAKER_CACHE_*) 不生效，已加载的音色特征不会被淘汰"
+                )
+                if settings.enable_speaker_feature_cache:
+                    logger.warning("磁盘特征缓存 (ENABLE_SPEAKER_FEATURE_CACHE) 同样不生效，音色每次启动重新计算")
 
             # 启动时预热所有角色的参考音频特征
-            self._warmup_all_voices()
+            self._warmup_all_voices(warmup_files)
 
         except Exception as e:
             logger.error(f"✗ 模型加载失败: {e}")
             raise RuntimeError(f"模型加载失败: {e}")
 
-    def _warmup_all_voices(self):
+    def _replica_devices(self) -> list[str]:
+        """各副本使用的设备：显式配置优先，否则多 GPU 时轮流分配"""
+        if settings.replica_devices:
+            return list(settings.replica_devices)
+        count = settings.model_replicas
+        if self.device == "auto" and torch.cuda.is_available() and torch.cuda.device_count() > 1:
+            return [f"cuda:{i % torch.cuda.device_count()}" for i in range(count)]
+        return [self.device] * count
+
+    def _load_replicas(self):
+        """启动模型副本池，每个副本在独立进程中加载模型并预热"""
+        devices = self._replica_devices()
+        logger.info(f"启动 {len(devices)} 个模型副本: {devices}")
+
+        warmup_files, skipped = self._warmup_targets()
+        if skipped:
+            logger.info(f"⏭️  非本分片音色 {skipped} 个，按需加载")
+
+        pool = ReplicaPool(devices)
+        try:
+            pool.start(warmup_files)
+        except Exception as e:
+            pool.close()
+            logger.error(f"✗ 模型副本启动失败: {e}")
+            raise RuntimeError(f"模型加载失败: {e}")
+
+        self.replicas = pool
+        self._fingerprint = pool.info["fingerprint"]
+        self.scheduler.max_batch_size = pool.max_batch_size
+        self.scheduler.concurrency = len(pool.replicas)
+        admission.parallelism = len(pool.replicas)
+        admission.batch_size = self.scheduler.max_batch_size
+        self.is_loaded = True
+        logger.info(
+            f"✓ 模型副本池就绪: {len(pool.replicas)} 个副本 (批处理上限: {self.scheduler.max_batch_size})"
+        )
+
+    def shutdown(self):
+        """释放模型副本进程"""
+        if self.replicas is not None:
+            self.replicas.close()
+            self.replicas = None
+            self.is_loaded = False
+
+    def _supports_batching(self) -> bool:
+        """后端是否支持批量推理（IndexTTS2 没有批量接口，目前只有 MockIndexTTS 支持）"""
+        return isinstance(self.model, MockIndexTTS)
+
+    def _resolve_max_batch_size(self) -> int:
+        """不支持批量推理的后端回退到单条推理"""
+        if not self._supports_batching():
+            return 1
+        return max(1, settings.batch_max_size)
+
+    def _get_feature_store(self) -> Optional[SpeakerFeatureStore]:
+        """磁盘特征缓存（需要模型支持特征导入/导出，或为 IndexTTS2 的缓存槽位）"""
+        if not settings.enable_speaker_feature_cache:
+            return None
+        if self.speaker_slot is None and not (
+            callable(getattr(self.model, "export_speaker_features", None))
+            and callable(getattr(self.model, "import_speaker_features", None))
+        ):
+            return None
+        if self._feature_store is None:
+            self._feature_store = SpeakerFeatureStore(settings.speaker_cache_dir, self.fingerprint)
+        return self._feature_store
+
+    @property
+    def _speaker_features(self) -> Any:
+        """说话人特征导入/导出接口：IndexTTS2 为其缓存槽位，其他后端为模型自身"""
+        return self.speaker_slot if self.speaker_slot is not None else self.model
+
+    def _can_warmup(self) -> bool:
+        # IndexTTS2 只缓存一个音色，预热只为写入磁盘特征缓存，未启用时跳过
+        if self.speaker_slot is not None:
+            return self._get_feature_store() is not None
+        return hasattr(self.model, "warmup_speaker")
+
+    def _compute_speaker(self, audio_path: str) -> bool:
         """
-        预热所有角色的参考音频特征
-        在启动时调用，将所有角色的特征预先计算并缓存到GPU显存
+        计算参考音频的说话人特征并留在模型缓存中
+
+        IndexTTS2 没有单独的特征提取接口：以极短文本推理一次，在第一个生成步骤停止，特征留在缓存槽位中
         """
-        if isinstance(self.model, MockIndexTTS):
-            logger.info("Mock 模式，跳过预热")
-            return
+        if self.speaker_slot is None:
+            return self.model.warmup_speaker(audio_path)
+        generation_kwargs = {}
+        stopping_criteria = _stopping_criteria(lambda: True)
+        if stopping_criteria is not None:
+            generation_kwargs["stopping_criteria"] = stopping_criteria
+        with torch.no_grad():
+            self.model.infer(spk_audio_prompt=audio_path, text=_WARMUP_TEXT, output_path=None, **generation_kwargs)
+        return self.speaker_slot.holds(audio_path)
+
+    def _warmup_voice(self, wav_file: Path) -> bool:
+        """
+        预热单个参考音频
+
+        优先从磁盘特征缓存加载；未命中时计算特征并写回缓存
+        """
+        store = self._get_feature_store()
+        content_hash = None
+        if store is not None:
+            content_hash = file_sha256(wav_file)
+            features = store.load(content_hash)
+            if features is not None:
+                self._speaker_features.import_speaker_features(str(wav_file), features)
+                self.feature_cache_stats["loaded"] += 1
+                if self.speaker_cache is not None:
+                    self.speaker_cache.register(str(wav_file))
+                return True
+
+        if not self._compute_speaker(str(wav_file)):
+            return False
+        self.feature_cache_stats["computed"] += 1
+
+        if store is not None:
+            try:
+                features = self._speaker_features.export_speaker_features(str(wav_file))
+                if features:
+                    store.save(content_hash, features, source=str(wav_file))
+            except Exception as e:
+                logger.warning(f"写入说话人特征缓存失败 {wav_file}: {e}")
+        if self.speaker_cache is not None:
+            self.speaker_cache.register(str(wav_file))
+        return True
+
+    def _restore_speaker(self, ref_audio_path: str) -> Optional[str]:
+        """
+        IndexTTS2 推理前：参考音频不在模型缓存槽位中时从磁盘特征缓存导入
+
+        未命中时返回参考音频的内容哈希，推理完成后由 _persist_speaker 写回缓存
+        """
+        store = self._get_feature_store()
+        if store is None or self.speaker_slot is None or self.speaker_slot.holds(ref_audio_path):
+            return None
+        try:
+            content_hash = file_sha256(Path(ref_audio_path))
+            features = store.load(content_hash)
+            if features is None:
+                return content_hash
+            self.speaker_slot.import_speaker_features(ref_audio_path, features)
+            self.feature_cache_stats["loaded"] += 1
+        except Exception as e:
+            logger.warning(f"读取说话人特征缓存失败 {ref_audio_path}: {e}")
+        return None
 
+    def _persist_speaker(self, ref_audio_path: str, content_hash: str):
+        """IndexTTS2 推理后：把模型刚计算的说话人特征写入磁盘特征缓存"""
+        try:
+            features = self.speaker_slot.export_speaker_features(ref_audio_path)
+            if features:
+                self._get_feature_store().save(content_hash, features, source=ref_audio_path)
+                self.feature_cache_stats["computed"] += 1
+        except Exception as e:
+            logger.warning(f"写入说话人特征缓存失败 {ref_audio_path}: {e}")
+
+    async def warmup_voice(self, wav_file: Path) -> bool:
+        """预热单个参考音频（异步，用于上传新音色后立即缓存特征）"""
+        if self.replicas is not None:
+            return await self.replicas.warmup(Path(wav_file))
+        if not self.is_loaded or not self._can_warmup():
+            return False
+        async with self.inference_lock:
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(None, self._warmup_voice, Path(wav_file))
+
+    def _warmup_targets(self) -> tuple[list[Path], int]:
+        """需要预热的参考音频（按实例分片过滤），返回 (音频列表, 跳过数量)"""
+        ring = None
+        if settings.warmup_shard_count > 1:
+            ring = shard_ring(settings.warmup_shard_count)
+            logger.info(
+                f"按分片预热: 实例 {settings.warmup_shard_index}/{settings.warmup_shard_count}"
+            )
+        own_node = shard_node_name(settings.warmup_shard_index)
+
+        targets: list[Path] = []
+        skipped = 0
+        for voice_id, wav_file in voice_catalogue.iter_voice_audios():
+            # 不归属本实例的音色在首次请求时再加载
+            if ring is not None and ring.owner(affinity_key(voice_id)) != own_node:
+                skipped += 1
+                continue
+            targets.append(wav_file)
+        return targets, skipped
+
+    def _warmup_all_voices(self, wav_files: Optional[list[Path]] = None):
+        """
+        预热所有角色的参考音频特征
+        在启动时调用，将所有角色的特征预先计算并缓存到GPU显存；
+        已存在于磁盘特征缓存中的音频直接加载，只计算新增或变化的音频
+        """
         # 检查模型是否支持预热
-        if not hasattr(self.model, 'warmup_speaker'):
+        if not self._can_warmup():
             logger.warning("模型不支持预热功能，跳过")
             return
 
@@ -243,50 +465,29 @@ class TTSModelEngine:
 
         warmup_count = 0
         failed_count = 0
+        skipped_count = 0
+        if wav_files is None:
+            wav_files, skipped_count = self._warmup_targets()
 
-        # 1. 预热 presets 目录下的所有音色
-        if settings.presets_dir.exists():
-            # 新结构: presets/{voice_id}/{emotion}.wav
-            for voice_dir in settings.presets_dir.iterdir():
-                if voice_dir.is_dir():
-                    for wav_file in list(voice_dir.glob("*.wav")) + list(voice_dir.glob("*.WAV")):
-                        try:
-                            if self.model.warmup_speaker(str(wav_file)):
-                                warmup_count += 1
-                            else:
-                                failed_count += 1
-                        except Exception as e:
-                            logger.warning(f"预热失败 {wav_file}: {e}")
-                            failed_count += 1
-
-            # 旧结构: presets/{voice}.wav
-            for wav_file in list(settings.presets_dir.glob("*.wav")) + list(settings.presets_dir.glob("*.WAV")):
-                if wav_file.is_file():
-                    try:
-                        if self.model.warmup_speaker(str(wav_file)):
-                            warmup_count += 1
-                        else:
-                            failed_count += 1
-                    except Exception as e:
-                        logger.warning(f"预热失败 {wav_file}: {e}")
-                        failed_count += 1
-
-        # 2. 预热 char 目录下的所有角色音色
-        if settings.char_dir.exists():
-            for char_dir in settings.char_dir.iterdir():
-                if char_dir.is_dir():
-                    for wav_file in list(char_dir.glob("*.wav")) + list(char_dir.glob("*.WAV")):
-                        try:
-                            if self.model.warmup_speaker(str(wav_file)):
-                                warmup_count += 1
-                            else:
-                                failed_count += 1
-                        except Exception as e:
-                            logger.warning(f"预热失败 {wav_file}: {e}")
-                            failed_count += 1
+        for wav_file in wav_files:
+            try:
+                if self._warmup_voice(wav_file):
+                    warmup_count += 1
+                else:
+                    failed_count += 1
+            except Exception as e:
+                logger.warning(f"预热失败 {wav_file}: {e}")
+                failed_count += 1
 
         logger.info("=" * 50)
         logger.info(f"🔥 预热完成: 成功 {warmup_count} 个, 失败 {failed_count} 个")
+        if skipped_count:
+            logger.info(f"⏭️  非本分片音色 {skipped_count} 个，按需加载")
+        if self._get_feature_store() is not None:
+            logger.info(
+                f"💾 磁盘特征缓存: 加载 {self.feature_cache_stats['loaded']} 个, "
+                f"新计算 {self.feature_cache_stats['computed']} 个"
+            )
 
         # 打印缓存状态
         if hasattr(self.model, 'get_cache_info'):
@@ -295,74 +496,45 @@ class TTSModelEngine:
 
         logger.info("=" * 50)
 
-    def _get_reference_audio_path(self, voice_id: str, emotion: str = "default") -> Path:
+    @property
+    def fingerprint(self) -> str:
+        """模型/配置指纹，用于使缓存随模型变化失效"""
+        if self._fingerprint is None:
+            self._fingerprint = model_fingerprint(self.model)
+        return self._fingerprint
+
+    def reference_fingerprint(self, voice_id: str, emotion: str) -> str:
         """
-        获取参考音频路径（支持新的层级结构和角色音色）
-        新结构: presets/{voice_id}/{emotion}.wav
-        角色音色: char/{char_id}/{voice_file}.wav
+        参考音频内容指纹
+
+        emotion="auto" 时实际音频取决于情感分析结果，因此取该音色所有情感候选音频的组合指纹
         """
-        voice_id = voice_id.replace(".wav", "")
-        emotion = emotion.replace(".wav", "")
-
-        # 检查是否是角色音色路径 (格式: char/{char_id}/{voice_name})
-        if voice_id.startswith("char/"):
-            parts = voice_id.split("/")
-            if len(parts) >= 3:
-                # char/{char_id}/{voice_name}
-                char_id = parts[1]
-                voice_name = parts[2]
-                char_audio_path = settings.char_dir / char_id / f"{voice_name}.wav"
-                if char_audio_path.exists():
-                    logger.info(f"使用角色音色: {char_id}/{voice_name}")
-                    return char_audio_path
-                # 尝试大写后缀
-                char_audio_path_upper = settings.char_dir / char_id / f"{voice_name}.WAV"
-                if char_audio_path_upper.exists():
-                    logger.info(f"使用角色音色: {char_id}/{voice_name}")
-                    return char_audio_path_upper
-                raise FileNotFoundError(f"角色音色不存在: {char_audio_path}")
-
-        voice_dir = settings.presets_dir / voice_id
-        target_path = voice_dir / f"{emotion}.wav"
-
-        if target_path.exists():
-            logger.info(f"使用音色: {voice_id}/{emotion}")
-            return target_path
-
-        # 尝试大写后缀
-        target_path_upper = voice_dir / f"{emotion}.WAV"
-        if target_path_upper.exists():
-            logger.info(f"使用音色: {voice_id}/{emotion}")
-            return target_path_upper
-
-        default_path = voice_dir / "default.wav"
-        if default_path.exists():
-            logger.warning(f"情感 {emotion} 不存在，使用 {voice_id}/default")
-            return default_path
-
-        # 尝试大写后缀
-        default_path_upper = voice_dir / "default.WAV"
-        if default_path_upper.exists():
-            logger.warning(f"情感 {emotion} 不存在，使用 {voice_id}/default")
-            return default_path_upper
-
-        old_structure_path = settings.presets_dir / f"{voice_id}.wav"
-        if old_structure_path.exists():
-            logger.warning(f"使用旧结构音色: {voice_id}.wav（建议迁移到新结构）")
-            return old_structure_path
-
-        # 尝试大写后缀
-        old_structure_path_upper = settings.presets_dir / f"{voice_id}.WAV"
-        if old_structure_path_upper.exists():
-            logger.warning(f"使用旧结构音色: {voice_id}.WAV（建议迁移到新结构）")
-            return old_structure_path_upper
-
-        raise FileNotFoundError(
-            f"音色 {voice_id} 不存在。请确保以下路径之一存在：\n"
-            f"  - {target_path}\n"
-            f"  - {default_path}\n"
-            f"  - {old_structure_path}"
-        )
+        if emotion != "auto":
+            return file_sha256(self._get_reference_audio_path(voice_id, emotion))
+        hashes = []
+        for label in settings.sentiment_labels:
+            try:
+                hashes.append(file_sha256(self._get_reference_audio_path(voice_id, label)))
+            except FileNotFoundError:
+                hashes.append("")
+        return bytes_sha256("|".join(hashes).encode())
+
+    def get_cache_info(self) -> Dict[str, Any]:
+        """获取说话人缓存状态"""
+        info: Dict[str, Any] = {"feature_store": dict(self.feature_cache_stats)}
+        if self.replicas is not None:
+            info["speaker"] = self.replicas.get_stats()
+        elif self.speaker_cache is not None:
+            info["speaker"] = self.speaker_cache.get_stats()
+        elif self.speaker_slot is not None:
+            info["speaker"] = self.speaker_slot.get_cache_info()
+        elif hasattr(self.model, "get_cache_info"):
+            info["speaker"] = self.model.get_cache_info()
+        return info
+
+    def _get_reference_audio_path(self, voice_id: str, emotion: str = "default") -> Path:
+        """获取参考音频路径（由内存中的音色目录索引解析）"""
+        return voice_catalogue.resolve(voice_id, emotion)
 
     async def generate(
         self,
@@ -374,75 +546,367 @@ class TTSModelEngine:
         top_p: float = 0.8,
         top_k: int = 20,
         repetition_penalty: float = 1.0,
-        request_id: Optional[str] = None
+        request_id: Optional[str] = None,
+        priority: str = PRIORITY_INTERACTIVE,
+        seed: Optional[int] = None,
+        deadline: Optional[float] = None
     ) -> np.ndarray:
-        """生成语音（异步，带显存锁保护和队列管理）"""
+        """
+        生成语音（异步，经批处理调度器推理，带队列管理）
+
+        deadline 为截止时间（time.time() 时间戳）：超过后尚未推理的任务出队，抛出 DeadlineExceeded；
+        取消本协程（如客户端断开）同样会使排队中的任务在推理前出队
+        """
         if not self.is_loaded:
             raise RuntimeError("模型未加载，请先调用 load_model()")
 
         # 生成请求ID
         if request_id is None:
             request_id = str(uuid.uuid4())
+        started = time.perf_counter()
+
+        # 情感分析使用原文（保留重复标点、表情等线索），合成使用规范化后的文本
+        source_text = text
+        text = text_frontend.normalize(text)
+        params = dict(
+            speed=speed,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            repetition_penalty=repetition_penalty,
+            priority=priority,
+            seed=seed,
+            deadline=deadline
+        )
+
+        # 长文本按句切分，各片段并行进入队列
+        segments = text_frontend.segment(text) if len(text) > settings.long_text_threshold else []
+        if len(segments) > 1:
+            # 整段文本只做一次情感分析，保证各段音色一致
+            if emotion == "auto":
+                emotion = await self._resolve_emotion(source_text)
+            self._get_reference_audio_path(voice_id, emotion)
+            audio_data = await self._generate_segments(
+                segments, voice_id=voice_id, emotion=emotion, request_id=request_id, **params
+            )
+        else:
+            audio_data = await self._generate_one(
+                text, voice_id=voice_id, emotion=emotion, request_id=request_id,
+                source_text=source_text, **params
+            )
+
+        self._record_output(voice_id, len(audio_data), started)
+        return audio_data
+
+    async def _generate_one(
+        self,
+        text: str,
+        voice_id: str,
+        emotion: str,
+        request_id: str,
+        speed: float = 1.0,
+        temperature: float = 1.0,
+        top_p: float = 0.8,
+        top_k: int = 20,
+        repetition_penalty: float = 1.0,
+        priority: str = PRIORITY_INTERACTIVE,
+        seed: Optional[int] = None,
+        source_text: Optional[str] = None,
+        deadline: Optional[float] = None
+    ) -> np.ndarray:
+        """将一段已规范化的文本作为一个任务送入队列并等待推理结果"""
+        if not self.is_loaded:
+            raise RuntimeError("模型未加载，请先调用 load_model()")
+        if deadline is not None and time.time() >= deadline:
+            raise DeadlineExceeded("请求在进入队列前已超过截止时间")
+
+        # emotion="auto" 时先入队占位，情感分析与排队并行进行，分析完成前调度器跳过该请求
+        ready = emotion != "auto"
+        ref_audio_path = str(self._get_reference_audio_path(voice_id, emotion)) if ready else ""
+
+        job = InferenceJob(
+            text=text,
+            ref_audio_path=ref_audio_path,
+            speed=speed,
+            temperature=temperature,
+            top_p=top_p,
+            top_k=top_k,
+            repetition_penalty=repetition_penalty,
+            request_id=request_id,
+            seed=seed,
+            deadline=deadline
+        )
 
-        # 添加到队列
-        success, position = await tts_queue.add(request_id)
+        # 添加到队列，由调度器决定执行顺序
+        success, position = await tts_queue.add(request_id, priority=priority, payload=job, ready=ready)
         if not success:
-            raise RuntimeError(f"队列已满（最大 {MAX_QUEUE_SIZE}），请稍后重试")
+            QUEUE_REJECTIONS.inc(priority=priority)
+            raise QueueFull(MAX_QUEUE_SIZE, admission.estimated_wait(priority))
 
-        logger.info(f"请求 {request_id[:8]}... 加入队列，位置: {position}")
+        logger.info(f"请求 {request_id[:8]}... 加入队列 ({priority})，位置: {position}")
 
         try:
-            if emotion == "auto":
-                from app.services.sentiment import sentiment_analyzer
-                emotion = await sentiment_analyzer.analyze(text)
-                logger.info(f"智能情感分析结果: {emotion}")
+            self.scheduler.ensure_running()
+
+            if not ready:
+                emotion = await self._resolve_emotion(source_text or text)
+                job.ref_audio_path = str(self._get_reference_audio_path(voice_id, emotion))
+                await tts_queue.mark_ready(request_id)
+
+            logger.info(
+                f"提交推理: text_len={len(text)}, voice={voice_id}, emotion={emotion}, "
+                f"speed={speed}, temp={temperature}, top_p={top_p}, top_k={top_k}, rep_penalty={repetition_penalty}"
+            )
+            audio_data = await self._wait_job(job)
+            record_stage("queue", job.queue_wait)
+            record_stage("infer", job.inference_seconds)
+            # 按原速音频时长与所在批次的推理耗时更新准入控制的实时率估计
+            admission.observe(
+                voice_id,
+                text,
+                len(audio_data) / settings.sample_rate * speed,
+                job.inference_seconds
+            )
+            logger.info(f"✓ 推理完成，音频长度: {len(audio_data)} samples")
+            return audio_data
+        except (FileNotFoundError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            logger.error(f"✗ 推理失败: {e}")
+            raise RuntimeError(f"语音合成失败: {e}")
+        finally:
+            # 从队列移除
+            await tts_queue.remove(request_id)
 
-            ref_audio_path = self._get_reference_audio_path(voice_id, emotion)
+    @staticmethod
+    async def _wait_job(job: InferenceJob) -> np.ndarray:
+        """
+        等待任务结果；超过截止时间时取消 Future 并抛出 DeadlineExceeded
 
-            # 设置为正在处理
-            await tts_queue.set_processing(request_id)
+        Future 被取消后调度器不会再把该任务交给模型，推理中的任务在下一个生成步骤结束（见 _stopping_criteria）
+        """
+        if job.deadline is None:
+            return await job.future
+        try:
+            return await asyncio.wait_for(job.future, timeout=max(0.0, job.deadline - time.time()))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("请求超过截止时间，已取消")
+
+    def _record_output(self, voice_id: str, samples: int, started: float):
+        """记录合成音频时长与实时率（音频秒数 / 请求耗时秒数）"""
+        audio_seconds = samples / settings.sample_rate
+        elapsed = time.perf_counter() - started
+        AUDIO_SECONDS.inc(audio_seconds, voice=voice_id)
+        if elapsed > 0:
+            REALTIME_FACTOR.set(audio_seconds / elapsed, voice=voice_id)
+
+    async def _resolve_emotion(self, text: str) -> str:
+        """emotion="auto" 时的情感分析阶段"""
+        from app.services.sentiment import sentiment_analyzer
+        started = time.perf_counter()
+        with EMOTION_SECONDS.time(backend=settings.sentiment_backend), trace_stage("sentiment"):
+            emotion = await sentiment_analyzer.analyze(text)
+        admission.observe_sentiment(time.perf_counter() - started)
+        logger.info(f"智能情感分析结果: {emotion}")
+        return emotion
+
+    async def _generate_segments(
+        self,
+        segments: list[str],
+        voice_id: str,
+        emotion: str,
+        request_id: str,
+        **kwargs
+    ) -> np.ndarray:
+        """
+        并行合成长文本的各个片段并按顺序拼接
 
-            async with self.inference_lock:
-                logger.info(
-                    f"开始推理: text_len={len(text)}, voice={voice_id}, emotion={emotion}, "
-                    f"speed={speed}, temp={temperature}, top_p={top_p}, top_k={top_k}, rep_penalty={repetition_penalty}"
+        片段作为独立请求进入队列，由批处理调度器合批或分发到空闲副本；
+        同时在队列中的片段数受 long_text_max_inflight 限制，避免单个请求占满队列
+        """
+        logger.info(f"长文本分段合成: {len(segments)} 个片段, request_id={request_id[:8]}...")
+        semaphore = asyncio.Semaphore(max(1, settings.long_text_max_inflight))
+
+        async def run(index: int, segment: str) -> np.ndarray:
+            async with semaphore:
+                return await self._generate_one(
+                    text=segment,
+                    voice_id=voice_id,
+                    emotion=emotion,
+                    request_id=f"{request_id}-{index}",
+                    **kwargs
+                )
+
+        tasks = [asyncio.ensure_future(run(index, segment)) for index, segment in enumerate(segments)]
+        try:
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        return join_segments(
+            results,
+            settings.sample_rate,
+            silence_ms=settings.segment_silence_ms,
+            crossfade_ms=settings.segment_crossfade_ms
+        )
+
+    async def generate_stream(
+        self,
+        text: str,
+        voice_id: str = "default",
+        emotion: str = "default",
+        request_id: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[np.ndarray]:
+        """
+        流式生成语音：按句子边界切分文本，逐段合成并在每段完成后立即产出
+
+        下一段在当前段被消费时已提交推理，避免段间空闲
+        """
+        if request_id is None:
+            request_id = str(uuid.uuid4())
+        started = time.perf_counter()
+
+        segments = text_frontend.segment(text) or [text]
+
+        # 整段文本只做一次情感分析，保证各段音色一致
+        if emotion == "auto":
+            emotion = await self._resolve_emotion(text)
+
+        logger.info(f"流式合成: {len(segments)} 个片段, request_id={request_id[:8]}...")
+
+        def submit(index: int) -> asyncio.Task:
+            return asyncio.ensure_future(
+                self._generate_one(
+                    text=segments[index],
+                    voice_id=voice_id,
+                    emotion=emotion,
+                    request_id=f"{request_id}-{index}",
+                    **kwargs
                 )
+            )
+
+        next_task = submit(0)
+        samples = 0
+        try:
+            for index in range(len(segments)):
+                current = next_task
+                next_task = submit(index + 1) if index + 1 < len(segments) else None
+                audio_data = await current
+                samples += len(audio_data)
+                yield audio_data
+            self._record_output(voice_id, samples, started)
+        finally:
+            if next_task is not None and not next_task.done():
+                next_task.cancel()
+
+    async def _dispatch_batch(self, jobs: list[InferenceJob]) -> list[np.ndarray]:
+        """
+        将一个批次交给模型推理（在线程池中执行；多副本时交给空闲副本）
+
+        只有模型推理持有显存锁，语速调整与重采样在释放锁之后执行，不延长独占区
+        """
+        if self.replicas is not None:
+            return await self.replicas.run(jobs)
+        loop = asyncio.get_event_loop()
+        async with self.inference_lock:
+            outputs = await loop.run_in_executor(None, self._sync_infer_batch, jobs)
+        return await loop.run_in_executor(None, self._sync_finish_batch, jobs, outputs)
+
+    def _sync_generate_batch(self, jobs: list[InferenceJob]) -> list[np.ndarray]:
+        """同步批量推理并后处理（副本进程中执行）"""
+        return self._sync_finish_batch(jobs, self._sync_infer_batch(jobs))
+
+    def _sync_infer_batch(self, jobs: list[InferenceJob]) -> list[Optional[tuple[np.ndarray, int]]]:
+        """
+        同步批量推理函数（在线程池中执行），返回各任务的 (模型输出音频, 采样率)
+
+        开始推理前再检查一次取消标志：排队期间已被放弃或超时的任务不再占用模型，对应位置返回 None
+        """
+        live = [job for job in jobs if not job.cancelled]
+        if len(live) < len(jobs):
+            logger.info(f"跳过 {len(jobs) - len(live)} 个已取消的任务")
+        results = iter(self._sync_infer_live(live) if live else [])
+        return [next(results) if job in live else None for job in jobs]
+
+    def _sync_finish_batch(
+        self,
+        jobs: list[InferenceJob],
+        outputs: list[Optional[tuple[np.ndarray, int]]]
+    ) -> list[np.ndarray]:
+        """语速调整并重采样到目标采样率；推理期间被放弃的任务返回空音频（等待方已不会读取）"""
+        return [
+            np.zeros(0, dtype=np.float32) if output is None or job.cancelled
+            else self._finish_audio(output[0], output[1], job.speed)
+            for job, output in zip(jobs, outputs)
+        ]
+
+    def _sync_infer_live(self, jobs: list[InferenceJob]) -> list[tuple[np.ndarray, int]]:
+        if self.speaker_cache is not None:
+            for job in jobs:
                 try:
-                    loop = asyncio.get_event_loop()
-                    audio_data = await loop.run_in_executor(
-                        None,
-                        self._sync_generate,
-                        text,
-                        str(ref_audio_path),
-                        speed,
-                        temperature,
-                        top_p,
-                        top_k,
-                        repetition_penalty
-                    )
-                    logger.info(f"✓ 推理完成，音频长度: {len(audio_data)} samples")
-                    return audio_data
+                    self.speaker_cache.ensure(job.ref_audio_path)
                 except Exception as e:
-                    logger.error(f"✗ 推理失败: {e}")
-                    raise RuntimeError(f"语音合成失败: {e}")
-        finally:
-            # 从队列移除
-            await tts_queue.remove(request_id)
+                    logger.warning(f"说话人缓存加载失败 {job.ref_audio_path}: {e}")
+
+        if len(jobs) == 1:
+            job = jobs[0]
+            content_hash = self._restore_speaker(job.ref_audio_path)
+            output = self._sync_generate(
+                job.text,
+                job.ref_audio_path,
+                job.temperature,
+                job.top_p,
+                job.top_k,
+                job.repetition_penalty,
+                job.seed,
+                should_stop=lambda: job.cancelled
+            )
+            if content_hash is not None:
+                self._persist_speaker(job.ref_audio_path, content_hash)
+            return [output]
+
+        # 多任务批次只会出现在支持批量推理的后端（见 _resolve_max_batch_size）
+        with torch.no_grad():
+            # 同一批次的随机种子一致（见 InferenceJob.batch_key）
+            if jobs[0].seed is not None:
+                torch.manual_seed(jobs[0].seed)
+            audios = self.model.synthesize_batch(
+                [job.text for job in jobs],
+                [job.ref_audio_path for job in jobs]
+            )
+            return [(audio, settings.sample_rate) for audio in audios]
 
     def _sync_generate(
         self, 
         text: str, 
         ref_audio_path: str, 
-        speed: float,
         temperature: float,
         top_p: float,
         top_k: int,
-        repetition_penalty: float
-    ) -> np.ndarray:
-        """同步推理函数（在线程池中执行）"""
+        repetition_penalty: float,
+        seed: Optional[int] = None,
+        should_stop: Optional[Callable[[], bool]] = None
+    ) -> tuple[np.ndarray, int]:
+        """
+        同步推理函数（在线程池中执行），返回 (音频, 采样率)
+
+        should_stop 在生成过程中返回 True 时提前结束推理，返回的截断音频由调用方丢弃
+        """
         with torch.no_grad():
+            if seed is not None:
+                torch.manual_seed(seed)
+
             if isinstance(self.model, MockIndexTTS):
-                return self.model.synthesize(text, ref_audio_path, speed)
+                return self.model.synthesize(text, ref_audio_path, should_stop), settings.sample_rate
+
+            generation_kwargs = {}
+            if should_stop is not None:
+                stopping_criteria = _stopping_criteria(should_stop)
+                if stopping_criteria is not None:
+                    generation_kwargs["stopping_criteria"] = stopping_criteria
 
             try:
                 result = self.model.infer(
@@ -452,71 +916,58 @@ class TTSModelEngine:
                     top_p=top_p,
                     top_k=top_k,
                     temperature=temperature,
-                    repetition_penalty=repetition_penalty
+                    repetition_penalty=repetition_penalty,
+                    **generation_kwargs
                 )
 
-                sample_rate = settings.sample_rate
-                audio_data = result
-                if isinstance(result, tuple) and len(result) == 2:
-                    sample_rate, audio_data = result
-                elif isinstance(result, str):
-                    audio_data, sample_rate = sf.read(result)
-                elif result is None:
-                    raise RuntimeError("模型未返回音频数据")
-
-                if isinstance(audio_data, torch.Tensor):
-                    audio_data = audio_data.cpu().numpy()
-
-                if isinstance(audio_data, np.ndarray):
-                    if audio_data.dtype in (np.int16, np.int32):
-                        max_val = np.iinfo(audio_data.dtype).max
-                        audio_data = audio_data.astype(np.float32) / max_val
-                    else:
-                        audio_data = audio_data.astype(np.float32, copy=False)
-
-                if len(audio_data.shape) > 1:
-                    if audio_data.shape[0] == 1:
-                        audio_data = audio_data.squeeze(0)
-                    elif audio_data.shape[1] == 1:
-                        audio_data = audio_data.squeeze(1)
-                    else:
-                        audio_data = audio_data.mean(axis=1)
-
-                if speed != 1.0:
-                    audio_data = self._adjust_speed(audio_data, sample_rate, speed)
-
-                if sample_rate != settings.sample_rate:
-                    audio_data = self._resample_audio(audio_data, orig_sr=sample_rate, target_sr=settings.sample_rate)
-
-                return audio_data.astype(np.float32, copy=False)
+                return self._decode_output(result)
 
             except Exception as e:
                 logger.error(f"IndexTTS 推理失败: {e}")
                 raise
 
-    def _adjust_speed(self, audio: np.ndarray, sample_rate: int, speed: float) -> np.ndarray:
-        """调整音频速度"""
-        try:
-            import librosa
-            return librosa.effects.time_stretch(audio, rate=speed)
-        except ImportError:
-            logger.warning("librosa 未安装，无法调整语速")
-            return audio
-        except Exception as e:
-            logger.warning(f"语速调整失败: {e}，返回原始音频")
-            return audio
+    def _decode_output(self, result: Any) -> tuple[np.ndarray, int]:
+        """将模型输出统一为 float32 单声道音频，返回 (音频, 采样率)"""
+        sample_rate = settings.sample_rate
+        audio_data = result
+        if isinstance(result, tuple) and len(result) == 2:
+            sample_rate, audio_data = result
+        elif isinstance(result, str):
+            audio_data, sample_rate = sf.read(result)
+        elif result is None:
+            raise RuntimeError("模型未返回音频数据")
+
+        if isinstance(audio_data, torch.Tensor):
+            audio_data = audio_data.cpu().numpy()
+
+        if isinstance(audio_data, np.ndarray):
+            if audio_data.dtype in (np.int16, np.int32):
+                max_val = np.iinfo(audio_data.dtype).max
+                audio_data = audio_data.astype(np.float32) / max_val
+            else:
+                audio_data = audio_data.astype(np.float32, copy=False)
 
-    def _resample_audio(self, audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
-        """重采样音频"""
-        try:
-            import librosa
-            return librosa.resample(audio, orig_sr=orig_sr, target_sr=target_sr)
-        except ImportError:
-            logger.warning("librosa 未安装，无法重采样")
-            return audio
-        except Exception as e:
-            logger.warning(f"重采样失败: {e}，返回原始音频")
-            return audio
+        if len(audio_data.shape) > 1:
+            if audio_data.shape[0] == 1:
+                audio_data = audio_data.squeeze(0)
+            elif audio_data.shape[1] == 1:
+                audio_data = audio_data.squeeze(1)
+            else:
+                audio_data = audio_data.mean(axis=1)
+
+        return audio_data, sample_rate
+
+    def _finish_audio(self, audio_data: np.ndarray, sample_rate: int, speed: float) -> np.ndarray:
+        """语速调整（WSOLA）并重采样到目标采样率"""
+        if speed != 1.0:
+            with SPEED_ADJUST_SECONDS.time():
+                audio_data = time_stretch(audio_data, speed, sample_rate)
+
+        if sample_rate != settings.sample_rate:
+            with RESAMPLE_SECONDS.time():
+                audio_data = resample(audio_data, sample_rate, settings.sample_rate)
+
+        return audio_data.astype(np.float32, copy=False)
 
 
 class MockIndexTTS:
@@ -524,14 +975,51 @@ class MockIndexTTS:
 
     def __init__(self, device: str):
         self.device = device
+        self.speaker_cache: Dict[str, Dict[str, np.ndarray]] = {}
         logger.warning("⚠️  使用 Mock 模型，请替换为真实的 IndexTTS 实现")
 
-    def synthesize(self, text: str, ref_audio: str, speed: float) -> np.ndarray:
+    def warmup_speaker(self, audio_path: str) -> bool:
+        # 以简单的统计量模拟说话人特征
+        audio, _ = sf.read(audio_path, dtype="float32", always_2d=True)
+        mono = audio.mean(axis=1)
+        self.speaker_cache[audio_path] = {
+            "spk_cond": np.array([mono.mean(), mono.std()], dtype=np.float32)
+        }
+        return True
+
+    def export_speaker_features(self, audio_path: str) -> Optional[Dict[str, np.ndarray]]:
+        return self.speaker_cache.get(audio_path)
+
+    def import_speaker_features(self, audio_path: str, features: Dict[str, np.ndarray]):
+        self.speaker_cache[audio_path] = features
+
+    def drop_speaker_features(self, audio_path: str):
+        self.speaker_cache.pop(audio_path, None)
+
+    def get_cache_info(self) -> Dict[str, Any]:
+        return {"speaker_cache_size": len(self.speaker_cache)}
+
+    def synthesize(
+        self, text: str, ref_audio: str, should_stop: Optional[Callable[[], bool]] = None
+    ) -> np.ndarray:
         import time
-        time.sleep(0.5)
+        # 分步模拟自回归生成，每步检查取消标志
+        for _ in range(10):
+            if should_stop is not None and should_stop():
+                return np.zeros(0, dtype=np.float32)
+            time.sleep(0.05)
         duration = len(text) * 0.1
         samples = int(settings.sample_rate * duration)
         return np.zeros(samples, dtype=np.float32)
 
+    def synthesize_batch(self, texts: list[str], ref_audios: list[str]) -> list[np.ndarray]:
+        import time
+        # 模拟一次批量前向：整批只付出一次推理耗时
+        time.sleep(0.5)
+        return [
+            np.zeros(int(settings.sample_rate * len(text) * 0.1), dtype=np.float32)
+            for text in texts
+        ]
+
 
 tts_engine = TTSModelEngine()
@@ -0,0 +1,232 @@
+"""Prometheus 文本格式的运行指标"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Optional
+
+# 默认直方图分桶（秒），覆盖毫秒级编码到分钟级长文本推理
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# 采集函数返回 [(指标名, 类型, 说明, [(标签, 值), ...]), ...]
+Collector = Callable[[], list[tuple[str, str, str, list[tuple[dict[str, str], float]]]]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...]) -> dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    @abstractmethod
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        ...
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        if not self.labelnames:
+            self._values[()] = 0.0
+
+    def inc(self, amount: float = 1.0, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            return [(f"{self.name}_total", self._labels(key), value) for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """可任意设置的瞬时值"""
+    type = "gauge"
+
+    def set(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: Any):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """统计代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> list[tuple[str, dict[str, str], float]]:
+        result = []
+        with self._lock:
+            for key, state in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, state["counts"]):
+                    cumulative += count
+                    result.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                result.append((f"{self.name}_sum", labels, state["sum"]))
+                result.append((f"{self.name}_count", labels, state["count"]))
+        return result
+
+
+class MetricsRegistry:
+    """指标注册表，render() 输出 Prometheus 文本格式"""
+
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+        self._collectors: list[Collector] = []
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: Optional[tuple[float, ...]] = None
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets or DEFAULT_BUCKETS))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Collector):
+        """注册在抓取时计算的指标（如各缓存的统计计数）"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: list[str] = []
+
+        def emit(name: str, metric_type: str, documentation: str, samples):
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+
+        for metric in self._metrics:
+            emit(metric.name, metric.type, metric.documentation, metric.samples())
+        for collector in self._collectors:
+            for name, metric_type, documentation, samples in collector():
+                sample_name = f"{name}_total" if metric_type == "counter" else name
+                emit(name, metric_type, documentation, [(sample_name, labels, value) for labels, value in samples])
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表与各阶段指标
+registry = MetricsRegistry()
+
+REQUEST_SECONDS = registry.histogram(
+    "tts_request_duration_seconds", "语音合成请求总耗时", ("voice", "format", "mode")
+)
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "tts_queue_wait_seconds", "请求从入队到开始推理的等待时间", ("priority",)
+)
+EMOTION_SECONDS = registry.histogram(
+    "tts_emotion_analysis_seconds", "emotion=auto 的情感分析耗时", ("backend",)
+)
+INFERENCE_SECONDS = registry.histogram(
+    "tts_inference_seconds", "一个批次的模型推理耗时", ("batch_size",)
+)
+SPEED_ADJUST_SECONDS = registry.histogram(
+    "tts_speed_adjust_seconds", "语速调整（time stretch）耗时"
+)
+RESAMPLE_SECONDS = registry.histogram(
+    "tts_resample_seconds", "重采样耗时"
+)
+ENCODE_SECONDS = registry.histogram(
+    "tts_encode_seconds", "音频编码耗时", ("format",)
+)
+AUDIO_SECONDS = registry.counter(
+    "tts_audio_seconds", "已合成的音频时长（秒）", ("voice",)
+)
+REALTIME_FACTOR = registry.gauge(
+    "tts_realtime_factor", "最近一次合成的实时率（音频秒数 / 耗时秒数）", ("voice",)
+)
+QUEUE_REJECTIONS = registry.counter(
+    "tts_queue_rejections", "队列已满被拒绝的请求数", ("priority",)
+)
+ADMISSION_REJECTIONS = registry.counter(
+    "tts_admission_rejections", "预计完成时间超出 SLO 被拒绝（429）的请求数", ("priority",)
+)
+DROPPED_JOBS = registry.counter(
+    "tts_dropped_jobs", "开始推理前被丢弃的任务数（cancelled: 客户端断开/放弃, deadline: 超过截止时间）", ("reason",)
+)
+MOCK_FALLBACKS = registry.counter(
+    "tts_mock_fallbacks", "模型加载失败回退到 Mock 模式的次数"
+)
+QUEUE_LENGTH = registry.gauge(
+    "tts_queue_length", "队列中的请求数（等待 + 处理中）"
+)
+QUEUE_PROCESSING = registry.gauge(
+    "tts_queue_processing", "正在处理的请求数"
+)
@@ -0,0 +1,349 @@
+"""进程内多模型副本池"""
+import asyncio
+import logging
+import multiprocessing as mp
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Any, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _pack_audio(results: list[np.ndarray]) -> tuple[Optional[str], list[int]]:
+    """将一批音频写入一块共享内存，返回 (共享内存名, 各段长度)"""
+    arrays = [np.ascontiguousarray(audio, dtype=np.float32) for audio in results]
+    lengths = [len(audio) for audio in arrays]
+    total = sum(lengths)
+    if total == 0:
+        return None, lengths
+
+    shm = shared_memory.SharedMemory(create=True, size=total * 4)
+    try:
+        buffer = np.ndarray((total,), dtype=np.float32, buffer=shm.buf)
+        offset = 0
+        for audio in arrays:
+            buffer[offset:offset + len(audio)] = audio
+            offset += len(audio)
+        del buffer
+        return shm.name, lengths
+    finally:
+        # 只关闭本进程的映射，由主进程读取后 unlink
+        shm.close()
+
+
+def _unpack_audio(name: Optional[str], lengths: list[int]) -> list[np.ndarray]:
+    """从共享内存读出一批音频并释放共享内存"""
+    if name is None:
+        return [np.zeros(0, dtype=np.float32) for _ in lengths]
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        buffer = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+        results = []
+        offset = 0
+        for length in lengths:
+            results.append(buffer[offset:offset + length].copy())
+            offset += length
+        del buffer
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _replica_main(index: int, device: str, warmup_files: list[str], conn):
+    """副本进程入口：加载模型，之后循环处理主进程发来的推理/预热请求"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - replica-{index} - %(name)s - %(levelname)s - %(message)s'
+    )
+    from app.core.inference import TTSModelEngine
+
+    engine = TTSModelEngine()
+    engine.device = device
+    try:
+        engine.load_model(warmup_files=[Path(path) for path in warmup_files])
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+
+    conn.send(("ready", {
+        "device": engine.device,
+        "fingerprint": engine.fingerprint,
+        "max_batch_size": engine.scheduler.max_batch_size,
+        "cache_info": engine.get_cache_info(),
+    }))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        command = message[0]
+        if command == "stop":
+            break
+        try:
+            if command == "infer":
+                name, lengths = _pack_audio(engine._sync_generate_batch(message[1]))
+                conn.send(("ok", (name, lengths), engine.get_cache_info()))
+            elif command == "warmup":
+                ok = engine._warmup_voice(Path(message[1]))
+                conn.send(("ok", ok, engine.get_cache_info()))
+            else:
+                conn.send(("error", f"未知命令: {command}"))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+# 副本进程意外退出后自动重启的次数上限（超过后移出轮转）
+MAX_RESTARTS = 3
+
+
+class ReplicaDied(RuntimeError):
+    """副本进程已退出或管道已断开"""
+
+
+def _discard_audio(name: Optional[str]):
+    """释放无人读取的共享内存（调用方已放弃该批次）"""
+    if name is None:
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+class Replica:
+    """主进程中的副本句柄（一条管道同一时刻只承载一个请求）"""
+
+    def __init__(self, index: int, device: str, process, conn, restarts: int = 0):
+        self.index = index
+        self.device = device
+        self.process = process
+        self.conn = conn
+        self.info: dict[str, Any] = {}
+        self.cache_info: dict[str, Any] = {}
+        self.batches = 0
+        self.jobs = 0
+        self.restarts = restarts
+        self.dead = False
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self) -> bool:
+        return not self.dead and self.process.is_alive()
+
+    def call(self, *message) -> Any:
+        with self._lock:
+            if not self.alive:
+                self.dead = True
+                raise ReplicaDied(f"副本 {self.index} ({self.device}) 进程已退出")
+            try:
+                self.conn.send(message)
+                reply = self.conn.recv()
+            except (EOFError, OSError) as e:
+                self.dead = True
+                raise ReplicaDied(f"副本 {self.index} ({self.device}) 连接中断: {e}") from e
+        if reply[0] == "error":
+            raise RuntimeError(f"副本 {self.index} ({self.device}) 执行失败: {reply[1]}")
+        self.cache_info = reply[2]
+        return reply[1]
+
+    def wait_ready(self):
+        try:
+            reply = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise RuntimeError(f"副本 {self.index} ({self.device}) 加载时进程退出: {e}") from e
+        if reply[0] != "ready":
+            raise RuntimeError(f"副本 {self.index} ({self.device}) 加载失败: {reply[1]}")
+        self.info = reply[1]
+        self.cache_info = self.info.pop("cache_info", {})
+
+    def stop(self, timeout: float = 10):
+        try:
+            self.conn.send(("stop",))
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=timeout)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "index": self.index,
+            "device": self.info.get("device", self.device),
+            "alive": self.alive,
+            "restarts": self.restarts,
+            "batches": self.batches,
+            "jobs": self.jobs,
+            "cache": self.cache_info,
+        }
+
+
+class ReplicaPool:
+    """
+    模型副本池
+
+    每个副本是一个独立的工作进程（可分别绑定不同设备），各自加载一份模型；
+    HTTP 前端、音色目录、结果缓存和请求队列只在主进程中存在一份。
+    主进程把批次交给当前空闲的副本，音频结果经共享内存传回。
+    同一设备上的副本依次加载以避免显存峰值，不同设备上的副本并行加载。
+    进程意外退出的副本不再放回空闲队列，在后台重启（最多 MAX_RESTARTS 次）后重新加入。
+    """
+
+    def __init__(self, devices: list[str]):
+        self.devices = devices
+        self.replicas: list[Replica] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(max_workers=max(1, len(devices)), thread_name_prefix="replica")
+        self._ctx = mp.get_context("spawn")
+        self._warmup_files: list[str] = []
+        self._restarting = 0
+
+    def _spawn(self, index: int, restarts: int = 0) -> Replica:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_replica_main,
+            args=(index, self.devices[index], self._warmup_files, child_conn),
+            name=f"tts-replica-{index}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        logger.info(f"副本 {index} 启动中 (设备: {self.devices[index]}, PID: {process.pid})")
+        return Replica(index, self.devices[index], process, parent_conn, restarts)
+
+    def start(self, warmup_files: list[Path]):
+        """启动所有副本进程并等待模型加载完成（阻塞）"""
+        self._warmup_files = [str(path) for path in warmup_files]
+
+        waves: list[list[int]] = []
+        for index, device in enumerate(self.devices):
+            # 第 n 个使用该设备的副本放在第 n 批启动
+            wave = sum(1 for d in self.devices[:index] if d == device)
+            while len(waves) <= wave:
+                waves.append([])
+            waves[wave].append(index)
+
+        replicas: dict[int, Replica] = {}
+        for wave in waves:
+            for index in wave:
+                replicas[index] = self._spawn(index)
+            for index in wave:
+                replicas[index].wait_ready()
+                logger.info(f"✓ 副本 {index} 已就绪")
+
+        self.replicas = [replicas[index] for index in range(len(self.devices))]
+
+    @property
+    def info(self) -> dict[str, Any]:
+        """首个副本上报的模型信息（指纹、批处理上限等）"""
+        return self.replicas[0].info if self.replicas else {}
+
+    @property
+    def max_batch_size(self) -> int:
+        return min(replica.info.get("max_batch_size", 1) for replica in self.replicas)
+
+    def _idle_queue(self) -> asyncio.Queue:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for replica in self.replicas:
+                self._idle.put_nowait(replica)
+        return self._idle
+
+    def _release(self, replica: Replica):
+        """批次结束后归还副本；进程已退出的副本改为后台重启"""
+        if replica.alive:
+            self._idle_queue().put_nowait(replica)
+            return
+        replica.dead = True
+        if replica.restarts >= MAX_RESTARTS:
+            logger.error(f"✗ 副本 {replica.index} 已重启 {replica.restarts} 次仍退出，移出轮转")
+            return
+        logger.warning(f"副本 {replica.index} 进程已退出 (exitcode={replica.process.exitcode})，后台重启")
+        self._restarting += 1
+        asyncio.ensure_future(self._restart(replica))
+
+    async def _restart(self, old: Replica):
+        loop = asyncio.get_event_loop()
+        try:
+            replica = await loop.run_in_executor(None, self._respawn, old)
+        except Exception as e:
+            logger.error(f"✗ 副本 {old.index} 重启失败，移出轮转: {e}")
+            return
+        finally:
+            self._restarting -= 1
+        self.replicas[old.index] = replica
+        self._idle_queue().put_nowait(replica)
+        logger.info(f"✓ 副本 {old.index} 已重启")
+
+    def _respawn(self, old: Replica) -> Replica:
+        old.stop(timeout=1)
+        replica = self._spawn(old.index, restarts=old.restarts + 1)
+        try:
+            replica.wait_ready()
+        except Exception:
+            replica.stop(timeout=1)
+            raise
+        return replica
+
+    def _finish_abandoned(self, replica: Replica, future: asyncio.Future):
+        """调用方已取消、副本仍在推理的批次：结束后释放共享内存并归还副本"""
+        if not future.cancelled() and future.exception() is None:
+            name, _ = future.result()
+            _discard_audio(name)
+        self._release(replica)
+
+    async def run(self, jobs: list) -> list[np.ndarray]:
+        """在空闲副本上执行一个批次"""
+        idle = self._idle_queue()
+        if idle.empty() and not any(replica.alive for replica in self.replicas) and not self._restarting:
+            raise RuntimeError("没有可用的模型副本")
+        replica: Replica = await idle.get()
+        loop = asyncio.get_event_loop()
+        future = loop.run_in_executor(self._executor, replica.call, "infer", jobs)
+        try:
+            name, lengths = await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # 管道上的回复仍会到达，由回调读取后释放共享内存，避免泄漏 /dev/shm
+            future.add_done_callback(lambda f: self._finish_abandoned(replica, f))
+            raise
+        except BaseException:
+            self._release(replica)
+            raise
+        self._release(replica)
+        replica.batches += 1
+        replica.jobs += len(jobs)
+        return _unpack_audio(name, lengths)
+
+    async def warmup(self, wav_file: Path) -> bool:
+        """在所有存活副本上预热参考音频"""
+        loop = asyncio.get_event_loop()
+        results = await asyncio.gather(*(
+            loop.run_in_executor(None, replica.call, "warmup", str(wav_file))
+            for replica in self.replicas if replica.alive
+        ))
+        return all(results)
+
+    def get_stats(self) -> dict[str, Any]:
+        return {"replicas": [replica.to_dict() for replica in self.replicas]}
+
+    def close(self):
+        """停止所有副本进程"""
+        for replica in self.replicas:
+            try:
+                replica.conn.send(("stop",))
+            except (OSError, BrokenPipeError):
+                pass
+        for replica in self.replicas:
+            replica.process.join(timeout=10)
+            if replica.process.is_alive():
+                replica.process.kill()
+        self._executor.shutdown(wait=False)
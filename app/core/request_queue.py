@@ -0,0 +1,264 @@
+"""带优先级的 TTS 请求队列"""
+import asyncio
+import bisect
+import heapq
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+# 优先级（从高到低）：interactive 为对话类实时请求，batch 为批量/长文本朗读
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+
+
+class QueueItem:
+    """队列项"""
+    def __init__(
+        self,
+        request_id: str,
+        priority: str = PRIORITY_INTERACTIVE,
+        payload: Any = None,
+        ready: bool = True
+    ):
+        self.request_id = request_id
+        self.priority = priority
+        self.payload = payload
+        self.ready = ready  # 前置阶段（如情感分析）完成后才可被调度
+        self.created_at = time.time()
+        self.status = "pending"  # pending, processing, completed, error
+        self.seq = -1
+        self.removed = False
+
+
+class _PriorityLane:
+    """
+    单个优先级的 FIFO 通道
+
+    每个入队项分配递增序号。从中间移除的项只打标记并把序号插入有序列表（惰性删除），
+    到达队首时再跳过（只推进列表头部下标，累计过半时整体截断）；已就绪项的序号另有
+    一个最小堆，取第一个可调度项为均摊 O(log n)。位置查询用二分统计排在该项之前的
+    已移除项，为 O(log n)，队尾项（即刚入队的项）为 O(1)
+    """
+
+    def __init__(self):
+        self._items: deque[QueueItem] = deque()
+        self._removed: list[int] = []  # 已从中间移除的序号（有序），[:_removed_head] 已被跳过
+        self._removed_head = 0
+        self._ready: list[tuple[int, QueueItem]] = []  # 已就绪项 (序号, 项)（最小堆，惰性删除）
+        self._next_seq = 0
+        self.size = 0
+
+    def push(self, item: QueueItem):
+        item.seq = self._next_seq
+        self._next_seq += 1
+        self._items.append(item)
+        self.size += 1
+        if item.ready:
+            heapq.heappush(self._ready, (item.seq, item))
+
+    def mark_ready(self, item: QueueItem):
+        heapq.heappush(self._ready, (item.seq, item))
+
+    def _compact(self):
+        while self._items and self._items[0].removed:
+            self._items.popleft()
+            self._removed_head += 1
+        if self._removed_head and self._removed_head * 2 >= len(self._removed):
+            del self._removed[:self._removed_head]
+            self._removed_head = 0
+
+    def peek(self) -> Optional[QueueItem]:
+        self._compact()
+        return self._items[0] if self._items else None
+
+    def pop(self) -> QueueItem:
+        self._compact()
+        item = self._items.popleft()
+        self.size -= 1
+        self._compact()
+        return item
+
+    def first_ready(self) -> Optional[QueueItem]:
+        """通道中第一个可调度的项（未就绪的项被后面已就绪的项超越）"""
+        self._compact()
+        head_seq = self._items[0].seq if self._items else self._next_seq
+        # 已出队（序号小于队首）或已移除的项在这里顺带清理
+        while self._ready:
+            seq, item = self._ready[0]
+            if seq >= head_seq and not item.removed:
+                return item
+            heapq.heappop(self._ready)
+        return None
+
+    def take(self, item: QueueItem):
+        """取出指定项（队首直接出队，其余按移除处理）"""
+        if self._items and self._items[0] is item:
+            self.pop()
+        else:
+            self.discard(item)
+
+    def discard(self, item: QueueItem):
+        if self._items and self._items[0] is item:
+            self.pop()
+            return
+        item.removed = True
+        bisect.insort(self._removed, item.seq)
+        self.size -= 1
+
+    def rank(self, item: QueueItem) -> int:
+        """项在本通道中的位置 (0-based)"""
+        if self._items[-1] is item:
+            return self.size - 1
+        self._compact()
+        skipped = bisect.bisect_left(self._removed, item.seq) - self._removed_head
+        return item.seq - self._items[0].seq - skipped
+
+
+class TTSQueue:
+    """
+    TTS 请求队列管理器
+
+    按优先级出队，同一优先级内先进先出，由调度器通过 get() 决定下一个执行的请求。
+    以 ready=False 加入的请求（例如情感分析尚未完成）会占住排队位置但不会被调度，
+    其后已就绪的请求可以越过它；mark_ready() 后按原位置参与调度。
+    queue_length 包含等待中和正在处理的请求。
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lanes: Dict[str, _PriorityLane] = {p: _PriorityLane() for p in PRIORITY_CLASSES}
+        self._items: Dict[str, QueueItem] = {}
+        self._processing: Dict[str, QueueItem] = {}
+        self._cond = asyncio.Condition()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    async def add(
+        self,
+        request_id: str,
+        priority: str = PRIORITY_INTERACTIVE,
+        payload: Any = None,
+        ready: bool = True
+    ) -> tuple[bool, int]:
+        """添加请求到队列，返回 (是否成功, 位置)"""
+        if priority not in self._lanes:
+            raise ValueError(f"未知的优先级: {priority}")
+        async with self._cond:
+            if len(self._items) >= self.max_size:
+                return False, -1
+
+            item = QueueItem(request_id, priority, payload, ready)
+            self._lanes[priority].push(item)
+            self._items[request_id] = item
+            self._cond.notify_all()
+            return True, self._position(item)
+
+    async def mark_ready(self, request_id: str):
+        """标记请求的前置阶段已完成，可以被调度"""
+        async with self._cond:
+            item = self._items.get(request_id)
+            if item is not None and not item.ready:
+                item.ready = True
+                if item.status == "pending":
+                    self._lanes[item.priority].mark_ready(item)
+                self._cond.notify_all()
+
+    async def remove(self, request_id: str):
+        """从队列移除请求（等待中或处理完成）"""
+        async with self._cond:
+            item = self._items.pop(request_id, None)
+            if item is None:
+                return
+            if item.status == "pending":
+                self._lanes[item.priority].discard(item)
+            self._processing.pop(request_id, None)
+
+    def _next_ready(self) -> Optional[QueueItem]:
+        for lane in self._lanes.values():
+            item = lane.first_ready()
+            if item is not None:
+                return item
+        return None
+
+    def _pop_next(self, match: Optional[Callable[[QueueItem], bool]] = None) -> Optional[QueueItem]:
+        item = self._next_ready()
+        if item is None:
+            return None
+        if match is not None and not match(item):
+            return None
+        self._lanes[item.priority].take(item)
+        item.status = "processing"
+        self._processing[item.request_id] = item
+        return item
+
+    async def get(self) -> QueueItem:
+        """等待并取出下一个应执行的请求（最高优先级的队首）"""
+        async with self._cond:
+            while True:
+                item = self._pop_next()
+                if item is not None:
+                    return item
+                await self._cond.wait()
+
+    async def get_matching(
+        self,
+        match: Callable[[QueueItem], bool],
+        timeout: float
+    ) -> Optional[QueueItem]:
+        """
+        在 timeout 内等待满足 match 的请求
+
+        只检查下一个可调度的请求（最高优先级、最早就绪），不越过它取后面的请求以保证顺序；
+        该请求存在但不满足 match、或等待超时时返回 None
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        async with self._cond:
+            while True:
+                item = self._pop_next(match)
+                if item is not None or self._next_ready() is not None:
+                    return item
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return None
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    return None
+
+    def has_pending(self) -> bool:
+        return any(lane.size for lane in self._lanes.values())
+
+    async def get_status(self) -> Dict[str, Any]:
+        """获取队列状态"""
+        async with self._cond:
+            current = next(iter(self._processing), None)
+            return {
+                "queue_length": len(self._items),
+                "max_queue_size": self.max_size,
+                "is_processing": current is not None,
+                "current_processing": current,
+                "processing_count": len(self._processing),
+                "pending_by_priority": {p: lane.size for p, lane in self._lanes.items()},
+                "can_submit": len(self._items) < self.max_size,
+            }
+
+    def _position(self, item: QueueItem) -> int:
+        if item.status != "pending":
+            return 0
+        ahead = 0
+        for priority, lane in self._lanes.items():
+            if priority == item.priority:
+                return ahead + lane.rank(item) + 1
+            ahead += lane.size
+        return -1
+
+    async def get_position(self, request_id: str) -> int:
+        """获取请求在等待队列中的位置 (1-based)，正在处理返回 0，不在队列中返回 -1"""
+        async with self._cond:
+            item = self._items.get(request_id)
+            if item is None:
+                return -1
+            return self._position(item)
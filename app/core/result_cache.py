@@ -0,0 +1,144 @@
+"""合成结果缓存"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text_for_key(text: str) -> str:
+    """用于缓存键的文本归一化：全半角统一、空白折叠"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+
+
+def build_result_key(**components: Any) -> str:
+    """由合成参数计算内容寻址的缓存键"""
+    payload = json.dumps(components, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def seed_from_key(key: str) -> int:
+    """确定性模式下由缓存键派生采样随机种子"""
+    return int(key[:8], 16)
+
+
+class ResultCache:
+    """
+    合成结果磁盘缓存
+
+    以编码后的音频字节（WAV/MP3）为单位存储在磁盘上，内存中只保留索引，
+    总大小超过上限时按 LRU 淘汰。
+    """
+
+    def __init__(self, root: Path, max_bytes: int, enabled: bool = True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._index: OrderedDict[str, tuple[Path, int]] = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def load_index(self):
+        """启动时从磁盘重建索引（按修改时间恢复 LRU 顺序）"""
+        if not self.enabled:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.root.iterdir():
+            if path.is_file() and not path.name.startswith("."):
+                stat = path.stat()
+                files.append((stat.st_mtime, path, stat.st_size))
+        files.sort()
+
+        with self._lock:
+            self._index.clear()
+            self.total_bytes = 0
+            for _, path, size in files:
+                self._index[path.stem] = (path, size)
+                self.total_bytes += size
+            self._evict()
+        logger.info(f"✓ 合成结果缓存: {len(self._index)} 条, {self.total_bytes / 1024 / 1024:.1f}MB")
+
+    def get(self, key: str) -> Optional[bytes]:
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._index.move_to_end(key)
+
+        path, _ = entry
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                if self._index.pop(key, None) is not None:
+                    self.total_bytes -= entry[1]
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self.stats["hits"] += 1
+        return data
+
+    def put(self, key: str, data: bytes, fmt: str):
+        """写入缓存（原子替换），超出容量时淘汰最久未使用的条目"""
+        if len(data) > self.max_bytes:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{key}.{fmt}"
+        tmp_path = self.root / f".tmp-{uuid.uuid4().hex}"
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            old = self._index.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+            self._index[key] = (path, len(data))
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._index:
+            _, (path, size) = self._index.popitem(last=False)
+            self.total_bytes -= size
+            self.stats["evictions"] += 1
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._index),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                **self.stats,
+            }
+
+
+# 全局单例
+result_cache = ResultCache(
+    settings.result_cache_dir,
+    settings.result_cache_max_mb * 1024 * 1024,
+    enabled=settings.enable_result_cache
+)
@@ -0,0 +1,339 @@
+"""说话人特征缓存"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+import torch
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 缓存格式版本，结构变化时递增以使旧缓存失效
+CACHE_FORMAT_VERSION = 1
+
+
+def model_fingerprint(model: Any) -> str:
+    """
+    计算模型/配置指纹
+
+    模型类型、模型名称、采样率或 config.yaml 内容变化时，已缓存的特征全部失效
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_FORMAT_VERSION}".encode())
+    digest.update(type(model).__name__.encode())
+    digest.update(settings.model_name.encode())
+    digest.update(str(settings.sample_rate).encode())
+    cfg_path = settings.weights_dir / "config.yaml"
+    if cfg_path.is_file():
+        digest.update(cfg_path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _to_numpy(value: Any) -> tuple[np.ndarray, dict[str, str]]:
+    """转换为 numpy 数组，返回 (数组, 还原所需的元信息)"""
+    if isinstance(value, torch.Tensor):
+        tensor = value.detach().cpu()
+        info = {"kind": "torch", "dtype": str(tensor.dtype).replace("torch.", "")}
+        if tensor.dtype == torch.bfloat16:
+            # numpy 不支持 bfloat16，以 float32 保存，加载时还原
+            tensor = tensor.float()
+        return tensor.numpy(), info
+    array = np.asarray(value)
+    return array, {"kind": "numpy", "dtype": str(array.dtype)}
+
+
+def _from_numpy(array: np.ndarray, info: dict[str, str]) -> Any:
+    if info["kind"] != "torch":
+        return array
+    # 直接包装内存映射数组，只有 dtype 需要还原（如 bfloat16）或搬到设备时才复制
+    return torch.from_numpy(array).to(getattr(torch, info["dtype"]))
+
+
+class SpeakerFeatureStore:
+    """
+    基于内容寻址的说话人特征磁盘缓存
+
+    以「参考音频 SHA-256 + 模型指纹」为键，每个特征张量保存为独立的 .npy 文件，
+    加载时以写时复制方式内存映射，多个实例可共享同一缓存目录。
+    """
+
+    def __init__(self, root: Path, fingerprint: str):
+        self.root = Path(root) / fingerprint
+        self.fingerprint = fingerprint
+
+    def _entry_dir(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / content_hash
+
+    def contains(self, content_hash: str) -> bool:
+        return (self._entry_dir(content_hash) / "meta.json").is_file()
+
+    def load(self, content_hash: str) -> Optional[dict[str, Any]]:
+        """加载缓存的特征，不存在或损坏时返回 None"""
+        entry_dir = self._entry_dir(content_hash)
+        meta_path = entry_dir / "meta.json"
+        if not meta_path.is_file():
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            features = {}
+            for name, info in meta["tensors"].items():
+                array = np.load(entry_dir / f"{name}.npy", mmap_mode="c")
+                features[name] = _from_numpy(array, info)
+            return features
+        except Exception as e:
+            logger.warning(f"说话人特征缓存损坏，将重新计算 {content_hash[:12]}: {e}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            return None
+
+    def save(self, content_hash: str, features: dict[str, Any], source: str = ""):
+        """原子写入特征（先写临时目录再重命名）"""
+        entry_dir = self._entry_dir(content_hash)
+        if (entry_dir / "meta.json").is_file():
+            return
+
+        tmp_dir = entry_dir.parent / f".tmp-{uuid.uuid4().hex}"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            tensors = {}
+            for name, value in features.items():
+                array, info = _to_numpy(value)
+                np.save(tmp_dir / f"{name}.npy", array, allow_pickle=False)
+                tensors[name] = info
+            with open(tmp_dir / "meta.json", "w", encoding="utf-8") as f:
+                json.dump({"tensors": tensors, "source": source}, f, ensure_ascii=False)
+            os.replace(tmp_dir, entry_dir)
+        except OSError:
+            # 其他实例已写入同一条目
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not (entry_dir / "meta.json").is_file():
+                raise
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+
+class IndexTTS2SpeakerSlot:
+    """
+    IndexTTS2 说话人缓存的特征导入/导出接口
+
+    IndexTTS2 只缓存最近一次使用的参考音频（cache_spk_* / cache_s2mel_* / cache_mel，
+    以 cache_spk_audio_prompt 标识；未指定情感参考音频时 cache_emo_* 与其相同），
+    换用其他参考音频时在 infer() 内重新计算。本类按参考音频路径读写这一个槽位，
+    供磁盘特征缓存在推理前导入、计算后导出。
+    """
+
+    # 特征名 -> IndexTTS2 属性名
+    SPEAKER_ATTRS = {
+        "spk_cond": "cache_spk_cond",
+        "s2mel_style": "cache_s2mel_style",
+        "s2mel_prompt": "cache_s2mel_prompt",
+        "mel": "cache_mel",
+    }
+    EMOTION_ATTRS = {"emo_cond": "cache_emo_cond"}
+
+    def __init__(self, model: Any):
+        self.model = model
+
+    @classmethod
+    def is_supported(cls, model: Any) -> bool:
+        names = [*cls.SPEAKER_ATTRS.values(), *cls.EMOTION_ATTRS.values(),
+                 "cache_spk_audio_prompt", "cache_emo_audio_prompt"]
+        return all(hasattr(model, name) for name in names)
+
+    def holds(self, audio_path: str) -> bool:
+        return (self.model.cache_spk_audio_prompt == audio_path
+                and self.model.cache_spk_cond is not None)
+
+    def export_speaker_features(self, audio_path: str) -> Optional[dict[str, Any]]:
+        if not self.holds(audio_path):
+            return None
+        features = {name: getattr(self.model, attr) for name, attr in self.SPEAKER_ATTRS.items()}
+        if self.model.cache_emo_audio_prompt == audio_path and self.model.cache_emo_cond is not None:
+            features.update({name: getattr(self.model, attr) for name, attr in self.EMOTION_ATTRS.items()})
+        if any(value is None for value in features.values()):
+            return None
+        return features
+
+    def import_speaker_features(self, audio_path: str, features: dict[str, Any]):
+        if not all(name in features for name in self.SPEAKER_ATTRS):
+            return
+        device = getattr(self.model, "device", "cpu")
+        for name, attr in self.SPEAKER_ATTRS.items():
+            setattr(self.model, attr, torch.as_tensor(features[name]).to(device))
+        self.model.cache_spk_audio_prompt = audio_path
+        if all(name in features for name in self.EMOTION_ATTRS):
+            for name, attr in self.EMOTION_ATTRS.items():
+                setattr(self.model, attr, torch.as_tensor(features[name]).to(device))
+            self.model.cache_emo_audio_prompt = audio_path
+
+    def get_cache_info(self) -> dict[str, Any]:
+        cached = self.model.cache_spk_cond is not None
+        return {
+            "speaker_cache_size": 1 if cached else 0,
+            "current": self.model.cache_spk_audio_prompt if cached else None,
+        }
+
+
+def _features_nbytes(features: dict[str, Any]) -> int:
+    total = 0
+    for value in features.values():
+        if isinstance(value, torch.Tensor):
+            total += value.element_size() * value.nelement()
+        else:
+            total += np.asarray(value).nbytes
+    return total
+
+
+def _features_to_host(features: dict[str, Any]) -> dict[str, Any]:
+    return {
+        name: value.detach().to("cpu") if isinstance(value, torch.Tensor) else value
+        for name, value in features.items()
+    }
+
+
+class _CacheEntry:
+    """设备缓存条目"""
+    def __init__(self, nbytes: int, pinned: bool):
+        self.nbytes = nbytes
+        self.pinned = pinned
+
+
+class SpeakerCacheManager:
+    """
+    说话人特征缓存管理器（两级 LRU）
+
+    设备（显存）层按字节预算做 LRU 淘汰，被淘汰的特征先转存到主机内存，
+    主机层超出预算后才真正丢弃（之后可从磁盘特征缓存或重新计算恢复）。
+    固定（pinned）的音色不会被淘汰。
+    需要模型提供 export_speaker_features / import_speaker_features / drop_speaker_features；
+    IndexTTS2 只缓存一个音色（见 IndexTTS2SpeakerSlot），显存占用本身有界，不使用本管理器。
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        loader: Callable[[Path], bool],
+        device_budget_bytes: int,
+        host_budget_bytes: int,
+        pinned_voices: Optional[list[str]] = None
+    ):
+        self.model = model
+        self._loader = loader
+        self.device_budget_bytes = device_budget_bytes
+        self.host_budget_bytes = host_budget_bytes
+        self._pinned_voices = set(pinned_voices or [])
+        self._device: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self._host: OrderedDict[str, tuple[dict[str, Any], int]] = OrderedDict()
+        self.device_bytes = 0
+        self.host_bytes = 0
+        self.stats = {"hits": 0, "host_hits": 0, "misses": 0, "evictions": 0, "drops": 0}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def is_supported(model: Any) -> bool:
+        return all(
+            callable(getattr(model, name, None))
+            for name in ("export_speaker_features", "import_speaker_features", "drop_speaker_features")
+        )
+
+    def _is_pinned(self, audio_path: str) -> bool:
+        path = Path(audio_path)
+        return path.parent.name in self._pinned_voices or path.stem in self._pinned_voices
+
+    def pin(self, voice_id: str):
+        """固定音色，使其特征常驻设备"""
+        with self._lock:
+            self._pinned_voices.add(voice_id)
+            for audio_path, entry in self._device.items():
+                entry.pinned = self._is_pinned(audio_path)
+
+    def unpin(self, voice_id: str):
+        with self._lock:
+            self._pinned_voices.discard(voice_id)
+            for audio_path, entry in self._device.items():
+                entry.pinned = self._is_pinned(audio_path)
+            self._enforce_budget()
+
+    def register(self, audio_path: str):
+        """记录已加载到设备的特征（预热后调用）"""
+        with self._lock:
+            if audio_path in self._device:
+                self._device.move_to_end(audio_path)
+                return
+            features = self.model.export_speaker_features(audio_path)
+            if not features:
+                return
+            entry = _CacheEntry(_features_nbytes(features), self._is_pinned(audio_path))
+            self._device[audio_path] = entry
+            self.device_bytes += entry.nbytes
+            self._drop_host(audio_path)
+            self._enforce_budget(keep=audio_path)
+
+    def ensure(self, audio_path: str):
+        """推理前调用：保证参考音频特征在设备上"""
+        with self._lock:
+            if audio_path in self._device:
+                self._device.move_to_end(audio_path)
+                self.stats["hits"] += 1
+                return
+
+            if audio_path in self._host:
+                features, _ = self._host[audio_path]
+                self.model.import_speaker_features(audio_path, features)
+                self._drop_host(audio_path)
+                self.stats["host_hits"] += 1
+            else:
+                self.stats["misses"] += 1
+                if not self._loader(Path(audio_path)):
+                    return
+            self.register(audio_path)
+
+    def _drop_host(self, audio_path: str):
+        entry = self._host.pop(audio_path, None)
+        if entry is not None:
+            self.host_bytes -= entry[1]
+
+    def _enforce_budget(self, keep: Optional[str] = None):
+        # keep 为刚登记、即将用于推理的条目，即使超出预算也不淘汰
+        while self.device_bytes > self.device_budget_bytes:
+            victim = next((p for p, e in self._device.items() if not e.pinned and p != keep), None)
+            if victim is None:
+                logger.warning("说话人缓存超出预算，但剩余条目均已固定或正在使用")
+                break
+            entry = self._device.pop(victim)
+            self.device_bytes -= entry.nbytes
+            features = self.model.export_speaker_features(victim)
+            self.model.drop_speaker_features(victim)
+            self.stats["evictions"] += 1
+            if features:
+                self._host[victim] = (_features_to_host(features), entry.nbytes)
+                self.host_bytes += entry.nbytes
+
+        while self.host_bytes > self.host_budget_bytes and self._host:
+            _, (_, nbytes) = self._host.popitem(last=False)
+            self.host_bytes -= nbytes
+            self.stats["drops"] += 1
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            return {
+                "device_entries": len(self._device),
+                "device_bytes": self.device_bytes,
+                "device_budget_bytes": self.device_budget_bytes,
+                "host_entries": len(self._host),
+                "host_bytes": self.host_bytes,
+                "host_budget_bytes": self.host_budget_bytes,
+                "pinned_voices": sorted(self._pinned_voices),
+                **self.stats,
+            }
@@ -0,0 +1,146 @@
+"""单次请求的分阶段耗时追踪（Server-Timing 响应头 + JSON 行日志）"""
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Server-Timing 中的阶段顺序（未列出的阶段排在后面）
+STAGE_ORDER = ("cache", "sentiment", "queue", "infer", "encode")
+
+
+class RequestTrace:
+    """
+    一次合成请求的追踪记录
+
+    各阶段耗时按名称累加（长文本/流式的多个片段合计），
+    片段之间并行执行，因此各阶段之和可能大于 total
+    """
+
+    def __init__(self, request_id: Optional[str] = None, **attributes: Any):
+        self.request_id = request_id or str(uuid.uuid4())
+        self.attributes: dict[str, Any] = attributes
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.stages: dict[str, float] = {}
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + max(0.0, seconds)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def fail(self, error: Any, status: str = "error"):
+        self.status = status
+        self.error = str(error)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started
+
+    def _ordered_stages(self) -> list[tuple[str, float]]:
+        order = {name: index for index, name in enumerate(STAGE_ORDER)}
+        return sorted(self.stages.items(), key=lambda item: order.get(item[0], len(order)))
+
+    def server_timing(self) -> str:
+        """Server-Timing 响应头，如 "queue;dur=12.3, infer;dur=850.1, total;dur=901.4\""""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self._ordered_stages()]
+        parts.append(f"total;dur={self.elapsed * 1000:.1f}")
+        return ", ".join(parts)
+
+    def to_record(self) -> dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "timestamp": round(self.started_at, 3),
+            **self.attributes,
+            "status": self.status,
+            "error": self.error,
+            "total_ms": round(self.elapsed * 1000, 1),
+            "stages_ms": {name: round(seconds * 1000, 1) for name, seconds in self._ordered_stages()},
+        }
+
+
+# 当前请求的追踪记录（由接口层设置，推理引擎各阶段写入；子任务继承同一对象）
+current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("current_trace", default=None)
+
+
+def record_stage(name: str, seconds: float):
+    """向当前请求的追踪记录累加阶段耗时（没有追踪记录时忽略）"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def trace_stage(name: str) -> Iterator[None]:
+    """统计代码块耗时并计入当前请求的追踪记录"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+class TraceExporter:
+    """
+    将追踪记录逐行写入 JSON Lines 文件
+
+    export() 在调用方序列化记录后交给单个写入线程，文件 I/O 不阻塞事件循环且保持记录顺序
+    """
+
+    def __init__(self, path: Optional[Path]):
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._file = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trace-writer")
+
+    def export(self, trace: RequestTrace):
+        if self.path is None:
+            return
+        line = json.dumps(trace.to_record(), ensure_ascii=False)
+        try:
+            self._executor.submit(self._write, line)
+        except RuntimeError:
+            # 关闭之后仍在结束的请求，记录直接丢弃
+            pass
+
+    def _write(self, line: str):
+        try:
+            with self._lock:
+                if self._file is None:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    self._file = open(self.path, "a", encoding="utf-8")
+                self._file.write(line + "\n")
+                self._file.flush()
+        except OSError as e:
+            logger.warning(f"写入请求追踪日志失败: {e}")
+
+    def close(self):
+        # 等待已提交的记录写完
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# 全局单例
+trace_exporter = TraceExporter(
+    settings.logs_dir / settings.request_trace_file if settings.request_trace_file else None
+)
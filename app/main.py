@@ -1,19 +1,33 @@
 """FastAPI 主应用入口"""
+import asyncio
+import json
 import logging
 import re
-import json
+import struct
+import time
+import uuid
 from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Annotated, Optional
+from typing import Annotated, Any, Awaitable, Optional
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import StreamingResponse, JSONResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
+from pydantic import ValidationError
 
+from app.core.admission import AdmissionRejected, admission
+from app.core.batching import DeadlineExceeded
 from app.core.config import settings
 from app.core.inference import tts_engine, tts_queue
+from app.core.metrics import ENCODE_SECONDS, QUEUE_LENGTH, QUEUE_PROCESSING, REQUEST_SECONDS, registry
+from app.core.result_cache import build_result_key, normalize_text_for_key, result_cache, seed_from_key
+from app.core.tracing import RequestTrace, current_trace, trace_exporter, trace_stage
+from app.services.batch_jobs import batch_jobs
+from app.services.catalogue import voice_catalogue
+from app.services.sentiment import sentiment_analyzer
 from app.models.schemas import (
     TTSRequest,
     VoicesResponse,
@@ -24,13 +38,19 @@ from app.models.schemas import (
     CharacterInfo,
     CharactersResponse,
     QueueStatusResponse,
-    QueuePositionResponse
+    QueuePositionResponse,
+    CacheStatusResponse,
+    BatchInfo,
+    BatchListResponse
 )
 from app.utils.audio import (
     save_audio_to_wav,
-    convert_wav_to_mp3,
-    validate_audio_file
+    validate_audio_file,
+    wav_stream_header,
+    audio_to_raw
 )
+from app.utils.encoders import encoder_pool
+from app.utils.text import SentenceStream
 
 # 配置日志
 logging.basicConfig(
@@ -50,14 +70,30 @@ def _sanitize_save_name(name: str) -> str:
     return name
 
 
+# 各输出格式的 Content-Type
+MEDIA_TYPES = {
+    "wav": "audio/wav",
+    "mp3": "audio/mpeg",
+    "opus": "audio/ogg",
+    "aac": "audio/aac",
+    "pcm16": "audio/L16",
+    "pcm_f32": "application/octet-stream",
+}
+RAW_FORMATS = ("pcm16", "pcm_f32")
+# 可保存到音频仓库的格式
+SAVABLE_FORMATS = ("wav", "mp3", "opus", "aac")
+
+
 def _build_save_path(save_name: str, response_format: str) -> Optional[Path]:
     safe_name = _sanitize_save_name(save_name)
     if not safe_name:
         return None
     base_name = safe_name
     lower_name = base_name.lower()
-    if lower_name.endswith(".wav") or lower_name.endswith(".mp3"):
-        base_name = base_name[:-4].strip().rstrip(".")
+    for ext in SAVABLE_FORMATS:
+        if lower_name.endswith(f".{ext}"):
+            base_name = base_name[:-len(ext) - 1].strip().rstrip(".")
+            break
     if not base_name:
         return None
     filename = f"{base_name}.{response_format}"
@@ -78,7 +114,13 @@ async def lifespan(app: FastAPI):
     settings.logs_dir.mkdir(parents=True, exist_ok=True)
     settings.generated_audio_dir.mkdir(parents=True, exist_ok=True)
     settings.char_dir.mkdir(parents=True, exist_ok=True)
-    
+
+    # 加载合成结果缓存索引
+    result_cache.load_index()
+
+    # 扫描音色与角色目录
+    await voice_catalogue.refresh_async()
+
     # 加载模型
     try:
         tts_engine.load_model()
@@ -87,12 +129,23 @@ async def lifespan(app: FastAPI):
         logger.error(f"✗ 模型加载失败: {e}")
         raise
     
+    # 监听目录变化，保持音色索引最新
+    voice_catalogue.start_watching()
+
+    # 恢复未完成的批量任务
+    await batch_jobs.start(_synthesize_batch_item)
+
     logger.info(f"✓ 服务已启动: http://{settings.host}:{settings.port}")
     
     yield
     
     # 关闭时清理
     logger.info("🛑 服务正在关闭...")
+    await voice_catalogue.stop_watching()
+    await batch_jobs.stop()
+    await sentiment_analyzer.close()
+    tts_engine.shutdown()
+    trace_exporter.close()
 
 
 # 创建 FastAPI 应用
@@ -110,6 +163,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing", "X-Cache"],
 )
 
 
@@ -132,80 +186,125 @@ async def get_queue_status():
     """
     获取TTS队列状态
 
-    返回当前队列长度、最大容量、是否正在处理等信息
+    返回当前队列长度、最大容量、是否正在处理等信息，以及按积压估计的新请求等待时间
     """
     try:
         status = await tts_queue.get_status()
+        estimate = admission.get_status()
         return QueueStatusResponse(
             queue_length=status["queue_length"],
             max_queue_size=status["max_queue_size"],
             is_processing=status["is_processing"],
-            can_submit=status["can_submit"]
+            can_submit=status["can_submit"],
+            processing_count=status["processing_count"],
+            pending_by_priority=status["pending_by_priority"],
+            estimated_wait_seconds=estimate["estimated_wait_by_priority"]["interactive"],
+            estimated_wait_by_priority=estimate["estimated_wait_by_priority"],
+            backlog_seconds=estimate["backlog_seconds"]
         )
     except Exception as e:
         logger.error(f"获取队列状态失败: {e}")
         raise HTTPException(status_code=500, detail="获取队列状态失败")
 
 
+@app.get("/v1/cache/status", response_model=CacheStatusResponse)
+async def get_cache_status():
+    """
+    获取缓存状态
+
+    返回说话人特征缓存和合成结果缓存的命中/未命中/淘汰计数与占用
+    """
+    try:
+        info = tts_engine.get_cache_info()
+        return CacheStatusResponse(
+            speaker=info.get("speaker", {}),
+            feature_store=info.get("feature_store", {}),
+            result=result_cache.get_stats(),
+            sentiment=sentiment_analyzer.get_stats()
+        )
+    except Exception as e:
+        logger.error(f"获取缓存状态失败: {e}")
+        raise HTTPException(status_code=500, detail="获取缓存状态失败")
+
+
+def _cache_metrics():
+    """说话人/合成结果/情感标签缓存的累计计数（多副本时汇总各副本）"""
+    speaker = tts_engine.get_cache_info().get("speaker", {})
+    if "replicas" in speaker:
+        speaker_stats = [(replica.get("cache") or {}).get("speaker", {}) for replica in speaker["replicas"]]
+    else:
+        speaker_stats = [speaker]
+    result_stats = result_cache.get_stats()
+    sentiment_stats = sentiment_analyzer.cache.get_stats()
+
+    def events(stats_list, names):
+        return [({"event": name}, sum(stats.get(name, 0) for stats in stats_list)) for name in names]
+
+    return [
+        ("tts_speaker_cache_events", "counter", "说话人特征缓存命中/未命中/淘汰次数",
+         events(speaker_stats, ("hits", "host_hits", "misses", "evictions"))),
+        ("tts_result_cache_events", "counter", "合成结果缓存命中/未命中/淘汰次数",
+         events([result_stats], ("hits", "misses", "evictions"))),
+        ("tts_result_cache_bytes", "gauge", "合成结果缓存占用字节数",
+         [({}, result_stats.get("total_bytes", 0))]),
+        ("tts_sentiment_cache_events", "counter", "情感标签缓存命中/未命中次数",
+         events([sentiment_stats], ("hits", "persisted_hits", "misses"))),
+    ]
+
+
+registry.register_collector(_cache_metrics)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus 指标
+
+    各阶段耗时直方图（排队、情感分析、推理、语速调整、重采样、编码、请求总耗时）、
+    实时率、队列拒绝与 Mock 回退计数、各缓存命中统计
+    """
+    status = await tts_queue.get_status()
+    QUEUE_LENGTH.set(status["queue_length"])
+    QUEUE_PROCESSING.set(status["processing_count"])
+    return Response(content=registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/v1/queue/{request_id}", response_model=QueuePositionResponse)
+async def get_queue_position(request_id: str):
+    """
+    查询请求在队列中的位置
+
+    位置按优先级和先来先服务顺序计算，0 表示正在处理，-1 表示不在队列中
+    """
+    try:
+        position = await tts_queue.get_position(request_id)
+        status = await tts_queue.get_status()
+        return QueuePositionResponse(
+            request_id=request_id,
+            position=position,
+            queue_length=status["queue_length"],
+            max_queue_size=status["max_queue_size"]
+        )
+    except Exception as e:
+        logger.error(f"获取队列位置失败: {e}")
+        raise HTTPException(status_code=500, detail="获取队列位置失败")
+
+
 @app.get("/v1/voices", response_model=VoicesResponse)
-async def get_voices():
+async def get_voices(request: Request, response: Response):
     """
     获取可用音色列表（支持新的层级结构）
-    
-    扫描 presets 目录下的所有音色文件夹
+
+    由内存中的音色目录索引提供，支持 ETag / If-None-Match
     """
     try:
-        voices = []
-        
-        if not settings.presets_dir.exists():
-            logger.warning(f"presets 目录不存在: {settings.presets_dir}")
-            return VoicesResponse(voices=[])
-        
-        # 扫描所有子目录（新结构）
-        for voice_dir in settings.presets_dir.iterdir():
-            if not voice_dir.is_dir():
-                continue
+        voices, etag = voice_catalogue.list_voices()
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+        return VoicesResponse(voices=[VoiceInfo(**voice) for voice in voices])
 
-            voice_id = voice_dir.name
-
-            # 获取该音色下的所有情感文件（支持大小写后缀）
-            emotions = []
-            has_default = False
-
-            for wav_file in list(voice_dir.glob("*.wav")) + list(voice_dir.glob("*.WAV")):
-                emotion_name = wav_file.stem
-                emotions.append(emotion_name)
-                if emotion_name.lower() == "default":
-                    has_default = True
-            
-            # 只有包含至少一个 wav 文件的目录才算有效音色
-            if emotions:
-                voices.append(
-                    VoiceInfo(
-                        id=voice_id,
-                        name=voice_id,
-                        emotions=sorted(emotions),
-                        has_default=has_default
-                    )
-                )
-        
-        # 兼容旧的扁平结构（支持大小写后缀）
-        for wav_file in list(settings.presets_dir.glob("*.wav")) + list(settings.presets_dir.glob("*.WAV")):
-            voice_id = wav_file.stem
-            # 避免重复添加（如果已经在新结构中）
-            if not any(v.id == voice_id for v in voices):
-                voices.append(
-                    VoiceInfo(
-                        id=voice_id,
-                        name=voice_id,
-                        emotions=["default"],
-                        has_default=True
-                    )
-                )
-        
-        logger.info(f"找到 {len(voices)} 个音色")
-        return VoicesResponse(voices=voices)
-        
     except Exception as e:
         logger.error(f"获取音色列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -221,8 +320,9 @@ async def list_audio_repository():
 
         items = []
         audio_files = [
-            *settings.generated_audio_dir.glob("*.wav"),
-            *settings.generated_audio_dir.glob("*.mp3"),
+            path
+            for ext in SAVABLE_FORMATS
+            for path in settings.generated_audio_dir.glob(f"*.{ext}")
         ]
         audio_files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
 
@@ -245,7 +345,7 @@ async def list_audio_repository():
 
 
 @app.post("/v1/audio/speech")
-async def create_speech(request: TTSRequest):
+async def create_speech(request: TTSRequest, http_request: Request):
     """
     语音合成接口（支持智能情感分析和高级参数）
     
@@ -261,33 +361,37 @@ async def create_speech(request: TTSRequest):
     - top_p: 核采样，影响音色多样性 (0.0-1.0)
     - top_k: Top-K采样，控制候选token数量 (1-100)
     - repetition_penalty: 重复惩罚 (0.1-2.0)
+
+    response_format: wav / mp3 / opus / aac / pcm16 / pcm_f32（裸 PCM，不经过容器封装和编码线程池）
+
+    stream=true 时按句子边界逐段合成，每段完成后立即输出（WAV 使用流式文件头，MP3/Opus/AAC 增量编码）
+
+    响应头 X-Request-ID 为本次请求在推理队列中的 ID，Server-Timing 给出各阶段耗时；
+    同一记录以 JSON 行写入 logs_dir 下的请求追踪日志
+
+    deadline_ms 为截止时间（自收到请求起算），超过后尚未推理的部分直接放弃并返回 504；
+    客户端断开时同样取消合成，排队中的任务不再占用模型
     """
+    deadline = _request_deadline(request)
+    if request.stream:
+        return _create_speech_stream(request, deadline)
+
+    trace = RequestTrace(
+        endpoint="speech",
+        mode="full",
+        voice=request.voice,
+        emotion=request.emotion,
+        format=request.response_format,
+        text_len=len(request.input)
+    )
+    trace_token = current_trace.set(trace)
+    started = time.perf_counter()
     try:
-        # 生成音频
-        audio_data = await tts_engine.generate(
-            text=request.input,
-            voice_id=request.voice,
-            emotion=request.emotion,
-            speed=request.speed,
-            temperature=request.temperature or 1.0,
-            top_p=request.top_p or 0.8,
-            top_k=request.top_k or 20,
-            repetition_penalty=request.repetition_penalty or 1.0
-        )
-        
-        # 转换为 WAV 格式
-        wav_bytes = save_audio_to_wav(audio_data)
-        
-        # 根据请求格式转换
-        if request.response_format == "mp3":
-            audio_bytes = convert_wav_to_mp3(wav_bytes)
-            media_type = "audio/mpeg"
-        else:
-            audio_bytes = wav_bytes
-            media_type = "audio/wav"
-        
-        # 持久化保存（可选）
+        # 持久化参数先于合成校验，无效请求不占用推理
+        save_path = None
         if request.save_audio:
+            if request.response_format not in SAVABLE_FORMATS:
+                raise HTTPException(status_code=400, detail="裸 PCM 格式不支持 save_audio")
             if not request.save_name:
                 raise HTTPException(status_code=400, detail="save_audio 为 true 时必须提供 save_name")
             save_path = _build_save_path(request.save_name, request.response_format)
@@ -295,25 +399,554 @@ async def create_speech(request: TTSRequest):
                 raise HTTPException(status_code=400, detail="save_name 无效")
             if save_path.exists():
                 raise HTTPException(status_code=409, detail="文件名已存在，请更换名称")
+
+        result = await _cancel_on_disconnect(
+            http_request,
+            _synthesize(request, request_id=trace.request_id, deadline=deadline)
+        )
+        if result is None:
+            trace.fail("客户端断开", status="aborted")
+            logger.info(f"客户端断开，已取消合成 [{trace.request_id}]")
+            return Response(status_code=499, headers={"X-Request-ID": trace.request_id})
+        audio_bytes, cache_status = result
+
+        # 持久化保存（可选）；合成期间同名文件可能已被其他请求写入，以独占模式创建
+        if save_path is not None:
             save_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(save_path, "wb") as f:
-                f.write(audio_bytes)
+            try:
+                with open(save_path, "xb") as f:
+                    f.write(audio_bytes)
+            except FileExistsError:
+                raise HTTPException(status_code=409, detail="文件名已存在，请更换名称")
             logger.info(f"✓ 生成音频已保存: {save_path}")
 
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            voice=request.voice, format=request.response_format, mode="full"
+        )
+
         # 返回流式响应
         return StreamingResponse(
             iter([audio_bytes]),
-            media_type=media_type,
+            media_type=MEDIA_TYPES[request.response_format],
             headers={
-                "Content-Disposition": f"attachment; filename=speech.{request.response_format}"
+                **_audio_headers(request.response_format),
+                "X-Cache": cache_status,
+                "X-Request-ID": trace.request_id,
+                "Server-Timing": trace.server_timing()
             }
         )
-        
+
+    except HTTPException as e:
+        trace.fail(e.detail)
+        e.headers = {**(e.headers or {}), "X-Request-ID": trace.request_id}
+        raise
+    except AdmissionRejected as e:
+        trace.fail(e, status="rejected")
+        raise _admission_error(e, trace.request_id)
+    except DeadlineExceeded as e:
+        trace.fail(e, status="deadline")
+        raise HTTPException(status_code=504, detail=str(e), headers={"X-Request-ID": trace.request_id})
     except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        trace.fail(e)
+        raise HTTPException(status_code=404, detail=str(e), headers={"X-Request-ID": trace.request_id})
     except Exception as e:
-        logger.error(f"语音合成失败: {e}")
-        raise HTTPException(status_code=500, detail=f"语音合成失败: {str(e)}")
+        trace.fail(e)
+        logger.error(f"语音合成失败 [{trace.request_id}]: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"语音合成失败: {str(e)}",
+            headers={"X-Request-ID": trace.request_id}
+        )
+    finally:
+        current_trace.reset(trace_token)
+        trace_exporter.export(trace)
+
+
+def _admission_error(e: AdmissionRejected, request_id: str) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after), "X-Request-ID": request_id}
+    )
+
+
+def _request_deadline(request: TTSRequest) -> Optional[float]:
+    """deadline_ms 换算为截止时间戳（time.time()）"""
+    return time.time() + request.deadline_ms / 1000 if request.deadline_ms else None
+
+
+async def _cancel_on_disconnect(http_request: Request, awaitable: Awaitable[Any]) -> Optional[Any]:
+    """
+    执行 awaitable，期间定期检查客户端是否断开；断开时取消它并返回 None
+
+    取消会传递到推理队列：排队中的任务直接出队，推理中的任务在后处理前放弃
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.disconnect_check_interval)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                return None
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def _synthesize(
+    request: TTSRequest,
+    request_id: Optional[str] = None,
+    enforce_admission: bool = True,
+    deadline: Optional[float] = None
+) -> tuple[bytes, str]:
+    """
+    合成并编码音频（先查合成结果缓存），返回 (音频字节, 缓存状态)
+
+    未命中缓存时先经过准入控制，预计完成时间超出 SLO 时抛出 AdmissionRejected
+    （enforce_admission 为 False 时只登记积压，不拒绝）；超过 deadline 时抛出 DeadlineExceeded
+    """
+    # 查询合成结果缓存
+    cache_key = None
+    cache_status = "BYPASS"
+    trace = current_trace.get()
+    if result_cache.enabled and request.use_cache:
+        with trace_stage("cache"):
+            loop = asyncio.get_event_loop()
+            # 参考音频指纹未命中备忘时需要读取并哈希音频文件，与缓存读取一样放到执行器中
+            cache_key = await loop.run_in_executor(None, _build_result_cache_key, request)
+            audio_bytes = await loop.run_in_executor(None, result_cache.get, cache_key)
+        if audio_bytes is not None:
+            if trace is not None:
+                trace.attributes["cache"] = "HIT"
+            return audio_bytes, "HIT"
+        cache_status = "MISS"
+    if trace is not None:
+        trace.attributes["cache"] = cache_status
+
+    # 生成音频
+    ticket = admission.admit(
+        request.input,
+        request.voice,
+        emotion=request.emotion,
+        speed=request.speed,
+        priority=request.priority,
+        enforce=enforce_admission
+    )
+    try:
+        audio_data = await tts_engine.generate(
+            text=request.input,
+            voice_id=request.voice,
+            emotion=request.emotion,
+            speed=request.speed,
+            temperature=request.temperature or 1.0,
+            top_p=request.top_p or 0.8,
+            top_k=request.top_k or 20,
+            repetition_penalty=request.repetition_penalty or 1.0,
+            request_id=request_id,
+            priority=request.priority,
+            seed=seed_from_key(cache_key) if cache_key and settings.result_cache_deterministic else None,
+            deadline=deadline
+        )
+    finally:
+        admission.release(ticket)
+
+    # 根据请求格式编码（MP3/Opus/AAC 在编码线程池中执行，不阻塞事件循环）
+    audio_bytes = await _encode_audio(audio_data, request.response_format)
+
+    if cache_key is not None:
+        try:
+            await asyncio.get_event_loop().run_in_executor(
+                None, result_cache.put, cache_key, audio_bytes, request.response_format
+            )
+        except OSError as e:
+            logger.warning(f"写入合成结果缓存失败: {e}")
+
+    return audio_bytes, cache_status
+
+
+async def _synthesize_batch_item(payload: dict) -> tuple[bytes, str]:
+    """批量任务条目的合成函数"""
+    request = TTSRequest(**payload)
+    # 批量条目在后台排队执行，只计入积压、不因 SLO 被拒绝；deadline_ms 自条目开始执行起算
+    audio_bytes, _ = await _synthesize(
+        request, enforce_admission=False, deadline=_request_deadline(request)
+    )
+    return audio_bytes, request.response_format
+
+
+def _parse_batch_lines(body: bytes) -> list[tuple[Optional[str], dict]]:
+    """解析 JSONL 批量请求，每行一个语音合成请求（可附带 custom_id）"""
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="请求体必须是 UTF-8 编码的 JSONL")
+
+    items = []
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            payload = json.loads(line)
+            if not isinstance(payload, dict):
+                raise ValueError("每行必须是一个 JSON 对象")
+            custom_id = payload.pop("custom_id", None)
+            request = TTSRequest(**payload)
+        except (ValueError, ValidationError) as e:
+            raise HTTPException(status_code=400, detail=f"第 {line_no} 行无效: {e}")
+        # 批量条目统一以低优先级、非流式执行，输出写入批次目录
+        request = request.model_copy(update={"priority": "batch", "stream": False, "save_audio": False})
+        items.append((None if custom_id is None else str(custom_id), request.model_dump()))
+    return items
+
+
+def _batch_info(info: dict) -> BatchInfo:
+    items = info.get("items")
+    if items is not None:
+        for item in items:
+            output = item.pop("output", None)
+            item["url"] = f"/generated_audio/batches/{output}" if output else None
+    return BatchInfo(**info)
+
+
+async def _encode_audio(audio_data, response_format: str):
+    """按输出格式编码音频；裸 PCM 直接转换为字节返回"""
+    if response_format in RAW_FORMATS:
+        return audio_to_raw(audio_data, response_format)
+    with ENCODE_SECONDS.time(format=response_format), trace_stage("encode"):
+        if response_format == "wav":
+            return save_audio_to_wav(audio_data)
+        return await encoder_pool.encode(audio_data, response_format)
+
+
+def _audio_headers(response_format: str) -> dict[str, str]:
+    headers = {"Content-Disposition": f"attachment; filename=speech.{response_format}"}
+    if response_format in RAW_FORMATS:
+        headers["X-Sample-Rate"] = str(settings.sample_rate)
+        headers["X-Channels"] = "1"
+    return headers
+
+
+def _build_result_cache_key(request: TTSRequest) -> str:
+    """合成结果缓存键：归一化文本 + 参考音频内容 + 情感 + 语速 + 采样参数 + 输出格式"""
+    return build_result_key(
+        text=normalize_text_for_key(request.input),
+        reference=tts_engine.reference_fingerprint(request.voice, request.emotion),
+        emotion=request.emotion,
+        speed=request.speed,
+        temperature=request.temperature or 1.0,
+        top_p=request.top_p or 0.8,
+        top_k=request.top_k or 20,
+        repetition_penalty=request.repetition_penalty or 1.0,
+        response_format=request.response_format,
+        sample_rate=settings.sample_rate,
+        model=tts_engine.fingerprint,
+        deterministic=settings.result_cache_deterministic
+    )
+
+
+def _create_speech_stream(request: TTSRequest, deadline: Optional[float] = None) -> StreamingResponse:
+    """
+    流式语音合成：逐段输出音频
+
+    客户端断开时响应体迭代被取消，取消沿 generate_stream 传递，已提交的下一段随之出队；
+    超过 deadline 时中断流
+    """
+    if request.save_audio:
+        raise HTTPException(status_code=400, detail="流式模式不支持 save_audio")
+
+    # 响应头先于音频发出，流式请求只返回 X-Request-ID，阶段耗时写入追踪日志
+    trace = RequestTrace(
+        endpoint="speech",
+        mode="stream",
+        voice=request.voice,
+        emotion=request.emotion,
+        format=request.response_format,
+        text_len=len(request.input)
+    )
+    try:
+        ticket = admission.admit(
+            request.input,
+            request.voice,
+            emotion=request.emotion,
+            speed=request.speed,
+            priority=request.priority
+        )
+    except AdmissionRejected as e:
+        trace.fail(e, status="rejected")
+        trace_exporter.export(trace)
+        raise _admission_error(e, trace.request_id)
+
+    async def audio_chunks():
+        async for audio_data in tts_engine.generate_stream(
+            text=request.input,
+            voice_id=request.voice,
+            emotion=request.emotion,
+            speed=request.speed,
+            temperature=request.temperature or 1.0,
+            top_p=request.top_p or 0.8,
+            top_k=request.top_k or 20,
+            repetition_penalty=request.repetition_penalty or 1.0,
+            request_id=trace.request_id,
+            priority=request.priority,
+            deadline=deadline
+        ):
+            yield audio_data
+
+    async def wav_body():
+        yield wav_stream_header()
+        async for audio_data in audio_chunks():
+            yield audio_to_raw(audio_data, "pcm16")
+
+    async def raw_body():
+        async for audio_data in audio_chunks():
+            yield audio_to_raw(audio_data, request.response_format)
+
+    async def logged(body):
+        current_trace.set(trace)
+        started = time.perf_counter()
+        completed = False
+        try:
+            async for chunk in body:
+                if "first_chunk_ms" not in trace.attributes:
+                    trace.attributes["first_chunk_ms"] = round((time.perf_counter() - started) * 1000, 1)
+                yield chunk
+            completed = True
+        except Exception as e:
+            # 响应头已发送，只能中断流
+            trace.fail(e, status="deadline" if isinstance(e, DeadlineExceeded) else "error")
+            logger.error(f"流式语音合成失败 [{trace.request_id}]: {e}")
+            raise
+        finally:
+            admission.release(ticket)
+            if not completed and trace.status == "ok":
+                trace.fail("客户端断开", status="aborted")
+            trace_exporter.export(trace)
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            voice=request.voice, format=request.response_format, mode="stream"
+        )
+
+    if request.response_format == "wav":
+        body = wav_body()
+    elif request.response_format in RAW_FORMATS:
+        body = raw_body()
+    else:
+        body = encoder_pool.encode_stream(audio_chunks(), request.response_format)
+
+    return StreamingResponse(
+        logged(body),
+        media_type=MEDIA_TYPES[request.response_format],
+        headers={**_audio_headers(request.response_format), "X-Request-ID": trace.request_id},
+        # 响应体未开始迭代就断开时 logged() 的 finally 不会执行，由后台任务兜底释放（release 可重复调用）
+        background=BackgroundTask(admission.release, ticket)
+    )
+
+
+# WebSocket 会话可设置的合成参数（其余字段由服务端固定）
+WS_CONFIG_FIELDS = (
+    "model", "voice", "emotion", "response_format", "speed", "use_cache", "priority",
+    "temperature", "top_p", "top_k", "repetition_penalty"
+)
+
+
+def _ws_config(current: dict, payload: dict) -> dict:
+    """合并会话参数并按 TTSRequest 校验（无效时抛出 ValidationError）"""
+    unknown = set(payload) - set(WS_CONFIG_FIELDS) - {"type"}
+    if unknown:
+        raise ValueError(f"不支持的参数: {', '.join(sorted(unknown))}")
+    config = {**current, **{key: value for key, value in payload.items() if key in WS_CONFIG_FIELDS}}
+    TTSRequest(input="-", **config)
+    return config
+
+
+@app.websocket("/v1/audio/ws")
+async def speech_websocket(websocket: WebSocket):
+    """
+    双工流式语音合成（WebSocket）
+
+    适合边生成边朗读 LLM 输出：客户端随到随发文本增量，服务端按句子边界切分，
+    每个句子闭合后立即进入推理队列，音频按序号依次推回同一连接。
+
+    客户端消息（JSON 文本帧；非 JSON 的文本帧视为文本增量）：
+    - {"type": "config", "voice": ..., "emotion": ..., "response_format": ..., ...}：更新会话参数，作用于之后的句子
+    - {"type": "text", "text": "..."}：文本增量
+    - {"type": "flush"}：立即将缓冲区剩余文本作为一个句子合成
+    - {"type": "end"}：flush，并在此前所有音频发送完毕后回复 {"type": "done"}
+    - {"type": "cancel", "seq"?: n}：跳过序号为 n 的句子（不指定时跳过所有未发送的句子），排队中的直接出队
+
+    服务端消息：
+    - {"type": "ready", "session_id", "sample_rate"}：连接建立
+    - {"type": "audio", "seq", "text", "format", "bytes"}，随后一个二进制帧：4 字节大端序号 + 音频数据
+      （默认 pcm16；wav/mp3 等格式每个句子为一段独立的完整音频）
+    - {"type": "error", "seq"?, "message"}：参数错误或某句合成失败（连接保持）
+    - {"type": "cancelled", "seq"}：该句已按 cancel 跳过
+    - {"type": "done", "segments"}：对应 end
+    """
+    await websocket.accept()
+    session_id = uuid.uuid4().hex[:16]
+    config: dict = {"response_format": "pcm16"}
+    splitter = SentenceStream(settings.stream_segment_max_chars)
+    semaphore = asyncio.Semaphore(settings.long_text_max_inflight)
+    # 发送队列：所有发送都经由同一个协程，保证帧顺序与音频序号一致
+    outbox: asyncio.Queue = asyncio.Queue()
+    tasks: dict[int, asyncio.Task] = {}  # 序号 -> 未发送句子的合成任务
+    next_seq = 0
+
+    async def synthesize_segment(request: TTSRequest, request_id: str) -> bytes:
+        async with semaphore:
+            started = time.perf_counter()
+            audio_bytes, _ = await _synthesize(request, request_id=request_id)
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                voice=request.voice, format=request.response_format, mode="ws"
+            )
+            return audio_bytes
+
+    def schedule(segment: str):
+        nonlocal next_seq
+        seq = next_seq
+        next_seq += 1
+        try:
+            request = TTSRequest(input=segment, **config)
+        except ValidationError as e:
+            outbox.put_nowait(("message", {"type": "error", "seq": seq, "message": str(e)}))
+            return
+        task = asyncio.ensure_future(synthesize_segment(request, f"{session_id}-{seq}"))
+        tasks[seq] = task
+        outbox.put_nowait(("audio", seq, segment, request.response_format, task))
+
+    async def sender():
+        while True:
+            entry = await outbox.get()
+            if entry[0] == "message":
+                await websocket.send_json(entry[1])
+                continue
+            _, seq, segment, response_format, task = entry
+            # asyncio.wait 不会因句子被取消而抛出，从而与发送协程自身的取消区分开
+            await asyncio.wait({task})
+            tasks.pop(seq, None)
+            if task.cancelled():
+                await websocket.send_json({"type": "cancelled", "seq": seq})
+                continue
+            try:
+                audio_bytes = task.result()
+            except AdmissionRejected as e:
+                await websocket.send_json({
+                    "type": "error", "seq": seq, "message": str(e), "retry_after": e.retry_after
+                })
+                continue
+            except Exception as e:
+                logger.error(f"WebSocket 合成失败 {session_id}#{seq}: {e}")
+                await websocket.send_json({"type": "error", "seq": seq, "message": str(e)})
+                continue
+            await websocket.send_json({
+                "type": "audio",
+                "seq": seq,
+                "text": segment,
+                "format": response_format,
+                "bytes": len(audio_bytes)
+            })
+            await websocket.send_bytes(struct.pack(">I", seq) + audio_bytes)
+
+    sender_task = asyncio.ensure_future(sender())
+    outbox.put_nowait(("message", {"type": "ready", "session_id": session_id, "sample_rate": settings.sample_rate}))
+    logger.info(f"WebSocket 会话建立: {session_id}")
+
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            raw = frame.get("text")
+            if raw is None:
+                outbox.put_nowait(("message", {"type": "error", "message": "只接受文本帧"}))
+                continue
+            try:
+                message = json.loads(raw)
+            except ValueError:
+                message = None
+            if not isinstance(message, dict):
+                message = {"type": "text", "text": raw}
+
+            kind = message.get("type")
+            if kind == "text":
+                for segment in splitter.feed(str(message.get("text", ""))):
+                    schedule(segment)
+            elif kind == "config":
+                try:
+                    config = _ws_config(config, message)
+                except (ValueError, ValidationError) as e:
+                    outbox.put_nowait(("message", {"type": "error", "message": f"参数无效: {e}"}))
+            elif kind in ("flush", "end"):
+                for segment in splitter.flush():
+                    schedule(segment)
+                if kind == "end":
+                    outbox.put_nowait(("message", {"type": "done", "segments": next_seq}))
+            elif kind == "cancel":
+                seq = message.get("seq")
+                if seq is None:
+                    targets = list(tasks.values())
+                else:
+                    targets = [tasks[seq]] if isinstance(seq, int) and seq in tasks else []
+                for task in targets:
+                    task.cancel()
+            else:
+                outbox.put_nowait(("message", {"type": "error", "message": f"未知的消息类型: {kind}"}))
+    except WebSocketDisconnect:
+        logger.info(f"WebSocket 会话断开: {session_id}")
+    finally:
+        # 客户端断开后不再合成剩余句子（排队中的请求随任务取消而出队）
+        sender_task.cancel()
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(sender_task, *tasks.values(), return_exceptions=True)
+
+
+@app.post("/v1/audio/batches", response_model=BatchInfo, status_code=202)
+async def create_batch(request: Request):
+    """
+    提交批量合成任务
+
+    请求体为 JSONL，每行一个与 /v1/audio/speech 相同的请求对象（可附带 custom_id）。
+    任务立即返回批次 ID，条目在后台以 batch 优先级执行，音频写入 generated_audio/batches/{批次ID}/，
+    服务重启后未完成的条目自动继续
+    """
+    items = _parse_batch_lines(await request.body())
+    if not items:
+        raise HTTPException(status_code=400, detail="批量请求为空")
+    if len(items) > settings.batch_job_max_items:
+        raise HTTPException(status_code=400, detail=f"单个批次最多 {settings.batch_job_max_items} 条")
+
+    batch_id = await batch_jobs.submit(items)
+    return _batch_info(await batch_jobs.get(batch_id, include_items=False))
+
+
+@app.get("/v1/audio/batches", response_model=BatchListResponse)
+async def list_batches(limit: int = 50):
+    """获取最近的批量任务"""
+    return BatchListResponse(batches=[_batch_info(info) for info in await batch_jobs.list_batches(limit)])
+
+
+@app.get("/v1/audio/batches/{batch_id}", response_model=BatchInfo)
+async def get_batch(batch_id: str):
+    """获取批量任务进度与各条目结果"""
+    info = await batch_jobs.get(batch_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail="批次不存在")
+    return _batch_info(info)
+
+
+@app.delete("/v1/audio/batches/{batch_id}", response_model=BatchInfo)
+async def cancel_batch(batch_id: str):
+    """取消批量任务（未开始的条目不再执行）"""
+    if not await batch_jobs.cancel(batch_id):
+        raise HTTPException(status_code=404, detail="批次不存在")
+    return _batch_info(await batch_jobs.get(batch_id, include_items=False))
 
 
 @app.post("/v1/voices/upload", response_model=UploadResponse)
@@ -367,6 +1000,15 @@ async def upload_voice(
             )
         
         logger.info(f"✓ 音色上传成功: {voice_id}/{emotion}.wav")
+
+        # 立即更新音色索引，无需等待目录监听
+        await voice_catalogue.refresh_async()
+
+        # 上传时即计算并缓存说话人特征，首个请求无需再提取
+        try:
+            await tts_engine.warmup_voice(save_path)
+        except Exception as e:
+            logger.warning(f"新音色预热失败 {save_path}: {e}")
         return UploadResponse(
             success=True,
             message="上传成功",
@@ -383,71 +1025,22 @@ async def upload_voice(
 
 
 @app.get("/v1/characters", response_model=CharactersResponse)
-async def get_characters():
+async def get_characters(request: Request, response: Response):
     """
     获取可用角色列表
 
-    扫描 char 目录下的所有角色文件夹
+    由内存中的音色目录索引提供，支持 ETag / If-None-Match。
     每个角色文件夹包含：
     - wav 音频文件（音色）
     - config.json（角色配置，包含系统提示词）
     """
     try:
-        characters = []
-
-        if not settings.char_dir.exists():
-            logger.warning(f"char 目录不存在: {settings.char_dir}")
-            return CharactersResponse(characters=[])
-
-        for char_dir in settings.char_dir.iterdir():
-            if not char_dir.is_dir():
-                continue
-
-            char_id = char_dir.name
-
-            # 跳过隐藏目录和 .ipynb_checkpoints 等系统目录
-            if char_id.startswith('.') or char_id == '__pycache__':
-                continue
-
-            voice_file = None
-            system_prompt = ""
-            char_name = char_id  # 默认使用目录名作为角色名
-
-            # 查找 wav 音频文件
-            wav_files = list(char_dir.glob("*.wav")) + list(char_dir.glob("*.WAV"))
-            if wav_files:
-                voice_file = wav_files[0].name
-
-            # 读取角色配置文件（支持任意 .json 文件，优先使用 config.json）
-            config_path = char_dir / "config.json"
-            if not config_path.exists():
-                # 如果没有 config.json，尝试查找其他 json 文件
-                json_files = list(char_dir.glob("*.json"))
-                if json_files:
-                    config_path = json_files[0]
-
-            if config_path.exists():
-                try:
-                    with open(config_path, "r", encoding="utf-8") as f:
-                        config_data = json.load(f)
-                        # 支持 system_prompt 或 system_prompt_instruction 字段
-                        system_prompt = config_data.get("system_prompt", "") or config_data.get("system_prompt_instruction", "")
-                        # 获取角色名
-                        char_name = config_data.get("char_name", char_id)
-                except Exception as e:
-                    logger.warning(f"读取角色配置失败 {char_id}: {e}")
-
-            characters.append(
-                CharacterInfo(
-                    id=char_id,
-                    name=char_name,
-                    voice=voice_file,
-                    system_prompt=system_prompt
-                )
-            )
+        characters, etag = voice_catalogue.list_characters()
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
 
-        logger.info(f"找到 {len(characters)} 个角色")
-        return CharactersResponse(characters=characters)
+        response.headers["ETag"] = etag
+        return CharactersResponse(characters=[CharacterInfo(**character) for character in characters])
 
     except Exception as e:
         logger.error(f"获取角色列表失败: {e}")
@@ -1,5 +1,5 @@
 """Pydantic 数据模型定义"""
-from typing import Literal, Optional
+from typing import Any, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -12,10 +12,25 @@ class TTSRequest(BaseModel):
         default="default", 
         description="情感标签。可选值: 'auto'(智能分析), 'default', 'happy', 'sad', 'angry', 'fear', 'surprise', 'neutral' 等"
     )
-    response_format: Literal["wav", "mp3"] = Field(default="wav", description="输出音频格式")
+    response_format: Literal["wav", "mp3", "opus", "aac", "pcm16", "pcm_f32"] = Field(
+        default="wav",
+        description="输出音频格式: wav, mp3, opus(ogg 容器), aac(adts), pcm16/pcm_f32(裸 PCM 单声道，采样率见 X-Sample-Rate)"
+    )
     speed: float = Field(default=1.0, ge=0.5, le=2.0, description="语速，范围0.5-2.0")
     save_audio: bool = Field(default=False, description="是否保存生成音频到本地仓库目录")
     save_name: Optional[str] = Field(default=None, description="保存的音频文件名（不含扩展名）")
+    use_cache: bool = Field(default=True, description="是否使用合成结果缓存；false 时强制重新合成")
+    stream: bool = Field(default=False, description="是否流式输出：按句子逐段合成，首句完成即开始返回音频")
+    priority: Literal["interactive", "batch"] = Field(
+        default="interactive",
+        description="调度优先级: 'interactive'(对话实时请求，优先执行), 'batch'(批量/长文本朗读)"
+    )
+    deadline_ms: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=3_600_000,
+        description="截止时间（毫秒，自收到请求起算）；超过后尚未推理的部分直接放弃并返回 504"
+    )
     
     # 高级参数（可选）
     temperature: Optional[float] = Field(default=1.0, ge=0.1, le=2.0, description="温度，控制生成的随机性")
@@ -76,11 +91,51 @@ class QueueStatusResponse(BaseModel):
     max_queue_size: int = Field(..., description="队列最大容量")
     is_processing: bool = Field(..., description="是否正在处理请求")
     can_submit: bool = Field(..., description="是否可以提交新请求")
+    processing_count: int = Field(default=0, description="正在处理的请求数")
+    pending_by_priority: dict[str, int] = Field(default_factory=dict, description="各优先级等待中的请求数")
+    estimated_wait_seconds: float = Field(default=0.0, description="新的 interactive 请求开始推理前的预计等待秒数")
+    estimated_wait_by_priority: dict[str, float] = Field(default_factory=dict, description="各优先级的预计等待秒数")
+    backlog_seconds: float = Field(default=0.0, description="已接纳未完成请求的预计推理总秒数")
 
 
 class QueuePositionResponse(BaseModel):
     """队列位置响应模型"""
     request_id: str = Field(..., description="请求ID")
-    position: int = Field(..., description="在队列中的位置 (1-based)，-1 表示不在队列中")
+    position: int = Field(..., description="在等待队列中的位置 (1-based)，0 表示正在处理，-1 表示不在队列中")
     queue_length: int = Field(..., description="当前队列长度")
     max_queue_size: int = Field(..., description="队列最大容量")
+
+
+class CacheStatusResponse(BaseModel):
+    """缓存状态响应模型"""
+    speaker: dict[str, Any] = Field(default_factory=dict, description="说话人特征缓存状态（命中/未命中/淘汰计数与内存占用）")
+    feature_store: dict[str, Any] = Field(default_factory=dict, description="磁盘特征缓存加载/计算计数")
+    result: dict[str, Any] = Field(default_factory=dict, description="合成结果缓存状态")
+    sentiment: dict[str, Any] = Field(default_factory=dict, description="情感分析结果缓存状态")
+
+
+class BatchItemInfo(BaseModel):
+    """批量任务条目"""
+    index: int = Field(..., description="条目在提交的 JSONL 中的序号（从 0 开始）")
+    custom_id: Optional[str] = Field(default=None, description="提交时附带的自定义 ID")
+    status: Literal["pending", "running", "succeeded", "failed", "cancelled"] = Field(..., description="条目状态")
+    url: Optional[str] = Field(default=None, description="生成音频的访问地址")
+    error: Optional[str] = Field(default=None, description="失败原因")
+
+
+class BatchInfo(BaseModel):
+    """批量任务状态响应模型"""
+    id: str = Field(..., description="批次 ID")
+    status: Literal["queued", "running", "completed", "cancelled"] = Field(..., description="批次状态")
+    total: int = Field(..., description="条目总数")
+    completed: int = Field(..., description="已成功的条目数")
+    failed: int = Field(..., description="失败的条目数")
+    pending: int = Field(..., description="等待中或执行中的条目数")
+    created_at: int = Field(..., description="创建时间（毫秒时间戳）")
+    updated_at: int = Field(..., description="状态更新时间（毫秒时间戳）")
+    items: Optional[list[BatchItemInfo]] = Field(default=None, description="各条目状态")
+
+
+class BatchListResponse(BaseModel):
+    """批量任务列表响应模型"""
+    batches: list[BatchInfo]
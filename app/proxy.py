@@ -0,0 +1,435 @@
+"""TTS 集群负载均衡代理"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Optional
+
+import httpx
+import uvicorn
+import websockets
+from fastapi import FastAPI, Request, Response, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.utils.hashring import affinity_key, shard_node_name, shard_ring
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 逐跳头部，不应转发
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "host", "content-length",
+}
+
+STRATEGY_LEAST_OUTSTANDING = "least_outstanding"
+STRATEGY_QUEUE = "queue"
+STRATEGY_VOICE_AFFINITY = "voice_affinity"
+STRATEGY_ESTIMATED_WAIT = "estimated_wait"
+STRATEGIES = (STRATEGY_LEAST_OUTSTANDING, STRATEGY_QUEUE, STRATEGY_VOICE_AFFINITY, STRATEGY_ESTIMATED_WAIT)
+
+# 按音色粘性路由的接口
+AFFINITY_PATHS = {"v1/audio/speech"}
+
+# 等待后端响应期间检查客户端是否断开的间隔（秒）
+DISCONNECT_CHECK_INTERVAL = 0.5
+
+
+async def _send_unless_disconnected(
+    client: httpx.AsyncClient,
+    upstream_request: httpx.Request,
+    request: Request
+) -> Optional[httpx.Response]:
+    """
+    转发请求并等待后端响应头；客户端先断开时取消转发（关闭到后端的连接）并返回 None
+
+    非流式合成的响应头要等整段音频合成完才返回，关闭连接使后端检测到断开并放弃排队中的任务
+    """
+    task = asyncio.ensure_future(client.send(upstream_request, stream=True))
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_CHECK_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                result = (await asyncio.gather(task, return_exceptions=True))[0]
+                if isinstance(result, httpx.Response):
+                    await result.aclose()
+                return None
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def _relay_websocket(websocket: WebSocket, upstream) -> None:
+    """在客户端与后端 WebSocket 之间双向转发帧，任一方关闭后关闭另一方"""
+
+    async def client_to_backend():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("text") is not None:
+                await upstream.send(message["text"])
+            elif message.get("bytes") is not None:
+                await upstream.send(message["bytes"])
+
+    async def backend_to_client():
+        try:
+            async for message in upstream:
+                if isinstance(message, str):
+                    await websocket.send_text(message)
+                else:
+                    await websocket.send_bytes(message)
+        except websockets.ConnectionClosed:
+            pass
+        await websocket.close(code=upstream.close_code or 1000)
+
+    tasks = [asyncio.ensure_future(client_to_backend()), asyncio.ensure_future(backend_to_client())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # 关闭到后端的连接，后端据此取消该会话中尚未发送的句子
+        await upstream.close()
+
+
+class Backend:
+    """后端实例状态"""
+
+    def __init__(self, url: str, node: str):
+        self.url = url.rstrip("/")
+        self.node = node  # 哈希环节点名，与实例的 WARMUP_SHARD_INDEX 对应
+        self.outstanding = 0  # 本代理转发中、尚未完成的请求数
+        self.queue_length = 0  # 最近一次健康检查上报的队列长度
+        self.estimated_wait = 0.0  # 最近一次健康检查上报的预计等待秒数
+        self.healthy = True
+        self.failures = 0
+        self.successes = 0
+        self.last_checked: Optional[float] = None
+
+    def load(self, strategy: str) -> float:
+        if strategy in (STRATEGY_QUEUE, STRATEGY_VOICE_AFFINITY):
+            # 健康检查之间新转发的请求尚未反映在 queue_length 中
+            return max(self.queue_length, self.outstanding)
+        if strategy == STRATEGY_ESTIMATED_WAIT:
+            # 上报的等待秒数之外，每个转发中的请求按 1 秒计，避免两次检查之间全部涌向同一实例
+            return self.estimated_wait + self.outstanding
+        return self.outstanding
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "url": self.url,
+            "node": self.node,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "queue_length": self.queue_length,
+            "estimated_wait": self.estimated_wait,
+            "last_checked": self.last_checked,
+        }
+
+
+class BackendPool:
+    """
+    后端池
+
+    按最少未完成请求（或上报的队列长度）选择后端；连续健康检查失败的后端被摘除，
+    恢复后连续通过若干次检查再重新加入。
+
+    voice_affinity 策略下，合成请求按音色在一致性哈希环上选择归属实例，
+    使同一音色集中在同一实例以提高说话人缓存命中率；归属实例负载超过
+    load_factor × 平均负载时按环上顺序溢出到下一个实例（有界负载一致性哈希）。
+    """
+
+    def __init__(
+        self,
+        urls: list[str],
+        strategy: str = STRATEGY_LEAST_OUTSTANDING,
+        health_interval: float = 5.0,
+        fall: int = 2,
+        rise: int = 2,
+        load_factor: float = 1.25
+    ):
+        self.backends = [Backend(url, shard_node_name(i)) for i, url in enumerate(urls)]
+        self.strategy = strategy
+        self.load_factor = load_factor
+        self.ring = shard_ring(len(self.backends))
+        self._by_node = {b.node: b for b in self.backends}
+        self.affinity_stats = {"owner": 0, "spillover": 0, "fallback": 0}
+        self.health_interval = health_interval
+        self.fall = fall
+        self.rise = rise
+        self._rr_offset = 0
+
+    def healthy_backends(self) -> list[Backend]:
+        return [b for b in self.backends if b.healthy]
+
+    def pick(self, exclude: tuple[Backend, ...] = ()) -> Optional[Backend]:
+        """选择负载最低的健康后端，负载相同时轮流选择"""
+        candidates = [b for b in self.healthy_backends() if b not in exclude]
+        if not candidates:
+            return None
+        self._rr_offset = (self._rr_offset + 1) % len(candidates)
+        rotated = candidates[self._rr_offset:] + candidates[:self._rr_offset]
+        return min(rotated, key=lambda b: b.load(self.strategy))
+
+    def pick_for_voice(self, voice: str, exclude: tuple[Backend, ...] = ()) -> Optional[Backend]:
+        """按音色选择后端：优先归属实例，负载超出上限时沿哈希环溢出"""
+        healthy = self.healthy_backends()
+        if not healthy:
+            return None
+        total_load = sum(b.load(self.strategy) for b in healthy)
+        # 加上本次请求后的平均负载 × 系数，至少为 1
+        limit = max(1, math.ceil(self.load_factor * (total_load + 1) / len(healthy)))
+
+        preference = self.ring.preference(affinity_key(voice))
+        for position, node in enumerate(preference):
+            backend = self._by_node[node]
+            if not backend.healthy or backend in exclude:
+                continue
+            if backend.load(self.strategy) < limit:
+                self.affinity_stats["owner" if position == 0 else "spillover"] += 1
+                return backend
+
+        self.affinity_stats["fallback"] += 1
+        return self.pick(exclude)
+
+    def mark_failure(self, backend: Backend):
+        backend.successes = 0
+        backend.failures += 1
+        if backend.healthy and backend.failures >= self.fall:
+            backend.healthy = False
+            logger.warning(f"后端已摘除: {backend.url}")
+
+    def mark_success(self, backend: Backend):
+        backend.failures = 0
+        backend.successes += 1
+        if not backend.healthy and backend.successes >= self.rise:
+            backend.healthy = True
+            logger.info(f"后端已恢复: {backend.url}")
+
+    async def check(self, client: httpx.AsyncClient, backend: Backend):
+        try:
+            response = await client.get(f"{backend.url}/v1/queue/status", timeout=3.0)
+            response.raise_for_status()
+            status = response.json()
+            backend.queue_length = int(status.get("queue_length", 0))
+            backend.estimated_wait = float(status.get("estimated_wait_seconds", 0.0))
+            self.mark_success(backend)
+        except Exception as e:
+            logger.debug(f"健康检查失败 {backend.url}: {e}")
+            self.mark_failure(backend)
+        backend.last_checked = time.time()
+
+    async def run_health_checks(self, client: httpx.AsyncClient):
+        while True:
+            await asyncio.gather(*(self.check(client, b) for b in self.backends))
+            await asyncio.sleep(self.health_interval)
+
+
+def _request_voice(method: str, path: str, body: bytes) -> Optional[str]:
+    """提取合成请求体中的 voice 字段"""
+    if method != "POST" or path.strip("/") not in AFFINITY_PATHS:
+        return None
+    try:
+        voice = json.loads(body).get("voice")
+    except (ValueError, AttributeError):
+        return None
+    return voice if isinstance(voice, str) and voice else None
+
+
+def create_app(pool: BackendPool, request_timeout: float = 300.0) -> FastAPI:
+    """创建代理应用"""
+    state: dict[str, Any] = {}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(request_timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=50)
+        )
+        state["client"] = client
+        checker = asyncio.create_task(pool.run_health_checks(client))
+        logger.info(f"负载均衡代理已启动: {len(pool.backends)} 个后端, 策略={pool.strategy}")
+        yield
+        checker.cancel()
+        await client.aclose()
+
+    app = FastAPI(title="TTS Load Balancer", lifespan=lifespan)
+
+    @app.get("/")
+    async def health():
+        """代理自身的健康检查，不转发到后端"""
+        return {
+            "status": "running",
+            "mode": "load_balancer",
+            "backends": [b.url for b in pool.backends],
+            "healthy_backends": len(pool.healthy_backends()),
+        }
+
+    @app.get("/proxy/status")
+    async def proxy_status():
+        return {
+            "status": "running",
+            "mode": "load_balancer",
+            "strategy": pool.strategy,
+            "affinity": pool.affinity_stats if pool.strategy == STRATEGY_VOICE_AFFINITY else None,
+            "backends": [b.to_dict() for b in pool.backends],
+        }
+
+    @app.websocket("/{path:path}")
+    async def proxy_websocket(websocket: WebSocket, path: str):
+        """
+        WebSocket 透传：按与 HTTP 相同的策略选择后端，整个会话固定在该后端
+
+        voice_affinity 策略下会话参数在首条消息之后才知道，可通过查询参数 ?voice= 指定音色
+        """
+        voice = websocket.query_params.get("voice") if pool.strategy == STRATEGY_VOICE_AFFINITY else None
+        query = f"?{websocket.url.query}" if websocket.url.query else ""
+
+        tried: tuple[Backend, ...] = ()
+        while True:
+            backend = pool.pick_for_voice(voice, exclude=tried) if voice else pool.pick(exclude=tried)
+            if backend is None:
+                # 1013: Try Again Later
+                await websocket.close(code=1013)
+                return
+            url = f"ws{backend.url[4:]}/{path}{query}"
+            try:
+                upstream = await websockets.connect(url, max_size=None, open_timeout=5)
+            except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake) as e:
+                pool.mark_failure(backend)
+                logger.warning(f"连接后端 WebSocket 失败 {backend.url}: {e}")
+                tried += (backend,)
+                continue
+            break
+
+        backend.outstanding += 1
+        try:
+            await websocket.accept()
+            await _relay_websocket(websocket, upstream)
+        finally:
+            backend.outstanding -= 1
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
+    async def proxy(request: Request, path: str):
+        client: httpx.AsyncClient = state["client"]
+        body = await request.body()
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+        voice = _request_voice(request.method, path, body) if pool.strategy == STRATEGY_VOICE_AFFINITY else None
+
+        tried: tuple[Backend, ...] = ()
+        while True:
+            if voice is not None:
+                backend = pool.pick_for_voice(voice, exclude=tried)
+            else:
+                backend = pool.pick(exclude=tried)
+            if backend is None:
+                return JSONResponse(status_code=503, content={"detail": "没有可用的后端实例"})
+
+            upstream_request = client.build_request(
+                method=request.method,
+                url=f"{backend.url}/{path}",
+                headers=headers,
+                content=body,
+                params=request.query_params
+            )
+            backend.outstanding += 1
+            try:
+                upstream = await _send_unless_disconnected(client, upstream_request, request)
+            except httpx.ConnectError as e:
+                # 请求未到达后端，换一个后端重试
+                backend.outstanding -= 1
+                pool.mark_failure(backend)
+                logger.warning(f"连接后端失败 {backend.url}: {e}")
+                tried += (backend,)
+                continue
+            except Exception:
+                backend.outstanding -= 1
+                raise
+            if upstream is None:
+                backend.outstanding -= 1
+                return Response(status_code=499)
+            if upstream.status_code == 429 and len(tried) + 1 < len(pool.healthy_backends()):
+                # 后端准入控制拒绝（未开始合成），换一个后端重试
+                await upstream.aclose()
+                backend.outstanding -= 1
+                tried += (backend,)
+                continue
+            break
+
+        released = False
+
+        async def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            await upstream.aclose()
+            backend.outstanding -= 1
+
+        async def stream_body():
+            try:
+                async for chunk in upstream.aiter_raw():
+                    yield chunk
+            finally:
+                await release()
+
+        response_headers = {
+            k: v for k, v in upstream.headers.items() if k.lower() not in HOP_BY_HOP_HEADERS
+        }
+        response_headers["X-Backend"] = backend.url
+        return StreamingResponse(
+            stream_body(),
+            status_code=upstream.status_code,
+            headers=response_headers,
+            background=BackgroundTask(release)
+        )
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TTS 集群负载均衡代理")
+    parser.add_argument("--backends", required=True, help="后端地址列表，逗号分隔")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址 (默认: 0.0.0.0)")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口 (默认: 8000)")
+    parser.add_argument(
+        "--strategy",
+        choices=STRATEGIES,
+        default=STRATEGY_LEAST_OUTSTANDING,
+        help="路由策略: least_outstanding(最少未完成请求) / queue(后端上报的队列长度) / "
+             "voice_affinity(按音色一致性哈希, 后端顺序需与实例 WARMUP_SHARD_INDEX 一致) / "
+             "estimated_wait(后端上报的预计等待秒数)"
+    )
+    parser.add_argument(
+        "--load-factor",
+        type=float,
+        default=1.25,
+        help="voice_affinity 策略下归属实例的负载上限系数 (默认: 1.25)"
+    )
+    parser.add_argument("--health-interval", type=float, default=5.0, help="健康检查间隔秒数 (默认: 5)")
+    args = parser.parse_args()
+
+    backends = [url.strip() for url in args.backends.split(",") if url.strip()]
+    pool = BackendPool(
+        backends,
+        strategy=args.strategy,
+        health_interval=args.health_interval,
+        load_factor=args.load_factor
+    )
+    uvicorn.run(create_app(pool), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""批量合成任务（异步作业 + SQLite 持久化）"""
+import asyncio
+import functools
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.admission import AdmissionRejected
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 批次状态
+BATCH_QUEUED = "queued"
+BATCH_RUNNING = "running"
+BATCH_COMPLETED = "completed"
+BATCH_CANCELLED = "cancelled"
+
+# 条目状态
+ITEM_PENDING = "pending"
+ITEM_RUNNING = "running"
+ITEM_SUCCEEDED = "succeeded"
+ITEM_FAILED = "failed"
+ITEM_CANCELLED = "cancelled"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    custom_id TEXT,
+    request TEXT NOT NULL,
+    status TEXT NOT NULL,
+    output TEXT,
+    error TEXT,
+    started_at REAL,
+    finished_at REAL,
+    PRIMARY KEY (batch_id, idx)
+);
+"""
+
+# 单个条目的合成函数：输入请求参数，返回 (编码后的音频字节, 文件扩展名)
+ItemSynthesizer = Callable[[dict[str, Any]], Awaitable[tuple[bytes, str]]]
+
+
+class BatchJobStore:
+    """
+    批次与条目状态的 SQLite 存储
+
+    方法本身是同步的；事件循环中通过 run() 在单线程执行器中串行调用，不阻塞事件循环
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-jobs-db")
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在存储的执行器中执行 fn"""
+        return await asyncio.get_event_loop().run_in_executor(
+            self._executor, functools.partial(fn, *args, **kwargs)
+        )
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+        return self._conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                return conn.execute(sql, params).fetchall()
+
+    def create(self, batch_id: str, items: list[tuple[Optional[str], dict[str, Any]]]):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO batches (id, status, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                    (batch_id, BATCH_QUEUED, len(items), now, now)
+                )
+                conn.executemany(
+                    "INSERT INTO batch_items (batch_id, idx, custom_id, request, status) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (batch_id, idx, custom_id, json.dumps(request, ensure_ascii=False), ITEM_PENDING)
+                        for idx, (custom_id, request) in enumerate(items)
+                    ]
+                )
+
+    def set_batch_status(self, batch_id: str, status: str):
+        self._execute(
+            "UPDATE batches SET status = ?, updated_at = ? WHERE id = ?",
+            (status, time.time(), batch_id)
+        )
+
+    def update_item(self, batch_id: str, idx: int, status: str, **fields: Any):
+        columns = ["status = ?"]
+        params: list[Any] = [status]
+        for key in ("output", "error", "started_at", "finished_at"):
+            if key in fields:
+                columns.append(f"{key} = ?")
+                params.append(fields[key])
+        self._execute(
+            f"UPDATE batch_items SET {', '.join(columns)} WHERE batch_id = ? AND idx = ?",
+            (*params, batch_id, idx)
+        )
+
+    def cancel(self, batch_id: str) -> bool:
+        """取消未结束的批次及其未开始的条目，批次不存在时返回 False"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                row = conn.execute("SELECT status FROM batches WHERE id = ?", (batch_id,)).fetchone()
+                if row is None:
+                    return False
+                if row["status"] in (BATCH_QUEUED, BATCH_RUNNING):
+                    conn.execute(
+                        "UPDATE batches SET status = ?, updated_at = ? WHERE id = ?",
+                        (BATCH_CANCELLED, now, batch_id)
+                    )
+                    conn.execute(
+                        "UPDATE batch_items SET status = ? WHERE batch_id = ? AND status = ?",
+                        (ITEM_CANCELLED, batch_id, ITEM_PENDING)
+                    )
+        return True
+
+    def reset_running(self):
+        """重启恢复：中断时仍在执行的条目重新排队"""
+        self._execute(
+            "UPDATE batch_items SET status = ?, started_at = NULL WHERE status = ?",
+            (ITEM_PENDING, ITEM_RUNNING)
+        )
+
+    def unfinished_batches(self) -> list[str]:
+        rows = self._execute(
+            "SELECT id FROM batches WHERE status IN (?, ?) ORDER BY created_at",
+            (BATCH_QUEUED, BATCH_RUNNING)
+        )
+        return [row["id"] for row in rows]
+
+    def pending_items(self, batch_id: str) -> list[sqlite3.Row]:
+        return self._execute(
+            "SELECT idx, custom_id, request FROM batch_items WHERE batch_id = ? AND status = ? ORDER BY idx",
+            (batch_id, ITEM_PENDING)
+        )
+
+    def get_batch(self, batch_id: str) -> Optional[sqlite3.Row]:
+        rows = self._execute("SELECT * FROM batches WHERE id = ?", (batch_id,))
+        return rows[0] if rows else None
+
+    def list_batches(self, limit: int = 50) -> list[sqlite3.Row]:
+        return self._execute("SELECT * FROM batches ORDER BY created_at DESC LIMIT ?", (limit,))
+
+    def get_items(self, batch_id: str) -> list[sqlite3.Row]:
+        return self._execute(
+            "SELECT idx, custom_id, status, output, error, started_at, finished_at "
+            "FROM batch_items WHERE batch_id = ? ORDER BY idx",
+            (batch_id,)
+        )
+
+    def count_items(self, batch_id: str) -> dict[str, int]:
+        rows = self._execute(
+            "SELECT status, COUNT(*) AS n FROM batch_items WHERE batch_id = ? GROUP BY status",
+            (batch_id,)
+        )
+        return {row["status"]: row["n"] for row in rows}
+
+
+def _write_output(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+class BatchJobManager:
+    """
+    批量合成任务管理器
+
+    批次提交后立即返回，条目在后台以 batch 优先级逐条送入推理队列，
+    不与实时请求争抢；推理队列已满时条目等待 retry_after 秒后重新提交，不计为失败。
+    状态写入 SQLite，服务重启后未完成的条目自动继续。
+    同时执行的条目数受 batch_job_concurrency 限制（所有批次共享）。
+    """
+
+    def __init__(self, store: BatchJobStore, output_dir: Path, concurrency: int = 2):
+        self.store = store
+        self.output_dir = Path(output_dir)
+        self.concurrency = max(1, concurrency)
+        self._synthesize: Optional[ItemSynthesizer] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._runners: dict[str, asyncio.Task] = {}
+
+    async def start(self, synthesize: ItemSynthesizer):
+        """启动管理器并恢复未完成的批次"""
+        self._synthesize = synthesize
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        await self.store.run(self.store.reset_running)
+        for batch_id in await self.store.run(self.store.unfinished_batches):
+            logger.info(f"恢复批量任务: {batch_id}")
+            self._spawn(batch_id)
+
+    async def stop(self):
+        runners = list(self._runners.values())
+        for runner in runners:
+            runner.cancel()
+        await asyncio.gather(*runners, return_exceptions=True)
+        self._runners.clear()
+        await asyncio.get_event_loop().run_in_executor(None, self.store.close)
+
+    async def submit(self, items: list[tuple[Optional[str], dict[str, Any]]]) -> str:
+        """提交一个批次，返回批次 ID"""
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+        await self.store.run(self.store.create, batch_id, items)
+        logger.info(f"批量任务已提交: {batch_id}, {len(items)} 条")
+        self._spawn(batch_id)
+        return batch_id
+
+    async def cancel(self, batch_id: str) -> bool:
+        """取消批次：未开始的条目不再执行，正在执行的条目完成后停止"""
+        return await self.store.run(self.store.cancel, batch_id)
+
+    def _spawn(self, batch_id: str):
+        runner = self._runners.get(batch_id)
+        if runner is None or runner.done():
+            self._runners[batch_id] = asyncio.get_event_loop().create_task(self._run_batch(batch_id))
+
+    async def _is_cancelled(self, batch_id: str) -> bool:
+        batch = await self.store.run(self.store.get_batch, batch_id)
+        return batch is None or batch["status"] == BATCH_CANCELLED
+
+    async def _run_batch(self, batch_id: str):
+        try:
+            await self.store.run(self.store.set_batch_status, batch_id, BATCH_RUNNING)
+            tasks = []
+            for row in await self.store.run(self.store.pending_items, batch_id):
+                await self._semaphore.acquire()
+                if await self._is_cancelled(batch_id):
+                    self._semaphore.release()
+                    break
+                tasks.append(asyncio.ensure_future(
+                    self._run_item(batch_id, row["idx"], row["custom_id"], json.loads(row["request"]))
+                ))
+            await asyncio.gather(*tasks)
+
+            if not await self._is_cancelled(batch_id):
+                await self.store.run(self.store.set_batch_status, batch_id, BATCH_COMPLETED)
+                counts = await self.store.run(self.store.count_items, batch_id)
+                logger.info(
+                    f"批量任务完成: {batch_id}, 成功 {counts.get(ITEM_SUCCEEDED, 0)} 条, "
+                    f"失败 {counts.get(ITEM_FAILED, 0)} 条"
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"批量任务执行异常 {batch_id}: {e}")
+        finally:
+            self._runners.pop(batch_id, None)
+
+    async def _run_item(self, batch_id: str, idx: int, custom_id: Optional[str], request: dict[str, Any]):
+        try:
+            await self.store.run(self.store.update_item, batch_id, idx, ITEM_RUNNING, started_at=time.time())
+            while True:
+                try:
+                    audio_bytes, ext = await self._synthesize(request)
+                    output_path = self.output_dir / batch_id / f"{idx:05d}.{ext}"
+                    await asyncio.get_event_loop().run_in_executor(None, _write_output, output_path, audio_bytes)
+                    break
+                except asyncio.CancelledError:
+                    raise
+                except AdmissionRejected as e:
+                    # 推理队列被实时请求占满：等待后重新提交，批次被取消时放弃
+                    logger.debug(f"批量任务条目等待队列 {batch_id}#{idx}: {e}")
+                    await asyncio.sleep(e.retry_after)
+                    if await self._is_cancelled(batch_id):
+                        await self.store.run(
+                            self.store.update_item, batch_id, idx, ITEM_CANCELLED, finished_at=time.time()
+                        )
+                        return
+                except Exception as e:
+                    logger.warning(f"批量任务条目失败 {batch_id}#{idx}: {e}")
+                    await self.store.run(
+                        self.store.update_item, batch_id, idx, ITEM_FAILED, error=str(e), finished_at=time.time()
+                    )
+                    return
+            await self.store.run(
+                self.store.update_item, batch_id, idx, ITEM_SUCCEEDED,
+                output=str(output_path.relative_to(self.output_dir)),
+                finished_at=time.time()
+            )
+        finally:
+            self._semaphore.release()
+
+    async def get(self, batch_id: str, include_items: bool = True) -> Optional[dict[str, Any]]:
+        """批次状态与进度"""
+        return await self.store.run(self._snapshot, batch_id, include_items)
+
+    async def list_batches(self, limit: int = 50) -> list[dict[str, Any]]:
+        def load() -> list[dict[str, Any]]:
+            return [self._snapshot(row["id"], False) for row in self.store.list_batches(limit)]
+
+        return await self.store.run(load)
+
+    def _snapshot(self, batch_id: str, include_items: bool) -> Optional[dict[str, Any]]:
+        """在存储执行器中读取批次信息"""
+        batch = self.store.get_batch(batch_id)
+        if batch is None:
+            return None
+        counts = self.store.count_items(batch_id)
+        info: dict[str, Any] = {
+            "id": batch["id"],
+            "status": batch["status"],
+            "total": batch["total"],
+            "completed": counts.get(ITEM_SUCCEEDED, 0),
+            "failed": counts.get(ITEM_FAILED, 0),
+            "pending": counts.get(ITEM_PENDING, 0) + counts.get(ITEM_RUNNING, 0),
+            "created_at": int(batch["created_at"] * 1000),
+            "updated_at": int(batch["updated_at"] * 1000),
+        }
+        if include_items:
+            info["items"] = [
+                {
+                    "index": row["idx"],
+                    "custom_id": row["custom_id"],
+                    "status": row["status"],
+                    "output": row["output"],
+                    "error": row["error"],
+                }
+                for row in self.store.get_items(batch_id)
+            ]
+        return info
+
+
+# 全局单例
+batch_jobs = BatchJobManager(
+    BatchJobStore(settings.batch_jobs_db),
+    settings.generated_audio_dir / "batches",
+    concurrency=settings.batch_job_concurrency
+)
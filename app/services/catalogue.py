@@ -0,0 +1,280 @@
+"""音色与角色目录索引"""
+import asyncio
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _wav_files(directory: Path) -> dict[str, Path]:
+    """目录下的 wav 文件（stem -> 路径），同名时小写后缀优先"""
+    files: dict[str, Path] = {}
+    for wav_file in list(directory.glob("*.wav")) + list(directory.glob("*.WAV")):
+        if wav_file.is_file():
+            files.setdefault(wav_file.stem, wav_file)
+    return files
+
+
+def _etag(payload: Any) -> str:
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return f'W/"{hashlib.sha1(data).hexdigest()}"'
+
+
+class _Snapshot:
+    """一次扫描得到的不可变目录快照"""
+
+    def __init__(self):
+        self.preset_voices: dict[str, dict[str, Path]] = {}  # presets/{voice_id}/{emotion}.wav
+        self.flat_voices: dict[str, Path] = {}  # presets/{voice}.wav（旧结构）
+        self.characters: dict[str, dict[str, Path]] = {}  # char/{char_id}/{voice}.wav
+        self.voices: list[dict[str, Any]] = []
+        self.character_list: list[dict[str, Any]] = []
+        self.voices_etag = ""
+        self.characters_etag = ""
+        self.signature: tuple = ()
+
+
+def _read_character(char_dir: Path, wav_files: dict[str, Path]) -> dict[str, Any]:
+    char_id = char_dir.name
+    system_prompt = ""
+    char_name = char_id  # 默认使用目录名作为角色名
+
+    voice_file = next(iter(wav_files.values())).name if wav_files else None
+
+    # 读取角色配置文件（支持任意 .json 文件，优先使用 config.json）
+    config_path = char_dir / "config.json"
+    if not config_path.exists():
+        json_files = list(char_dir.glob("*.json"))
+        if json_files:
+            config_path = json_files[0]
+
+    if config_path.exists():
+        try:
+            with open(config_path, "r", encoding="utf-8") as f:
+                config_data = json.load(f)
+                # 支持 system_prompt 或 system_prompt_instruction 字段
+                system_prompt = config_data.get("system_prompt", "") or config_data.get("system_prompt_instruction", "")
+                char_name = config_data.get("char_name", char_id)
+        except Exception as e:
+            logger.warning(f"读取角色配置失败 {char_id}: {e}")
+
+    return {
+        "id": char_id,
+        "name": char_name,
+        "voice": voice_file,
+        "system_prompt": system_prompt,
+    }
+
+
+def _scan_signature() -> tuple:
+    """目录中所有 wav/json 文件的 (路径, mtime, 大小)，用于轮询检测变化"""
+    entries = []
+    for root in (settings.presets_dir, settings.char_dir):
+        if not root.exists():
+            continue
+        for path in root.rglob("*"):
+            if path.suffix.lower() in (".wav", ".json") and path.is_file():
+                stat = path.stat()
+                entries.append((str(path), stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(entries))
+
+
+def _build_snapshot() -> _Snapshot:
+    snapshot = _Snapshot()
+    snapshot.signature = _scan_signature()
+
+    if settings.presets_dir.exists():
+        # 新结构: presets/{voice_id}/{emotion}.wav
+        for voice_dir in sorted(settings.presets_dir.iterdir()):
+            if not voice_dir.is_dir():
+                continue
+            emotions = _wav_files(voice_dir)
+            # 只有包含至少一个 wav 文件的目录才算有效音色
+            if emotions:
+                snapshot.preset_voices[voice_dir.name] = emotions
+                snapshot.voices.append({
+                    "id": voice_dir.name,
+                    "name": voice_dir.name,
+                    "emotions": sorted(emotions),
+                    "has_default": any(name.lower() == "default" for name in emotions),
+                })
+
+        # 兼容旧的扁平结构
+        snapshot.flat_voices = _wav_files(settings.presets_dir)
+        for voice_id in sorted(snapshot.flat_voices):
+            if voice_id not in snapshot.preset_voices:
+                snapshot.voices.append({
+                    "id": voice_id,
+                    "name": voice_id,
+                    "emotions": ["default"],
+                    "has_default": True,
+                })
+
+    if settings.char_dir.exists():
+        for char_dir in sorted(settings.char_dir.iterdir()):
+            # 跳过隐藏目录和 .ipynb_checkpoints 等系统目录
+            if not char_dir.is_dir() or char_dir.name.startswith('.') or char_dir.name == '__pycache__':
+                continue
+            wav_files = _wav_files(char_dir)
+            snapshot.characters[char_dir.name] = wav_files
+            snapshot.character_list.append(_read_character(char_dir, wav_files))
+
+    snapshot.voices_etag = _etag(snapshot.voices)
+    snapshot.characters_etag = _etag(snapshot.character_list)
+    return snapshot
+
+
+class VoiceCatalogue:
+    """
+    音色与角色目录索引
+
+    启动时扫描一次 presets 与 char 目录，之后由文件监听（watchfiles/inotify，
+    未安装时退化为 mtime 轮询）保持更新。音色列表、角色列表和参考音频路径解析都在内存中完成。
+    """
+
+    def __init__(self):
+        self._snapshot: Optional[_Snapshot] = None
+        self._watcher: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> _Snapshot:
+        if self._snapshot is None:
+            self.refresh()
+        return self._snapshot
+
+    def refresh(self) -> bool:
+        """重新扫描目录，返回内容是否有变化"""
+        new_snapshot = _build_snapshot()
+        old_snapshot = self._snapshot
+        self._snapshot = new_snapshot
+        changed = old_snapshot is None or old_snapshot.signature != new_snapshot.signature
+        if changed:
+            logger.info(
+                f"音色目录已更新: {len(new_snapshot.voices)} 个音色, "
+                f"{len(new_snapshot.character_list)} 个角色"
+            )
+        return changed
+
+    async def refresh_async(self) -> bool:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, self.refresh)
+
+    def list_voices(self) -> tuple[list[dict[str, Any]], str]:
+        """返回 (音色列表, ETag)"""
+        snapshot = self.snapshot
+        return snapshot.voices, snapshot.voices_etag
+
+    def list_characters(self) -> tuple[list[dict[str, Any]], str]:
+        """返回 (角色列表, ETag)"""
+        snapshot = self.snapshot
+        return snapshot.character_list, snapshot.characters_etag
+
+    def iter_reference_audios(self) -> Iterator[Path]:
+        """遍历所有参考音频"""
+        for _, path in self.iter_voice_audios():
+            yield path
+
+    def iter_voice_audios(self) -> Iterator[tuple[str, Path]]:
+        """遍历所有参考音频及其所属音色 ID（角色音色为 char/{char_id}/{voice_name}）"""
+        snapshot = self.snapshot
+        for voice_id, emotions in snapshot.preset_voices.items():
+            for path in emotions.values():
+                yield voice_id, path
+        for voice_id, path in snapshot.flat_voices.items():
+            yield voice_id, path
+        for char_id, wav_files in snapshot.characters.items():
+            for voice_name, path in wav_files.items():
+                yield f"char/{char_id}/{voice_name}", path
+
+    def resolve(self, voice_id: str, emotion: str = "default") -> Path:
+        """
+        解析参考音频路径（支持新的层级结构和角色音色）
+        新结构: presets/{voice_id}/{emotion}.wav
+        角色音色: char/{char_id}/{voice_file}.wav
+        """
+        snapshot = self.snapshot
+        voice_id = voice_id.replace(".wav", "")
+        emotion = emotion.replace(".wav", "")
+
+        # 检查是否是角色音色路径 (格式: char/{char_id}/{voice_name})
+        if voice_id.startswith("char/"):
+            parts = voice_id.split("/")
+            if len(parts) >= 3:
+                char_id = parts[1]
+                voice_name = parts[2]
+                char_audio_path = snapshot.characters.get(char_id, {}).get(voice_name)
+                if char_audio_path is not None:
+                    logger.info(f"使用角色音色: {char_id}/{voice_name}")
+                    return char_audio_path
+                raise FileNotFoundError(f"角色音色不存在: {settings.char_dir / char_id / f'{voice_name}.wav'}")
+
+        emotions = snapshot.preset_voices.get(voice_id, {})
+        if emotion in emotions:
+            logger.info(f"使用音色: {voice_id}/{emotion}")
+            return emotions[emotion]
+
+        if "default" in emotions:
+            logger.warning(f"情感 {emotion} 不存在，使用 {voice_id}/default")
+            return emotions["default"]
+
+        if voice_id in snapshot.flat_voices:
+            logger.warning(f"使用旧结构音色: {voice_id}.wav（建议迁移到新结构）")
+            return snapshot.flat_voices[voice_id]
+
+        voice_dir = settings.presets_dir / voice_id
+        raise FileNotFoundError(
+            f"音色 {voice_id} 不存在。请确保以下路径之一存在：\n"
+            f"  - {voice_dir / f'{emotion}.wav'}\n"
+            f"  - {voice_dir / 'default.wav'}\n"
+            f"  - {settings.presets_dir / f'{voice_id}.wav'}"
+        )
+
+    def start_watching(self):
+        """启动后台目录监听"""
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.get_event_loop().create_task(self._watch())
+
+    async def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+
+    async def _watch(self):
+        roots = [str(root) for root in (settings.presets_dir, settings.char_dir) if root.exists()]
+        try:
+            from watchfiles import awatch
+        except ImportError:
+            awatch = None
+
+        if awatch is not None and roots:
+            logger.info("音色目录监听: watchfiles")
+            try:
+                async for _ in awatch(*roots, debounce=500):
+                    await self.refresh_async()
+                return
+            except Exception as e:
+                logger.warning(f"watchfiles 监听失败，改用轮询: {e}")
+
+        logger.info(f"音色目录监听: 每 {settings.catalogue_poll_interval} 秒轮询")
+        while True:
+            await asyncio.sleep(settings.catalogue_poll_interval)
+            try:
+                loop = asyncio.get_event_loop()
+                signature = await loop.run_in_executor(None, _scan_signature)
+                if signature != self.snapshot.signature:
+                    await self.refresh_async()
+            except Exception as e:
+                logger.warning(f"音色目录轮询失败: {e}")
+
+
+# 全局单例
+voice_catalogue = VoiceCatalogue()
@@ -0,0 +1,125 @@
+"""基于词典与标点线索的本地情感分类器"""
+import re
+from typing import Iterable
+
+# 各情感的关键词与权重（中文按子串匹配，英文按单词匹配）
+_KEYWORDS: dict[str, dict[str, float]] = {
+    "happy": {
+        "开心": 2, "高兴": 2, "快乐": 2, "幸福": 2, "喜欢": 1.5, "太好了": 2, "哈哈": 2, "嘻嘻": 1.5,
+        "嘿嘿": 1, "好棒": 2, "真棒": 2, "谢谢": 1, "感谢": 1, "爱你": 2, "兴奋": 2, "满意": 1.5,
+        "耶": 1, "好耶": 2, "笑": 1, "欢迎": 1, "恭喜": 2, "期待": 1,
+        "happy": 2, "glad": 2, "great": 1.5, "awesome": 2, "love": 1.5, "wonderful": 2, "thanks": 1,
+        "thank": 1, "yay": 2, "excited": 2, "haha": 2, "lol": 1.5, "nice": 1, "congrats": 2, "fun": 1,
+    },
+    "sad": {
+        "难过": 2, "伤心": 2, "悲伤": 2, "哭": 1.5, "遗憾": 1.5, "可惜": 1.5, "失望": 2, "孤独": 2,
+        "寂寞": 2, "想念": 1, "对不起": 1, "抱歉": 1, "痛苦": 2, "心疼": 1.5, "呜呜": 2, "唉": 1.5,
+        "离开": 1, "再也": 1, "委屈": 2, "累": 1,
+        "sad": 2, "sorry": 1, "miss": 1, "cry": 2, "crying": 2, "lonely": 2, "unfortunately": 1.5,
+        "disappointed": 2, "tears": 1.5, "heartbroken": 2.5, "alas": 1.5,
+    },
+    "angry": {
+        "生气": 2, "愤怒": 2.5, "气死": 2.5, "滚": 2, "可恶": 2, "讨厌": 1.5, "烦": 1.5, "闭嘴": 2.5,
+        "混蛋": 2.5, "该死": 2, "受够": 2, "凭什么": 2, "怎么敢": 2, "恼火": 2, "火大": 2,
+        "angry": 2, "mad": 1.5, "furious": 2.5, "hate": 2, "damn": 1.5, "shut up": 2.5,
+        "annoying": 1.5, "how dare": 2.5, "enough": 1,
+    },
+    "fear": {
+        "害怕": 2, "恐惧": 2.5, "可怕": 2, "吓": 1.5, "担心": 1.5, "紧张": 1.5, "不安": 1.5, "救命": 2.5,
+        "危险": 1.5, "慌": 1.5, "怕": 1, "颤抖": 2, "小心": 1,
+        "afraid": 2, "scared": 2, "fear": 2, "terrified": 2.5, "help": 1, "worried": 1.5,
+        "nervous": 1.5, "danger": 1.5, "creepy": 1.5,
+    },
+    "surprise": {
+        "什么": 1, "真的吗": 2, "竟然": 2, "居然": 2, "没想到": 2, "天哪": 2, "天啊": 2, "哇": 2,
+        "震惊": 2, "不会吧": 2, "难道": 1, "意外": 1.5, "咦": 1.5,
+        "wow": 2, "really": 1, "what": 1, "omg": 2, "unbelievable": 2, "surprised": 2,
+        "no way": 2, "whoa": 2, "seriously": 1.5,
+    },
+}
+
+# 表情符号与颜文字
+_EMOTICONS: dict[str, dict[str, float]] = {
+    "happy": {"😀": 2, "😄": 2, "😂": 2, "🤣": 2, "😊": 2, "😍": 2, "❤": 1.5, "👍": 1, "^_^": 2, ":)": 1.5, ":d": 2},
+    "sad": {"😢": 2, "😭": 2.5, "😞": 2, "💔": 2.5, "T_T": 2, ":(": 1.5},
+    "angry": {"😠": 2.5, "😡": 2.5, "🤬": 3, "💢": 2},
+    "fear": {"😨": 2.5, "😱": 2.5, "😰": 2},
+    "surprise": {"😮": 2, "😲": 2, "🤯": 2, "😯": 2},
+}
+
+# 否定词出现在关键词前时不计分（中文看前两个字，英文看前一两个词）
+_CN_NEGATIONS = ("不", "没", "别", "无")
+_EN_NEGATION = re.compile(r"\b(not|no|never|don't|didn't|isn't|wasn't|can't)\s+(\w+\s+)?$")
+
+_ASCII_WORD = re.compile(r"^[a-z' ]+$")
+
+
+def _occurrences(text: str, keyword: str) -> Iterable[int]:
+    if _ASCII_WORD.match(keyword):
+        pattern = rf"\b{re.escape(keyword)}\b"
+        return (m.start() for m in re.finditer(pattern, text))
+    return (m.start() for m in re.finditer(re.escape(keyword), text))
+
+
+def _negated(text: str, position: int) -> bool:
+    if any(negation in text[max(0, position - 2):position] for negation in _CN_NEGATIONS):
+        return True
+    return bool(_EN_NEGATION.search(text[max(0, position - 24):position]))
+
+
+class LexiconClassifier:
+    """
+    词典情感分类器
+
+    按关键词、表情符号和标点（感叹号、问号、省略号）累计各情感得分，
+    纯字符串匹配，无需模型与网络。返回 (标签, 置信度)，置信度为最高分在总分中的占比并按总分衰减
+    """
+
+    def __init__(self, labels: list[str]):
+        self.labels = labels
+
+    def _map_label(self, label: str) -> str:
+        """映射到部署配置的标签集"""
+        if label in self.labels:
+            return label
+        for fallback in ("neutral", "default"):
+            if fallback in self.labels:
+                return fallback
+        return self.labels[0] if self.labels else "default"
+
+    def scores(self, text: str) -> dict[str, float]:
+        lowered = text.lower()
+        scores = {label: 0.0 for label in _KEYWORDS}
+
+        for label, keywords in _KEYWORDS.items():
+            for keyword, weight in keywords.items():
+                for position in _occurrences(lowered, keyword):
+                    if not _negated(lowered, position):
+                        scores[label] += weight
+        for label, emoticons in _EMOTICONS.items():
+            for emoticon, weight in emoticons.items():
+                scores[label] += lowered.count(emoticon.lower()) * weight
+
+        # 标点线索：叹号加强已有的强烈情绪，问号叠叹号倾向惊讶，省略号倾向低落
+        exclamations = len(re.findall(r"[!！]", text))
+        if exclamations:
+            strongest = max(("happy", "angry", "surprise"), key=lambda k: scores[k])
+            if scores[strongest] > 0:
+                scores[strongest] += min(exclamations, 3) * 0.5
+        if re.search(r"[?？][!！]|[!！][?？]", text):
+            scores["surprise"] += 1.5
+        if re.search(r"(……|\.\.\.|…)", text):
+            scores["sad"] += 0.5
+        return scores
+
+    def classify(self, text: str) -> tuple[str, float]:
+        """返回 (情感标签, 置信度 0-1)；没有任何线索时返回中性标签和 0"""
+        scores = self.scores(text)
+        total = sum(scores.values())
+        if total <= 0:
+            return self._map_label("neutral"), 0.0
+
+        label, top = max(scores.items(), key=lambda item: item[1])
+        # 占比高且证据充足时置信度高；只有一条弱线索时置信度打折
+        confidence = (top / total) * min(1.0, top / 3.0)
+        return self._map_label(label), round(confidence, 3)
@@ -1,22 +1,157 @@
 """智能情感分析服务"""
+import json
 import logging
 import asyncio
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Optional
 from openai import AsyncOpenAI
 
 from app.core.config import settings
+from app.core.result_cache import build_result_key, normalize_text_for_key
+from app.services.emotion_lexicon import LexiconClassifier
 
 logger = logging.getLogger(__name__)
 
 
+class SentimentCache:
+    """
+    情感标签缓存
+
+    内存中按 LRU + TTL 保存 文本指纹 -> 标签；配置了 path 时同时写入 SQLite，重启后仍可命中。
+    内存命中直接返回，SQLite 读写在单线程执行器中串行进行，不阻塞事件循环
+    """
+
+    def __init__(self, max_entries: int, ttl: float, path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = Path(path) if path else None
+        self._entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment-cache")
+        self.stats = {"hits": 0, "misses": 0, "persisted_hits": 0}
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self.path is None:
+            return None
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sentiment (key TEXT PRIMARY KEY, label TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def _load(self, key: str) -> Optional[tuple[str, float]]:
+        try:
+            conn = self._connection()
+            return conn.execute(
+                "SELECT label, created_at FROM sentiment WHERE key = ?", (key,)
+            ).fetchone() if conn is not None else None
+        except sqlite3.Error as e:
+            logger.warning(f"读取情感缓存失败: {e}")
+            return None
+
+    def _store(self, key: str, label: str, created_at: float):
+        try:
+            conn = self._connection()
+            if conn is not None:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO sentiment (key, label, created_at) VALUES (?, ?, ?)",
+                        (key, label, created_at)
+                    )
+        except sqlite3.Error as e:
+            logger.warning(f"写入情感缓存失败: {e}")
+
+    async def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                label, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return label
+                del self._entries[key]
+
+        row = None
+        if self.path is not None:
+            row = await asyncio.get_event_loop().run_in_executor(self._executor, self._load, key)
+        with self._lock:
+            if row is not None and now - row[1] <= self.ttl:
+                self._remember(key, row[0], row[1])
+                self.stats["persisted_hits"] += 1
+                return row[0]
+            self.stats["misses"] += 1
+            return None
+
+    async def put(self, key: str, label: str):
+        now = time.time()
+        with self._lock:
+            self._remember(key, label, now)
+        if self.path is not None:
+            await asyncio.get_event_loop().run_in_executor(self._executor, self._store, key, label, now)
+
+    def _remember(self, key: str, label: str, created_at: float):
+        self._entries[key] = (label, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "persistent": self.path is not None, **self.stats}
+
+
+# 情感分类后端
+BACKEND_LLM = "llm"
+BACKEND_LEXICON = "lexicon"
+BACKEND_HYBRID = "hybrid"
+
+
 class SentimentAnalyzer:
-    """基于 LLM 的情感分析器"""
+    """
+    情感分析器
+
+    后端由 sentiment_backend 选择：
+    - llm: 远程 OpenAI 兼容接口
+    - lexicon: 本地词典分类器（亚毫秒级，无网络依赖）
+    - hybrid: 先用词典分类，置信度低于阈值时才请求 LLM（未配置 LLM 时直接使用词典结果）
+    """
     
     def __init__(self):
         self.client: Optional[AsyncOpenAI] = None
         self.enabled = settings.enable_smart_sentiment
+        self.backend = settings.sentiment_backend
+        self.lexicon = LexiconClassifier(settings.sentiment_labels)
+        self.lexicon_stats = {"local": 0, "escalated": 0}
+        self.cache = SentimentCache(
+            settings.sentiment_cache_size,
+            settings.sentiment_cache_ttl,
+            settings.sentiment_cache_path
+        )
+        # 相同文本的并发分析只发起一次请求
+        self._inflight: dict[str, asyncio.Task] = {}
+        # 微批处理：短时间内的多条待分析文本合并为一次 LLM 请求
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._batch_full = asyncio.Event()
+        self._flusher: Optional[asyncio.Task] = None
+        # 事件循环只弱引用任务，发出的批次需要持有引用直到完成
+        self._batch_tasks: set[asyncio.Task] = set()
+        self.batch_stats = {"requests": 0, "texts": 0, "fallbacks": 0}
         
-        if self.enabled and settings.sentiment_llm_api_key:
+        if self.enabled and self.backend != BACKEND_LLM:
+            logger.info(f"✓ 本地情感分类已启用 (后端: {self.backend})")
+
+        if self.enabled and self.backend != BACKEND_LEXICON and settings.sentiment_llm_api_key:
             try:
                 self.client = AsyncOpenAI(
                     base_url=settings.sentiment_llm_base_url,
@@ -26,8 +161,9 @@ class SentimentAnalyzer:
                 logger.info("✓ 情感分析服务已启用")
             except Exception as e:
                 logger.error(f"✗ 情感分析服务初始化失败: {e}")
-                self.enabled = False
-        else:
+                if self.backend == BACKEND_LLM:
+                    self.enabled = False
+        elif self.backend == BACKEND_LLM:
             logger.info("情感分析服务未启用")
     
     def _build_prompt(self, text: str) -> str:
@@ -45,6 +181,61 @@ class SentimentAnalyzer:
         
         return prompt
     
+    def _build_batch_prompt(self, texts: list[str]) -> str:
+        """构建批量情感分析 Prompt"""
+        labels_str = ", ".join([f"'{label}'" for label in settings.sentiment_labels])
+        numbered = "\n".join(
+            f"{index}. {json.dumps(text, ensure_ascii=False)}" for index, text in enumerate(texts, start=1)
+        )
+
+        prompt = f"""你是一个情感分析助手。请分别分析以下 {len(texts)} 段编号文本的情感，每段严格从以下列表中选择一个最匹配的标签：[{labels_str}]。
+
+**规则：**
+1. 仅返回一个 JSON 字符串数组，按编号顺序每段文本对应一个标签，数组长度必须为 {len(texts)}
+2. 不要包含任何 markdown 格式或解释性文字
+3. 必须从给定列表中选择，无法判断的返回 'neutral'
+
+待分析文本：
+{numbered}"""
+
+        return prompt
+
+    async def close(self):
+        """关闭时取消尚未完成的批量分析"""
+        tasks = [*self._batch_tasks]
+        if self._flusher is not None:
+            tasks.append(self._flusher)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+    def get_stats(self) -> dict:
+        """情感分析缓存与批处理统计"""
+        return {
+            **self.cache.get_stats(),
+            "backend": self.backend,
+            "batch": dict(self.batch_stats),
+            "lexicon": dict(self.lexicon_stats),
+        }
+
+    @staticmethod
+    def _normalize_label(raw: str) -> Optional[str]:
+        """清理 LLM 返回的标签，不在白名单内返回 None"""
+        emotion = str(raw).strip().lower()
+        emotion = emotion.replace("'", "").replace('"', "").replace(".", "").strip()
+        return emotion if emotion in settings.sentiment_labels else None
+
+    def _cache_key(self, text: str) -> str:
+        # 模型或标签集变化后旧结果自动失效
+        return build_result_key(
+            text=normalize_text_for_key(text),
+            model=settings.sentiment_llm_model,
+            labels=settings.sentiment_labels
+        )
+
     async def analyze(self, text: str) -> str:
         """
         分析文本情感
@@ -56,10 +247,148 @@ class SentimentAnalyzer:
             情感标签（如果失败返回 "default"）
         """
         # 如果服务未启用，直接返回 default
-        if not self.enabled or not self.client:
+        if not self.enabled:
             logger.debug("情感分析服务未启用，返回 default")
             return "default"
-        
+
+        if self.backend in (BACKEND_LEXICON, BACKEND_HYBRID):
+            emotion, confidence = self.lexicon.classify(text)
+            if (self.backend == BACKEND_LEXICON
+                    or confidence >= settings.sentiment_lexicon_min_confidence
+                    or not self.client):
+                self.lexicon_stats["local"] += 1
+                logger.info(f"✓ 本地情感分类: {emotion} (置信度 {confidence})")
+                return emotion
+            self.lexicon_stats["escalated"] += 1
+            logger.info(f"本地情感分类置信度低 ({emotion}, {confidence})，转交 LLM")
+
+        if not self.client:
+            logger.debug("情感分析服务未启用，返回 default")
+            return "default"
+
+        key = self._cache_key(text)
+        emotion = await self.cache.get(key)
+        if emotion is not None:
+            logger.info(f"✓ 情感分析缓存命中: {emotion}")
+            return emotion
+
+        # 共享分析作为独立任务运行，任一调用方被取消都不会影响其他等待者
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._analyze_shared(key, text))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _analyze_shared(self, key: str, text: str) -> str:
+        emotion = await self._classify(text)
+        if emotion is None:
+            # 失败回退的结果不缓存，下次重新分析
+            return "default"
+        await self.cache.put(key, emotion)
+        return emotion
+
+    async def _classify(self, text: str) -> Optional[str]:
+        """分析单条文本情感，启用微批处理时与同一窗口内的其他文本合并请求"""
+        if settings.sentiment_batch_max_size <= 1:
+            return await self._classify_single(text)
+
+        future = asyncio.get_event_loop().create_future()
+        self._pending.append((text, future))
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.get_event_loop().create_task(self._flush_pending())
+        elif len(self._pending) >= settings.sentiment_batch_max_size:
+            self._batch_full.set()
+        return await future
+
+    async def _flush_pending(self):
+        """等待批处理窗口结束（或批次已满），把待分析文本分批发出"""
+        try:
+            await asyncio.wait_for(self._batch_full.wait(), timeout=settings.sentiment_batch_wait_ms / 1000)
+        except asyncio.TimeoutError:
+            pass
+        self._batch_full.clear()
+
+        size = settings.sentiment_batch_max_size
+        while self._pending:
+            batch, self._pending = self._pending[:size], self._pending[size:]
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch: list[tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            if len(texts) == 1:
+                labels = [await self._classify_single(texts[0])]
+            else:
+                labels = await self._classify_many(texts)
+                if labels is None:
+                    # 批量结果无法解析时逐条重试
+                    self.batch_stats["fallbacks"] += 1
+                    labels = await asyncio.gather(*(self._classify_single(text) for text in texts))
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"批量情感分析失败: {e}，回退到 default")
+            labels = [None] * len(texts)
+
+        for (_, future), label in zip(batch, labels):
+            if not future.done():
+                future.set_result(label)
+
+    async def _classify_many(self, texts: list[str]) -> Optional[list[Optional[str]]]:
+        """
+        一次 LLM 请求分析多条文本
+
+        返回与 texts 等长的标签列表（单条标签无效时该条为 None）；整体响应无法解析时返回 None
+        """
+        self.batch_stats["requests"] += 1
+        self.batch_stats["texts"] += len(texts)
+        try:
+            logger.info(f"开始批量情感分析: {len(texts)} 条")
+            response = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=settings.sentiment_llm_model,
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": self._build_batch_prompt(texts)
+                        }
+                    ],
+                    temperature=0.3,
+                    max_tokens=16 * len(texts) + 16
+                ),
+                timeout=settings.sentiment_timeout
+            )
+            content = response.choices[0].message.content or ""
+        except asyncio.TimeoutError:
+            logger.error("批量情感分析超时")
+            return None
+        except Exception as e:
+            logger.error(f"批量情感分析请求失败: {e}")
+            return None
+
+        match = re.search(r"\[.*\]", content, re.S)
+        try:
+            raw_labels = json.loads(match.group(0)) if match else None
+        except ValueError:
+            raw_labels = None
+        if not isinstance(raw_labels, list) or len(raw_labels) != len(texts):
+            logger.warning(f"批量情感分析返回格式无效: {content[:100]}")
+            return None
+
+        labels = [self._normalize_label(raw) for raw in raw_labels]
+        invalid = sum(1 for label in labels if label is None)
+        if invalid:
+            logger.warning(f"批量情感分析中 {invalid} 条标签不在白名单内，回退到 default")
+        logger.info(f"✓ 批量情感分析完成: {labels}")
+        return labels
+
+    async def _classify_single(self, text: str) -> Optional[str]:
+        """调用 LLM 分析单条文本情感，失败返回 None"""
         try:
             logger.info(f"开始情感分析: {text[:50]}...")
             
@@ -79,26 +408,22 @@ class SentimentAnalyzer:
                 timeout=settings.sentiment_timeout
             )
             
-            # 提取结果
-            emotion = response.choices[0].message.content.strip().lower()
-            
-            # 清理可能的格式问题
-            emotion = emotion.replace("'", "").replace('"', "").replace(".", "").strip()
-            
-            # 验证是否在白名单内
-            if emotion not in settings.sentiment_labels:
-                logger.warning(f"LLM 返回了不在白名单内的情感: {emotion}，回退到 default")
-                return "default"
+            # 提取结果，清理可能的格式问题并验证是否在白名单内
+            raw = response.choices[0].message.content or ""
+            emotion = self._normalize_label(raw)
+            if emotion is None:
+                logger.warning(f"LLM 返回了不在白名单内的情感: {raw.strip()}，回退到 default")
+                return None
             
             logger.info(f"✓ 情感分析完成: {emotion}")
             return emotion
             
         except asyncio.TimeoutError:
             logger.error("情感分析超时，回退到 default")
-            return "default"
+            return None
         except Exception as e:
             logger.error(f"情感分析失败: {e}，回退到 default")
-            return "default"
+            return None
 
 
 # 全局单例
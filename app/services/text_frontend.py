@@ -0,0 +1,221 @@
+"""合成前的文本前端：规范化与分段"""
+import re
+from functools import lru_cache
+from typing import Callable, Union
+
+from app.core.config import settings
+from app.utils.text import split_sentences
+
+_CJK = re.compile(r"[\u3400-\u9fff]")
+
+# 全角字母、数字、空格转半角（中文标点保持不变）
+_FULLWIDTH = {code: code - 0xFEE0 for code in range(0xFF10, 0xFF1A)}
+_FULLWIDTH.update({code: code - 0xFEE0 for code in range(0xFF21, 0xFF3B)})
+_FULLWIDTH.update({code: code - 0xFEE0 for code in range(0xFF41, 0xFF5B)})
+_FULLWIDTH.update({0x3000: 0x20, 0xFF05: 0x25})
+
+# 全角冒号、句点、斜杠只在两个数字之间转半角（时间、小数、日期），其余位置仍是中文标点
+_NUMERIC_PUNCT = {0xFF1A: 0x3A, 0xFF0E: 0x2E, 0xFF0F: 0x2F}
+
+_DIGITS = "零一二三四五六七八九"
+_SMALL_UNITS = ("", "十", "百", "千")
+
+# 数字后的计量单位（按长度降序匹配）
+_UNITS = {
+    "km/h": "公里每小时", "m/s": "米每秒", "kWh": "千瓦时", "km": "公里", "kg": "千克", "cm": "厘米",
+    "mm": "毫米", "mg": "毫克", "ml": "毫升", "mL": "毫升", "kW": "千瓦", "m²": "平方米", "m³": "立方米",
+    "°C": "摄氏度", "℃": "摄氏度", "GB": "G B", "MB": "M B", "KB": "K B", "TB": "T B",
+}
+
+# 规则：(预编译模式, 替换文本或替换函数)，按表中顺序执行
+_Rule = tuple[re.Pattern, Union[str, Callable[[re.Match], str]]]
+
+
+def _read_digits(digits: str) -> str:
+    """逐位读出（年份、编号、电话）"""
+    return "".join(_DIGITS[int(d)] for d in digits)
+
+
+def _read_chunk(number: int) -> str:
+    """读出 1-9999"""
+    result = ""
+    pending_zero = False
+    for power in (3, 2, 1, 0):
+        digit = number // 10 ** power % 10
+        if digit == 0:
+            pending_zero = bool(result)
+            continue
+        if pending_zero:
+            result += "零"
+            pending_zero = False
+        result += _DIGITS[digit] + _SMALL_UNITS[power]
+    return result
+
+
+def _read_below_yi(number: int) -> str:
+    """读出 1-99999999"""
+    high, low = divmod(number, 10000)
+    result = _read_chunk(high) + "万" if high else ""
+    if low:
+        if high and low < 1000:
+            result += "零"
+        result += _read_chunk(low)
+    return result
+
+
+def read_integer(digits: str) -> str:
+    """
+    读出整数，如 "10010" -> "一万零一十"；亿以上的部分整体作为亿的系数（"一万二千亿"）
+
+    超过 16 位或以 0 开头的编号逐位读出
+    """
+    if len(digits) > 1 and digits.startswith("0") or len(digits) > 16:
+        return _read_digits(digits)
+    number = int(digits)
+    if number == 0:
+        return "零"
+
+    high, low = divmod(number, 10 ** 8)
+    result = _read_below_yi(high) + "亿" if high else ""
+    if low:
+        if high and low < 10 ** 7:
+            result += "零"
+        result += _read_below_yi(low)
+    return result[1:] if result.startswith("一十") else result
+
+
+def read_number(text: str) -> str:
+    """读出整数或小数"""
+    integer, _, fraction = text.partition(".")
+    spoken = read_integer(integer or "0")
+    return f"{spoken}点{_read_digits(fraction)}" if fraction else spoken
+
+
+def _date(match: re.Match) -> str:
+    year, month, day = match.group(1), match.group(2), match.group(3)
+    return f"{_read_digits(year)}年{read_integer(month.lstrip('0') or '0')}月{read_integer(day.lstrip('0') or '0')}日"
+
+
+def _time(match: re.Match) -> str:
+    hour, minute, second = match.group(1), match.group(2), match.group(3)
+    spoken = f"{read_integer(hour.lstrip('0') or '0')}点"
+    if minute != "00":
+        spoken += f"{'零' if minute.startswith('0') else ''}{read_integer(minute.lstrip('0'))}分"
+    if second:
+        spoken += f"{read_integer(second.lstrip('0') or '0')}秒"
+    return spoken
+
+
+def _version(match: re.Match) -> str:
+    """版本号、IP 等多段点号数字逐段读出（"1.2.3" -> "一点二点三"），不按小数处理"""
+    return "点".join(read_integer(part) for part in match.group(0).split("."))
+
+
+def _fraction(match: re.Match) -> str:
+    """"3/4" 读作"四分之三"；分母为 0 或带前导零时保持原样"""
+    numerator, denominator = match.group(1), match.group(2)
+    if int(denominator) == 0 or any(len(part) > 1 and part.startswith("0") for part in (numerator, denominator)):
+        return match.group(0)
+    return f"{read_integer(denominator)}分之{read_integer(numerator)}"
+
+
+def _with_unit(match: re.Match) -> str:
+    return read_number(match.group(1)) + _UNITS[match.group(2)]
+
+
+def _range(match: re.Match) -> str:
+    """"~" 总是区间；"-" 仅在两端为无前导零的升序数字时读作"至"（如 3-5），比分、编号等保持原样"""
+    left, mark, right = match.group(1), match.group(2), match.group(3)
+    if mark == "-":
+        integers = (left.partition(".")[0], right.partition(".")[0])
+        if any(len(part) > 1 and part.startswith("0") for part in integers) or float(left) >= float(right):
+            return match.group(0)
+    return f"{left}至{right}"
+
+
+def _repeated_marks(match: re.Match) -> str:
+    run = match.group(0)
+    question = next((ch for ch in run if ch in "?？"), "")
+    exclaim = next((ch for ch in run if ch in "!！"), "")
+    return question + exclaim
+
+
+_UNIT_PATTERN = "|".join(re.escape(unit) for unit in sorted(_UNITS, key=len, reverse=True))
+
+# 所有文本通用：标点与空白整理
+_COMMON_RULES: list[_Rule] = [
+    (re.compile(r"(?<=\d)[：．／](?=\d)"), lambda m: m.group(0).translate(_NUMERIC_PUNCT)),
+    (re.compile(r"(?:\.{3,}|。{3,}|…{2,})"), "…"),
+    (re.compile(r"[!！?？]{2,}"), _repeated_marks),
+    (re.compile(r"([。，,、；;：:~～])\1+"), r"\1"),
+    (re.compile(r"—{3,}"), "——"),
+    (re.compile(r"[ \t]{2,}"), " "),
+    (re.compile(r"\n{2,}"), "\n"),
+]
+
+# 含中文的文本：数字、日期、时间、单位读法与中文中的英文缩写
+_CJK_RULES: list[_Rule] = [
+    (re.compile(r"(?<![\d.,])\d{1,3}(?:,\d{3})+(?!\d|,\d)"), lambda m: m.group(0).replace(",", "")),
+    (re.compile(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?!\d)"), _date),
+    (re.compile(r"(?<![\d.])\d+(?:\.\d+){2,}(?![\d.])"), _version),
+    (re.compile(r"(?<!\d)(\d{4})年"), lambda m: f"{_read_digits(m.group(1))}年"),
+    (re.compile(r"(?<!\d)(\d{1,2}):(\d{2})(?::(\d{2}))?(?!\d)"), _time),
+    (re.compile(r"(?<![\d.])(\d+(?:\.\d+)?)\s*([-~～])\s*(\d+(?:\.\d+)?)"), _range),
+    # 负号只出现在词首（行首、空白、中文或标点之后）；字母后的连字符是型号写法（COVID-19、GPT-4）
+    (re.compile(r"(?<![^\s\u3400-\u9fff，,、：:；;=（(])(?<![\d.]\s)-(?=\d)"), "负"),
+    (re.compile(r"(?<![\d./])(\d+)/(\d+)(?![\d./])"), _fraction),
+    (re.compile(r"(\d+(?:\.\d+)?)\s*%"), lambda m: f"百分之{read_number(m.group(1))}"),
+    (re.compile(rf"(\d+(?:\.\d+)?)\s*({_UNIT_PATTERN})(?![A-Za-z])"), _with_unit),
+    # 手机号（1 开头的 11 位）与超过 16 位的证件号、编号逐位读出，其余长数字按数值读
+    (re.compile(r"(?<![\d.])(?:1\d{10}|\d{17,})(?![\d.])"), lambda m: _read_digits(m.group(0))),
+    (re.compile(r"\d+(?:\.\d+)?"), lambda m: read_number(m.group(0))),
+    (re.compile(r"(?<![A-Za-z])([A-Z]{2,5})(?![A-Za-z])"), lambda m: " ".join(m.group(1))),
+]
+
+
+class TextFrontend:
+    """
+    文本前端
+
+    规范化：全角字母数字转半角、折叠重复标点与空白；含中文时把数字、日期、时间、百分数、
+    计量单位转为汉字读法，中文中的英文缩写按字母拆开。规则表在模块加载时预编译，
+    相同文本的结果由 LRU 缓存复用。分段：在规范化后的文本上按句子边界切成不超过目标长度的片段
+    """
+
+    def __init__(self, enabled: bool = True, cache_size: int = 2048):
+        self.enabled = enabled
+        self._normalize_cached = lru_cache(maxsize=max(0, cache_size))(self._normalize)
+
+    @staticmethod
+    def _apply(rules: list[_Rule], text: str) -> str:
+        for pattern, replacement in rules:
+            text = pattern.sub(replacement, text)
+        return text
+
+    def _normalize(self, text: str) -> str:
+        text = text.translate(_FULLWIDTH)
+        text = self._apply(_COMMON_RULES, text)
+        if _CJK.search(text):
+            text = self._apply(_CJK_RULES, text)
+        return text.strip()
+
+    def normalize(self, text: str) -> str:
+        """规范化文本（结果幂等，重复调用不会再次改写）"""
+        if not self.enabled:
+            return text
+        return self._normalize_cached(text) or text
+
+    def segment(self, text: str, max_chars: int = 0) -> list[str]:
+        """规范化并按句子边界切分为不超过 max_chars（默认 stream_segment_max_chars）的片段"""
+        return split_sentences(self.normalize(text), max_chars or settings.stream_segment_max_chars)
+
+    def get_stats(self) -> dict:
+        info = self._normalize_cached.cache_info()
+        return {"enabled": self.enabled, "hits": info.hits, "misses": info.misses, "entries": info.currsize}
+
+
+# 全局单例
+text_frontend = TextFrontend(
+    enabled=settings.enable_text_normalization,
+    cache_size=settings.text_frontend_cache_size
+)
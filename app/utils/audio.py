@@ -1,10 +1,10 @@
 """音频处理工具"""
 import io
 import logging
+import struct
 from pathlib import Path
 import numpy as np
 import soundfile as sf
-import subprocess
 
 from app.core.config import settings
 
@@ -27,45 +27,130 @@ def save_audio_to_wav(audio_data: np.ndarray, sample_rate: int = None) -> bytes:
     
     buffer = io.BytesIO()
     sf.write(buffer, audio_data, sample_rate, format='WAV')
-    buffer.seek(0)
-    return buffer.read()
+    # getvalue() 直接返回内部缓冲区，不再额外复制
+    return buffer.getvalue()
 
 
-def convert_wav_to_mp3(wav_bytes: bytes) -> bytes:
+def wav_stream_header(sample_rate: int = None, channels: int = 1, bits_per_sample: int = 16) -> bytes:
     """
-    使用 FFmpeg 将 WAV 转换为 MP3
-    
+    生成流式 WAV 文件头
+
+    总长度未知，RIFF 与 data 块大小填写 0xFFFFFFFF，播放器会读取到流结束为止
+
     Args:
-        wav_bytes: WAV 格式的字节数据
-        
+        sample_rate: 采样率
+        channels: 声道数
+        bits_per_sample: 采样位深
+
     Returns:
-        MP3 格式的字节数据
+        44 字节的 WAV 文件头
     """
-    try:
-        process = subprocess.Popen(
-            [
-                'ffmpeg',
-                '-i', 'pipe:0',  # 从标准输入读取
-                '-f', 'mp3',
-                '-ab', '192k',
-                '-ar', str(settings.sample_rate),
-                'pipe:1'  # 输出到标准输出
-            ],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        mp3_bytes, stderr = process.communicate(input=wav_bytes)
-        
-        if process.returncode != 0:
-            raise RuntimeError(f"FFmpeg 转换失败: {stderr.decode()}")
-        
-        return mp3_bytes
-        
-    except Exception as e:
-        logger.error(f"音频格式转换失败: {e}")
-        raise
+    if sample_rate is None:
+        sample_rate = settings.sample_rate
+
+    block_align = channels * bits_per_sample // 8
+    byte_rate = sample_rate * block_align
+    return (
+        b"RIFF" + struct.pack("<I", 0xFFFFFFFF) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, sample_rate, byte_rate, block_align, bits_per_sample)
+        + b"data" + struct.pack("<I", 0xFFFFFFFF)
+    )
+
+
+def _pcm16_array(audio_data: np.ndarray) -> np.ndarray:
+    clipped = np.clip(audio_data, -1.0, 1.0)
+    return (clipped * 32767).astype("<i2")
+
+
+def audio_to_pcm16(audio_data: np.ndarray) -> bytes:
+    """
+    将 float32 音频转换为 16-bit little-endian PCM 字节
+
+    Args:
+        audio_data: 取值范围 [-1, 1] 的音频数据
+
+    Returns:
+        PCM 字节数据
+    """
+    return _pcm16_array(audio_data).tobytes()
+
+
+def audio_to_raw(audio_data: np.ndarray, fmt: str) -> bytes:
+    """
+    将音频转换为裸 PCM 字节，不经过 WAV 等容器封装
+
+    Args:
+        audio_data: float32 音频数据
+        fmt: "pcm_f32"（32-bit float little-endian，已是 float32 时不做类型转换）
+             或 "pcm16"（16-bit little-endian，仅一次类型转换）
+
+    Returns:
+        PCM 字节数据（Starlette 响应体只接受 bytes，因此在此处做唯一一次拷贝）
+    """
+    if fmt == "pcm_f32":
+        array = np.ascontiguousarray(audio_data, dtype="<f4")
+    elif fmt == "pcm16":
+        array = _pcm16_array(audio_data)
+    else:
+        raise ValueError(f"不支持的裸音频格式: {fmt}")
+    return array.tobytes()
+
+
+def join_segments(
+    segments: list[np.ndarray],
+    sample_rate: int = None,
+    silence_ms: int = 0,
+    crossfade_ms: int = 0
+) -> np.ndarray:
+    """
+    按顺序拼接分段合成的音频
+
+    Args:
+        segments: 各片段的 float32 音频
+        sample_rate: 采样率
+        silence_ms: 片段之间插入的静音时长；为 0 时相邻片段直接交叉淡化
+        crossfade_ms: 交叉淡化时长（插入静音时用作片段首尾的淡入淡出时长）
+
+    Returns:
+        拼接后的音频数据
+    """
+    if sample_rate is None:
+        sample_rate = settings.sample_rate
+    segments = [np.asarray(segment, dtype=np.float32) for segment in segments if len(segment)]
+    if not segments:
+        return np.zeros(0, dtype=np.float32)
+    if len(segments) == 1:
+        return segments[0]
+
+    fade = int(sample_rate * crossfade_ms / 1000)
+    silence = int(sample_rate * silence_ms / 1000)
+
+    if silence > 0:
+        gap = np.zeros(silence, dtype=np.float32)
+        pieces = []
+        for index, segment in enumerate(segments):
+            n = min(fade, len(segment) // 2)
+            if n > 0:
+                segment = segment.copy()
+                if index > 0:
+                    segment[:n] *= np.linspace(0.0, 1.0, n, dtype=np.float32)
+                if index < len(segments) - 1:
+                    segment[-n:] *= np.linspace(1.0, 0.0, n, dtype=np.float32)
+            if index > 0:
+                pieces.append(gap)
+            pieces.append(segment)
+        return np.concatenate(pieces)
+
+    result = segments[0]
+    for segment in segments[1:]:
+        n = min(fade, len(result), len(segment))
+        if n == 0:
+            result = np.concatenate([result, segment])
+            continue
+        ramp = np.linspace(0.0, 1.0, n, dtype=np.float32)
+        overlap = result[-n:] * (1.0 - ramp) + segment[:n] * ramp
+        result = np.concatenate([result[:-n], overlap, segment[n:]])
+    return result
 
 
 def validate_audio_file(file_path: Path) -> bool:
@@ -0,0 +1,126 @@
+"""语速调整与重采样（纯 NumPy 实现）"""
+from functools import lru_cache
+from math import gcd
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# 重采样滤波器：单侧过零点数、Kaiser 窗 beta、截止频率相对奈奎斯特频率的比例
+_ZERO_CROSSINGS = 16
+_KAISER_BETA = 8.6
+_ROLLOFF = 0.95
+
+# WSOLA：帧长、相位对齐的搜索范围（毫秒），粗搜索的抽取步长
+_FRAME_MS = 30.0
+_TOLERANCE_MS = 10.0
+_SEARCH_STEP = 4
+
+
+@lru_cache(maxsize=32)
+def _polyphase_filter(up: int, down: int) -> tuple[np.ndarray, int]:
+    """
+    设计并缓存 up/down 变换的低通滤波器，按相位拆分为 (up, taps) 矩阵
+
+    Returns:
+        (多相滤波器矩阵（只读，每行按时间倒序，可直接与输入窗口做点积）, 滤波器在上采样域的半长)
+    """
+    max_rate = max(up, down)
+    half_len = _ZERO_CROSSINGS * max_rate
+    cutoff = _ROLLOFF / max_rate
+    n = np.arange(-half_len, half_len + 1, dtype=np.float64)
+    kernel = cutoff * np.sinc(cutoff * n) * np.kaiser(2 * half_len + 1, _KAISER_BETA)
+
+    taps = -(-len(kernel) // up)
+    padded = np.zeros(taps * up)
+    padded[:len(kernel)] = kernel
+    # phases[p, taps - 1 - k] = kernel[p + k * up]；每个相位单独归一化，保证直流增益为 1
+    phases = padded.reshape(taps, up).T[:, ::-1].copy()
+    phases /= phases.sum(axis=1, keepdims=True)
+    phases = phases.astype(np.float32)
+    phases.setflags(write=False)
+    return phases, half_len
+
+
+def resample(audio: np.ndarray, orig_sr: int, target_sr: int) -> np.ndarray:
+    """
+    多相 FIR 重采样
+
+    采样率之比化为最简分数 up/down，只计算实际需要的输出样本（不做零值插入后的完整卷积）；
+    序号模 up 相同的输出样本使用同一相位、输入位置间隔 down，每个相位一次矩阵向量乘完成。
+    滤波器按 (up, down) 缓存，同一对采样率只设计一次
+    """
+    x = np.asarray(audio, dtype=np.float32)
+    if orig_sr == target_sr or len(x) == 0:
+        return x
+
+    common = gcd(orig_sr, target_sr)
+    up, down = target_sr // common, orig_sr // common
+    phases, half_len = _polyphase_filter(up, down)
+    taps = phases.shape[1]
+
+    out_len = -(-len(x) * up // down)
+    # 输出样本 n 对应上采样域位置 t = n * down + half_len，使用相位 t % up 与输入 x[t // up - taps + 1 : t // up + 1]
+    pad_left = taps
+    pad_right = half_len // up + 2
+    xp = np.concatenate([np.zeros(pad_left, dtype=np.float32), x, np.zeros(pad_right, dtype=np.float32)])
+    windows = sliding_window_view(xp, taps)
+
+    result = np.empty(out_len, dtype=np.float32)
+    for residue in range(min(up, out_len)):
+        t = residue * down + half_len
+        first = t // up - taps + 1 + pad_left
+        count = (out_len - 1 - residue) // up + 1
+        result[residue::up] = windows[first:first + count * down:down] @ phases[t % up]
+    return result
+
+
+def _best_offset(region: np.ndarray, template: np.ndarray) -> int:
+    """template 在 region 中互相关最大的位置：先在抽取后的信号上粗搜索，再在原分辨率细化"""
+    span = len(region) - len(template)
+    step = _SEARCH_STEP
+    coarse = np.correlate(region[::step], template[::step], mode="valid")
+    guess = int(np.argmax(coarse)) * step
+    low, high = max(0, guess - step), min(span, guess + step)
+    fine = np.correlate(region[low:high + len(template)], template, mode="valid")
+    return low + int(np.argmax(fine))
+
+
+def time_stretch(audio: np.ndarray, rate: float, sample_rate: int) -> np.ndarray:
+    """
+    WSOLA 变速不变调（rate > 1 加快，输出长度约为 len(audio) / rate）
+
+    以 50% 重叠的 Hann 窗逐帧叠加输出，每帧在名义位置附近 ±TOLERANCE 内选取与上一帧
+    自然延续波形最相似的输入片段，避免相位声码器的“相位感”；帧位置选定后一次性向量化叠加
+    """
+    x = np.asarray(audio, dtype=np.float32)
+    if rate == 1.0 or len(x) == 0:
+        return x
+
+    frame = max(2, int(sample_rate * _FRAME_MS / 1000) // 2 * 2)
+    hop = frame // 2
+    tolerance = max(_SEARCH_STEP, int(sample_rate * _TOLERANCE_MS / 1000))
+    out_len = int(round(len(x) / rate))
+    frames = -(-out_len // hop) + 2
+
+    # 输出帧 m 覆盖 [(m - 1) * hop, (m + 1) * hop)，首尾都有完整的窗叠加
+    margin = frame + tolerance
+    pad_right = margin + hop + int(np.ceil(3 * hop * rate))
+    xp = np.concatenate([np.zeros(margin, dtype=np.float32), x, np.zeros(pad_right, dtype=np.float32)])
+    limit = len(xp) - frame
+
+    positions = np.empty(frames, dtype=np.int64)
+    positions[0] = margin - hop
+    for m in range(1, frames):
+        nominal = min(margin + int(round(m * hop * rate)) - hop, limit - tolerance)
+        natural = min(positions[m - 1] + hop, limit)
+        template = xp[natural:natural + frame]
+        start = nominal - tolerance
+        region = xp[start:start + 2 * tolerance + frame]
+        positions[m] = start + _best_offset(region, template)
+
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(frame) / frame)).astype(np.float32)
+    segments = xp[positions[:, None] + np.arange(frame)[None, :]] * window
+    output = np.zeros((frames + 1, hop), dtype=np.float32)
+    output[:-1] += segments[:, :hop]
+    output[1:] += segments[:, hop:]
+    return output.ravel()[hop:hop + out_len]
@@ -0,0 +1,292 @@
+"""音频编码器"""
+import asyncio
+import logging
+import subprocess
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+from typing import AsyncIterator, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import ENCODE_SECONDS
+from app.utils.audio import audio_to_pcm16, audio_to_raw
+
+logger = logging.getLogger(__name__)
+
+# ffmpeg 输出参数（输入均为 16-bit 单声道 PCM）
+_FFMPEG_OUTPUT_ARGS = {
+    "mp3": ["-f", "mp3", "-b:a", "192k"],
+    "opus": ["-c:a", "libopus", "-b:a", "32k", "-application", "voip", "-f", "ogg"],
+    "aac": ["-c:a", "aac", "-b:a", "96k", "-f", "adts"],
+}
+
+# PyAV 参数：(容器格式, 编码器, 码率, 编码器选项)，与上面的 ffmpeg 参数保持一致
+_PYAV_OUTPUT_ARGS = {
+    "mp3": ("mp3", "libmp3lame", 192_000, {}),
+    "opus": ("ogg", "libopus", 32_000, {"application": "voip"}),
+    "aac": ("adts", "aac", 96_000, {}),
+}
+
+# Opus 只支持 8/12/16/24/48 kHz，其他采样率统一重采样到 48 kHz（与 ffmpeg 命令行的行为一致）
+_OPUS_RATES = (8000, 12000, 16000, 24000, 48000)
+
+SUPPORTED_FORMATS = tuple(_FFMPEG_OUTPUT_ARGS)
+
+
+class StreamEncoder(ABC):
+    """增量编码器接口：encode() 输入 float32 音频分片并返回已编码字节，flush() 返回剩余数据"""
+
+    @abstractmethod
+    def encode(self, audio: np.ndarray) -> bytes:
+        ...
+
+    @abstractmethod
+    def flush(self) -> bytes:
+        ...
+
+    def close(self):
+        pass
+
+
+class LameMP3Encoder(StreamEncoder):
+    """进程内 MP3 编码器（lameenc）"""
+
+    def __init__(self, sample_rate: int, bitrate: int = 192):
+        import lameenc
+
+        self._encoder = lameenc.Encoder()
+        self._encoder.set_bit_rate(bitrate)
+        self._encoder.set_in_sample_rate(sample_rate)
+        self._encoder.set_channels(1)
+        self._encoder.set_quality(2)
+
+    def encode(self, audio: np.ndarray) -> bytes:
+        return bytes(self._encoder.encode(audio_to_pcm16(audio)))
+
+    def flush(self) -> bytes:
+        return bytes(self._encoder.flush())
+
+
+class _ChunkSink:
+    """PyAV 输出目标：收集容器写出的字节，由编码器取走"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class PyAVEncoder(StreamEncoder):
+    """
+    进程内编码器（PyAV）
+
+    直接调用 FFmpeg 的编码库，不为每个请求启动 ffmpeg 子进程
+    """
+
+    def __init__(self, fmt: str, sample_rate: int):
+        import av
+
+        container_format, codec, bit_rate, options = _PYAV_OUTPUT_ARGS[fmt]
+        rate = sample_rate if codec != "libopus" or sample_rate in _OPUS_RATES else 48000
+        self._sink = _ChunkSink()
+        self._container = av.open(self._sink, "w", format=container_format)
+        try:
+            self._stream = self._container.add_stream(codec, rate=rate, options=options)
+            self._stream.layout = "mono"
+            self._stream.bit_rate = bit_rate
+            self._resampler = av.AudioResampler(
+                format=self._stream.codec_context.format.name, layout="mono", rate=rate
+            )
+        except Exception:
+            self._container.close()
+            raise
+        self._frame_type = av.AudioFrame
+        self._sample_rate = sample_rate
+        self._samples = 0
+        self._closed = False
+
+    def _mux(self, frames) -> bytes:
+        for frame in frames:
+            for packet in self._stream.encode(frame):
+                self._container.mux(packet)
+        return self._sink.drain()
+
+    def encode(self, audio: np.ndarray) -> bytes:
+        pcm = np.frombuffer(audio_to_pcm16(audio), dtype=np.int16)
+        if len(pcm) == 0:
+            return b""
+        frame = self._frame_type.from_ndarray(pcm[None, :], format="s16", layout="mono")
+        frame.sample_rate = self._sample_rate
+        frame.pts = self._samples
+        frame.time_base = Fraction(1, self._sample_rate)
+        self._samples += len(pcm)
+        return self._mux(self._resampler.resample(frame))
+
+    def flush(self) -> bytes:
+        data = self._mux(self._resampler.resample(None))
+        data += self._mux([None])
+        self._container.close()
+        self._closed = True
+        return data + self._sink.drain()
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            try:
+                self._container.close()
+            except Exception:
+                pass
+
+
+class FFmpegPipeEncoder(StreamEncoder):
+    """
+    基于 ffmpeg 管道的增量编码器
+
+    写入 stdin 的同时由后台线程读取 stdout，encode() 返回当前已产出的数据
+    """
+
+    def __init__(self, fmt: str, sample_rate: int):
+        self._process = subprocess.Popen(
+            [
+                "ffmpeg", "-hide_banner", "-loglevel", "error",
+                "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0",
+                *_FFMPEG_OUTPUT_ARGS[fmt],
+                "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        self._chunks: list[bytes] = []
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+
+    def _read_stdout(self):
+        while True:
+            data = self._process.stdout.read1(65536)
+            if not data:
+                break
+            with self._lock:
+                self._chunks.append(data)
+
+    def _drain(self) -> bytes:
+        with self._lock:
+            data = b"".join(self._chunks)
+            self._chunks.clear()
+        return data
+
+    def encode(self, audio: np.ndarray) -> bytes:
+        self._process.stdin.write(audio_to_raw(audio, "pcm16"))
+        self._process.stdin.flush()
+        return self._drain()
+
+    def flush(self) -> bytes:
+        self._process.stdin.close()
+        self._reader.join()
+        stderr = self._process.stderr.read()
+        if self._process.wait() != 0:
+            raise RuntimeError(f"FFmpeg 编码失败: {stderr.decode(errors='ignore')}")
+        return self._drain()
+
+    def close(self):
+        if self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+
+
+def create_encoder(fmt: str, sample_rate: Optional[int] = None) -> StreamEncoder:
+    """
+    创建编码器
+
+    MP3 优先使用 lameenc，其次 PyAV；Opus/AAC 使用 PyAV。二者都在进程内编码，
+    未安装（或 PyAV 缺少对应编码器）时才回退到每个请求一个 ffmpeg 子进程的管道编码
+    """
+    if fmt not in _FFMPEG_OUTPUT_ARGS:
+        raise ValueError(f"不支持的编码格式: {fmt}")
+    if sample_rate is None:
+        sample_rate = settings.sample_rate
+
+    if fmt == "mp3":
+        try:
+            return LameMP3Encoder(sample_rate)
+        except ImportError:
+            pass
+    try:
+        return PyAVEncoder(fmt, sample_rate)
+    except ImportError:
+        pass
+    except ValueError as e:
+        logger.debug(f"PyAV 无法编码 {fmt}，回退到 ffmpeg: {e}")
+    return FFmpegPipeEncoder(fmt, sample_rate)
+
+
+class EncoderPool:
+    """
+    编码线程池
+
+    所有编码都在专用线程池中执行，避免阻塞事件循环
+    """
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="encoder")
+
+    def _encode_sync(self, audio: np.ndarray, fmt: str) -> bytes:
+        encoder = create_encoder(fmt)
+        try:
+            return encoder.encode(audio) + encoder.flush()
+        finally:
+            encoder.close()
+
+    async def encode(self, audio: np.ndarray, fmt: str) -> bytes:
+        """一次性编码完整音频"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, self._encode_sync, audio, fmt)
+
+    async def encode_stream(self, chunks: AsyncIterator[np.ndarray], fmt: str) -> AsyncIterator[bytes]:
+        """
+        增量编码：每输入一个音频分片即输出已编码的数据
+
+        ENCODE_SECONDS 记录各次编码调用的累计耗时（不含等待音频分片的时间）
+        """
+        loop = asyncio.get_event_loop()
+        elapsed = 0.0
+
+        async def timed(func, *args):
+            nonlocal elapsed
+            started = time.perf_counter()
+            try:
+                return await loop.run_in_executor(self._executor, func, *args)
+            finally:
+                elapsed += time.perf_counter() - started
+
+        encoder = await timed(create_encoder, fmt)
+        try:
+            async for audio in chunks:
+                data = await timed(encoder.encode, audio)
+                if data:
+                    yield data
+            data = await timed(encoder.flush)
+            if data:
+                yield data
+        finally:
+            try:
+                # 管道编码器关闭时需要等待 ffmpeg 子进程退出，同样放到编码线程池中
+                await loop.run_in_executor(self._executor, encoder.close)
+            finally:
+                ENCODE_SECONDS.observe(elapsed, format=fmt)
+
+
+# 全局单例
+encoder_pool = EncoderPool(settings.encoder_workers)
@@ -0,0 +1,51 @@
+"""内容哈希工具"""
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+_CHUNK_SIZE = 1024 * 1024
+
+# (路径, mtime_ns, 文件大小) -> sha256，文件未变化时避免重复读取；按 LRU 限制条目数
+_MEMO_MAX_ENTRIES = 4096
+_file_hash_memo: OrderedDict[tuple[str, int, int], str] = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def file_sha256(path: Path) -> str:
+    """
+    计算文件内容的 SHA-256（按 mtime 和大小缓存）
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        十六进制摘要
+    """
+    path = Path(path)
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_mtime_ns, stat.st_size)
+
+    with _memo_lock:
+        cached = _file_hash_memo.get(memo_key)
+        if cached is not None:
+            _file_hash_memo.move_to_end(memo_key)
+    if cached is not None:
+        return cached
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    result = digest.hexdigest()
+
+    with _memo_lock:
+        _file_hash_memo[memo_key] = result
+        while len(_file_hash_memo) > _MEMO_MAX_ENTRIES:
+            _file_hash_memo.popitem(last=False)
+    return result
+
+
+def bytes_sha256(data: bytes) -> str:
+    """计算字节内容的 SHA-256"""
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,54 @@
+"""一致性哈希环（集群按音色粘性路由与实例预热分片共用）"""
+import bisect
+import hashlib
+from typing import Iterable
+
+
+def shard_node_name(index: int) -> str:
+    """实例在哈希环上的节点名（代理与实例两侧必须一致）"""
+    return f"backend-{index}"
+
+
+def affinity_key(voice: str) -> str:
+    """音色路由键：与参考音频解析保持一致，忽略 .wav 后缀"""
+    return voice.strip().replace(".wav", "")
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """带虚拟节点的一致性哈希环"""
+
+    def __init__(self, nodes: Iterable[str], vnodes: int = 160):
+        self.nodes = list(nodes)
+        self._ring: list[tuple[int, str]] = sorted(
+            (_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes)
+        )
+        self._keys = [h for h, _ in self._ring]
+
+    def preference(self, key: str) -> list[str]:
+        """按环上顺时针顺序返回所有节点（首个为归属节点，其后为溢出顺序）"""
+        if not self._ring:
+            return []
+        start = bisect.bisect(self._keys, _hash(key))
+        result: list[str] = []
+        seen: set[str] = set()
+        for offset in range(len(self._ring)):
+            node = self._ring[(start + offset) % len(self._ring)][1]
+            if node not in seen:
+                seen.add(node)
+                result.append(node)
+                if len(result) == len(self.nodes):
+                    break
+        return result
+
+    def owner(self, key: str) -> str:
+        """key 的归属节点"""
+        return self.preference(key)[0]
+
+
+def shard_ring(count: int) -> HashRing:
+    """由实例数量构造哈希环"""
+    return HashRing(shard_node_name(i) for i in range(count))
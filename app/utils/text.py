@@ -0,0 +1,120 @@
+"""文本处理工具"""
+import re
+
+# 句末标点（中文与拉丁文），拉丁句点需后接空白，避免切开小数和缩写
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[。！？!?；;…\n])|(?<=\.)(?=\s)")
+# 句内停顿标点，用于拆分过长的句子
+_CLAUSE_BOUNDARY = re.compile(r"(?<=[，,、：:])")
+
+
+def _join(left: str, right: str) -> str:
+    # 拉丁文句子之间保留空格
+    if left and left[-1].isascii() and right[:1].isascii():
+        return f"{left} {right}"
+    return left + right
+
+
+def _split_long(piece: str, max_chars: int) -> list[str]:
+    if len(piece) <= max_chars:
+        return [piece]
+    parts = []
+    current = ""
+    for clause in _CLAUSE_BOUNDARY.split(piece):
+        if current and len(current) + len(clause) > max_chars:
+            parts.append(current)
+            current = ""
+        current += clause
+        while len(current) > max_chars:
+            parts.append(current[:max_chars])
+            current = current[max_chars:]
+    if current:
+        parts.append(current)
+    return [part.strip() for part in parts if part.strip()]
+
+
+def split_sentences(text: str, max_chars: int = 120) -> list[str]:
+    """
+    按句子边界切分文本，并将短句合并到不超过 max_chars 的片段
+
+    Args:
+        text: 待切分的文本
+        max_chars: 单个片段的最大字符数
+
+    Returns:
+        去除首尾空白后的非空片段列表
+    """
+    segments = []
+    current = ""
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        for piece in _split_long(sentence, max_chars):
+            if current and len(current) + len(piece) > max_chars:
+                segments.append(current)
+                current = ""
+            current = _join(current, piece)
+    if current:
+        segments.append(current)
+    return segments
+
+
+# 句末标点与其后紧跟的闭合引号/括号（后者归入前一句）
+_TERMINATORS = "。！？!?；;…\n."
+_CLOSING = "\"'”’」』）)》】"
+_WHITESPACE = re.compile(r"(?<=\s)")
+
+
+class SentenceStream:
+    """
+    增量分句器：逐段追加文本（如 LLM 流式输出的 token），句子闭合后立即产出片段
+
+    句末标点之后需要再收到一个非标点字符才确认断句，避免把 "？！"、"。」" 拆开；
+    超过 max_chars 仍未闭合的文本在句内停顿处（其次是空白处）切出。flush() 取出剩余文本
+    """
+
+    def __init__(self, max_chars: int = 120):
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def _last_boundary(self) -> int:
+        last = 0
+        for match in _SENTENCE_BOUNDARY.finditer(self._buffer):
+            position = match.end()
+            while position < len(self._buffer) and self._buffer[position] in _CLOSING:
+                position += 1
+            if position < len(self._buffer) and self._buffer[position] not in _TERMINATORS:
+                last = max(last, position)
+        return last
+
+    def _long_cut(self) -> int:
+        # 多看一个字符，使紧跟在上限处的停顿标点归入本段
+        window = self._buffer[:self.max_chars + 1]
+        for pattern in (_CLAUSE_BOUNDARY, _WHITESPACE):
+            positions = [match.end() for match in pattern.finditer(window) if match.end() > 0]
+            if positions:
+                return positions[-1]
+        return self.max_chars
+
+    def feed(self, delta: str) -> list[str]:
+        """追加文本，返回已闭合的片段"""
+        self._buffer += delta
+        segments = []
+
+        boundary = self._last_boundary()
+        if boundary:
+            segments.extend(split_sentences(self._buffer[:boundary], self.max_chars))
+            self._buffer = self._buffer[boundary:]
+
+        while len(self._buffer) > self.max_chars:
+            cut = self._long_cut()
+            piece = self._buffer[:cut].strip()
+            if piece:
+                segments.append(piece)
+            self._buffer = self._buffer[cut:]
+        return segments
+
+    def flush(self) -> list[str]:
+        """取出缓冲区中剩余的文本"""
+        text, self._buffer = self._buffer, ""
+        return split_sentences(text, self.max_chars)
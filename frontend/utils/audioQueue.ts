@@ -11,6 +11,7 @@ export class AudioQueueManager {
   private queue: QueueItem[] = [];
   private currentAudio: HTMLAudioElement | null = null;
   private isProcessing = false;
+  private abortController: AbortController | null = null;
   private config: TTSConfig;
 
   constructor(config: TTSConfig) {
@@ -47,7 +48,15 @@ export class AudioQueueManager {
         // Generate audio if not ready
         if (item.status === 'pending') {
           item.status = 'generating';
-          item.blob = await generateSpeech(this.config, item.text);
+          const controller = new AbortController();
+          this.abortController = controller;
+          try {
+            item.blob = await generateSpeech(this.config, item.text, { signal: controller.signal });
+          } finally {
+            if (this.abortController === controller) {
+              this.abortController = null;
+            }
+          }
           item.status = 'ready';
         }
 
@@ -61,6 +70,10 @@ export class AudioQueueManager {
         // Remove completed item
         this.queue.shift();
       } catch (error) {
+        // stop() aborted the request and already cleared the queue
+        if ((error as Error).name === 'AbortError') {
+          break;
+        }
         console.error('Audio queue error:', error);
         item.status = 'error';
         this.queue.shift();
@@ -93,6 +106,9 @@ export class AudioQueueManager {
   }
 
   stop() {
+    // Abort the pending request so the server drops it instead of synthesizing audio nobody hears
+    this.abortController?.abort();
+    this.abortController = null;
     if (this.currentAudio) {
       this.currentAudio.pause();
       this.currentAudio = null;
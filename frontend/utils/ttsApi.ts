@@ -17,6 +17,8 @@ export interface TTSRequest {
 export interface TTSSaveOptions {
   saveAudio?: boolean;
   saveName?: string;
+  // Aborting closes the connection; the server then drops the queued synthesis
+  signal?: AbortSignal;
 }
 
 const stripTrailingSlash = (value: string) => value.replace(/\/+$/, '');
@@ -59,6 +61,7 @@ export async function generateSpeech(
     headers: {
       'Content-Type': 'application/json',
     },
+    signal: options.signal,
     body: JSON.stringify({
       input: text,
       voice: config.voice,
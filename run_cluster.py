@@ -10,6 +10,7 @@ TTS 多实例集群启动脚本
     python run_cluster.py --instances 3      # 启动 3 个实例
     python run_cluster.py --base-port 8080   # 从端口 8080 开始
     python run_cluster.py --with-proxy       # 同时启动内置负载均衡代理
+    python run_cluster.py --with-proxy --proxy-strategy voice_affinity  # 按音色粘性路由
 
 注意:
     - 确保 GPU 显存足够 (每实例约 8GB)
@@ -34,12 +35,14 @@ class ClusterManager:
         instances: int = 2,
         base_port: int = 8080,
         with_proxy: bool = False,
-        proxy_port: int = 8000
+        proxy_port: int = 8000,
+        proxy_strategy: str = "least_outstanding"
     ):
         self.instances = instances
         self.base_port = base_port
         self.with_proxy = with_proxy
         self.proxy_port = proxy_port
+        self.proxy_strategy = proxy_strategy
         self.processes: List[subprocess.Popen] = []
         self.proxy_process: Optional[subprocess.Popen] = None
         self._shutdown = False
@@ -91,6 +94,10 @@ class ClusterManager:
         env = os.environ.copy()
         env["PORT"] = str(port)
         env["BACKEND_PORT"] = str(port)
+        if self.with_proxy and self.proxy_strategy == "voice_affinity":
+            # 只预热一致性哈希环上归属本实例的音色，序号与代理的后端顺序一致
+            env["WARMUP_SHARD_INDEX"] = str(instance_id - 1)
+            env["WARMUP_SHARD_COUNT"] = str(self.instances)
 
         # 使用 uvicorn 直接启动
         cmd = [
@@ -118,68 +125,21 @@ class ClusterManager:
         print(f"[实例 {instance_id}] PID: {process.pid}, 日志: {log_dir}/instance_{instance_id}.log")
 
     def _start_proxy(self):
-        """启动简易负载均衡代理"""
+        """启动负载均衡代理 (app/proxy.py)"""
         print()
-        print(f"正在启动负载均衡代理 (端口: {self.proxy_port})...")
+        print(f"正在启动负载均衡代理 (端口: {self.proxy_port}, 策略: {self.proxy_strategy})...")
 
         # 生成后端列表
         backends = [f"http://127.0.0.1:{self.base_port + i}" for i in range(self.instances)]
-        backends_str = ",".join(backends)
-
-        # 使用内置的简易代理
-        proxy_code = f'''
-import asyncio
-import itertools
-import httpx
-from fastapi import FastAPI, Request, Response
-from fastapi.responses import StreamingResponse
-import uvicorn
-
-app = FastAPI(title="TTS Load Balancer")
-backends = {repr(backends)}
-backend_cycle = itertools.cycle(backends)
-
-@app.api_route("/{{path:path}}", methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"])
-async def proxy(request: Request, path: str):
-    backend = next(backend_cycle)
-    url = f"{{backend}}/{{path}}"
-
-    async with httpx.AsyncClient(timeout=300.0) as client:
-        body = await request.body()
-        headers = dict(request.headers)
-        headers.pop("host", None)
-
-        response = await client.request(
-            method=request.method,
-            url=url,
-            headers=headers,
-            content=body,
-            params=request.query_params
-        )
-
-        return Response(
-            content=response.content,
-            status_code=response.status_code,
-            headers=dict(response.headers),
-            media_type=response.headers.get("content-type")
-        )
-
-@app.get("/")
-async def health():
-    return {{"status": "running", "backends": backends, "mode": "load_balancer"}}
-
-if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port={self.proxy_port})
-'''
-
-        # 写入临时代理脚本
-        proxy_script = "logs/_proxy_temp.py"
-        with open(proxy_script, "w") as f:
-            f.write(proxy_code)
 
         log_file = open("logs/proxy.log", "w")
         self.proxy_process = subprocess.Popen(
-            [sys.executable, proxy_script],
+            [
+                sys.executable, "-m", "app.proxy",
+                "--backends", ",".join(backends),
+                "--port", str(self.proxy_port),
+                "--strategy", self.proxy_strategy
+            ],
             stdout=log_file,
             stderr=subprocess.STDOUT
         )
@@ -302,6 +262,15 @@ def main():
         help="负载均衡代理端口 (默认: 8000)"
     )
 
+    parser.add_argument(
+        "--proxy-strategy",
+        choices=["least_outstanding", "queue", "voice_affinity", "estimated_wait"],
+        default="least_outstanding",
+        help="代理路由策略: least_outstanding(最少未完成请求) / queue(后端队列长度) / "
+             "voice_affinity(按音色粘性路由, 各实例只预热自己分片的音色) / "
+             "estimated_wait(后端预计等待时间) (默认: least_outstanding)"
+    )
+
     args = parser.parse_args()
 
     # 验证参数
@@ -321,7 +290,8 @@ def main():
         instances=args.instances,
         base_port=args.base_port,
         with_proxy=args.with_proxy,
-        proxy_port=args.proxy_port
+        proxy_port=args.proxy_port,
+        proxy_strategy=args.proxy_strategy
     )
 
     manager.start()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""批量合成任务测试（离线运行，使用 MockIndexTTS，CPU 即可）"""
+import asyncio
+import tempfile
+from pathlib import Path
+
+from app.core.admission import QueueFull
+from app.core.inference import MockIndexTTS
+from app.services.batch_jobs import (
+    BATCH_CANCELLED,
+    BATCH_COMPLETED,
+    ITEM_CANCELLED,
+    ITEM_FAILED,
+    ITEM_SUCCEEDED,
+    BatchJobManager,
+    BatchJobStore,
+)
+from app.utils.audio import save_audio_to_wav
+
+_model = MockIndexTTS("cpu")
+
+
+async def _mock_synthesize(request: dict) -> tuple[bytes, str]:
+    """以 Mock 模型合成并编码为 WAV"""
+    if request.get("fail"):
+        raise RuntimeError("模拟合成失败")
+    loop = asyncio.get_event_loop()
+    audio = await loop.run_in_executor(None, _model.synthesize, request["input"], "")
+    return save_audio_to_wav(audio), "wav"
+
+
+def _manager(workdir: Path, concurrency: int = 1) -> BatchJobManager:
+    return BatchJobManager(BatchJobStore(workdir / "batch_jobs.db"), workdir / "batches", concurrency=concurrency)
+
+
+async def _wait_finished(manager: BatchJobManager, batch_id: str, timeout: float = 30) -> dict:
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        info = await manager.get(batch_id)
+        if info["status"] in (BATCH_COMPLETED, BATCH_CANCELLED):
+            return info
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"批次未在 {timeout} 秒内完成: {await manager.get(batch_id)}")
+
+
+def test_batch_completes_with_failures():
+    """批次逐条执行，失败的条目单独标记，其余条目写出音频文件"""
+    print("\n测试: 批次执行")
+    workdir = Path(tempfile.mkdtemp())
+
+    async def run():
+        manager = _manager(workdir, concurrency=2)
+        await manager.start(_mock_synthesize)
+        batch_id = await manager.submit([
+            ("a", {"input": "第一条"}),
+            ("b", {"input": "第二条", "fail": True}),
+            ("c", {"input": "第三条"}),
+        ])
+        return await _wait_finished(manager, batch_id)
+
+    info = asyncio.run(run())
+    print(f"批次状态: {info['status']}, 成功 {info['completed']}, 失败 {info['failed']}")
+    assert info["status"] == BATCH_COMPLETED
+    assert [item["status"] for item in info["items"]] == [ITEM_SUCCEEDED, ITEM_FAILED, ITEM_SUCCEEDED]
+    for item in info["items"]:
+        if item["output"]:
+            assert (workdir / "batches" / item["output"]).stat().st_size > 44
+
+
+def test_resume_after_restart():
+    """服务中断后重新启动，已完成的条目不重复合成，中断时运行中和未开始的条目继续执行"""
+    print("\n测试: 重启后恢复")
+    workdir = Path(tempfile.mkdtemp())
+    calls: list[str] = []
+    block = {"enabled": True}
+
+    async def synthesize(request: dict) -> tuple[bytes, str]:
+        calls.append(request["input"])
+        if block["enabled"] and request["input"] == "二":
+            # 模拟服务在该条目合成过程中被停止
+            await asyncio.Event().wait()
+        return await _mock_synthesize(request)
+
+    async def first_run() -> str:
+        manager = _manager(workdir)
+        await manager.start(synthesize)
+        batch_id = await manager.submit([(None, {"input": text}) for text in ("一", "二", "三")])
+        while len(calls) < 2:
+            await asyncio.sleep(0.05)
+        await manager.stop()
+        return batch_id
+
+    async def second_run(batch_id: str) -> dict:
+        manager = _manager(workdir)
+        await manager.start(synthesize)
+        return await _wait_finished(manager, batch_id)
+
+    batch_id = asyncio.run(first_run())
+    print(f"中断前调用: {calls}")
+    block["enabled"] = False
+    info = asyncio.run(second_run(batch_id))
+    print(f"全部调用: {calls}, 批次状态: {info['status']}")
+    assert calls == ["一", "二", "二", "三"]
+    assert info["status"] == BATCH_COMPLETED and info["completed"] == 3
+
+
+def test_cancel_skips_pending_items():
+    """取消批次后未开始的条目不再执行"""
+    print("\n测试: 取消批次")
+    workdir = Path(tempfile.mkdtemp())
+
+    async def run():
+        manager = _manager(workdir)
+        await manager.start(_mock_synthesize)
+        batch_id = await manager.submit([(None, {"input": text}) for text in ("一", "二", "三", "四")])
+        await asyncio.sleep(0.1)
+        assert await manager.cancel(batch_id)
+        await _wait_finished(manager, batch_id)
+        # 正在执行的条目完成后停止
+        await asyncio.sleep(1)
+        return await manager.get(batch_id)
+
+    info = asyncio.run(run())
+    statuses = [item["status"] for item in info["items"]]
+    print(f"条目状态: {statuses}")
+    assert info["status"] == BATCH_CANCELLED
+    assert statuses.count(ITEM_CANCELLED) >= 2
+    assert ITEM_FAILED not in statuses
+
+
+def test_queue_full_is_retried():
+    """推理队列已满时条目等待后重新提交，不标记为失败"""
+    print("\n测试: 队列已满重试")
+    workdir = Path(tempfile.mkdtemp())
+    attempts = {"n": 0}
+
+    async def synthesize(request: dict) -> tuple[bytes, str]:
+        attempts["n"] += 1
+        if attempts["n"] == 1:
+            raise QueueFull(50, 0.1)
+        return await _mock_synthesize(request)
+
+    async def run():
+        manager = _manager(workdir)
+        await manager.start(synthesize)
+        batch_id = await manager.submit([(None, {"input": "一"})])
+        return await _wait_finished(manager, batch_id)
+
+    info = asyncio.run(run())
+    print(f"尝试次数: {attempts['n']}, 条目状态: {info['items'][0]['status']}")
+    assert attempts["n"] == 2
+    assert info["status"] == BATCH_COMPLETED and info["completed"] == 1
+
+
+def main():
+    print("=" * 60)
+    print("批量合成任务测试")
+    print("=" * 60)
+    test_batch_completes_with_failures()
+    test_resume_after_restart()
+    test_cancel_skips_pending_items()
+    test_queue_full_is_retried()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""动态微批处理调度器测试（离线运行，使用 MockIndexTTS，CPU 即可）"""
+import asyncio
+import time
+
+from app.core.batching import BatchScheduler, DeadlineExceeded, InferenceJob
+from app.core.config import settings
+from app.core.inference import MockIndexTTS, TTSModelEngine
+from app.core.request_queue import TTSQueue
+
+
+def _make_scheduler(batch_sizes: list[int], max_batch_size: int = 4, max_wait_ms: int = 50):
+    """调度器 + Mock 模型批量推理；batch_sizes 记录每次下发的批大小"""
+    queue = TTSQueue(50)
+    model = MockIndexTTS("cpu")
+
+    async def dispatch(batch: list[InferenceJob]):
+        batch_sizes.append(len(batch))
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            None, model.synthesize_batch, [job.text for job in batch], [job.ref_audio_path for job in batch]
+        )
+
+    scheduler = BatchScheduler(queue, dispatch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    return queue, scheduler
+
+
+async def _submit(queue: TTSQueue, job: InferenceJob) -> InferenceJob:
+    ok, _ = await queue.add(job.request_id, payload=job)
+    assert ok
+    return job
+
+
+def test_compatible_jobs_are_batched():
+    """采样参数一致的任务合并为批次，批大小不超过 max_batch_size，结果按任务分发"""
+    print("\n测试: 合批")
+    batch_sizes: list[int] = []
+
+    async def run():
+        queue, scheduler = _make_scheduler(batch_sizes)
+        jobs = [await _submit(queue, InferenceJob(text="字" * (i + 1), ref_audio_path="")) for i in range(6)]
+        scheduler.ensure_running()
+        results = await asyncio.wait_for(asyncio.gather(*(job.future for job in jobs)), timeout=10)
+        for i, audio in enumerate(results):
+            assert len(audio) == int(settings.sample_rate * (i + 1) * 0.1)
+        assert all(job.batch_size == size for job, size in zip(jobs, [4] * 4 + [2] * 2))
+        return scheduler.get_stats()
+
+    stats = asyncio.run(run())
+    print(f"批大小: {batch_sizes}, 统计: {stats}")
+    assert batch_sizes == [4, 2]
+    assert stats["batches_dispatched"] == 2 and stats["jobs_dispatched"] == 6
+
+
+def test_incompatible_jobs_not_mixed():
+    """采样参数（或随机种子）不同的任务不会进入同一批次，且不越过队首"""
+    print("\n测试: 不兼容任务")
+    batch_sizes: list[int] = []
+
+    async def run():
+        queue, scheduler = _make_scheduler(batch_sizes)
+        jobs = [
+            await _submit(queue, InferenceJob(text="一", ref_audio_path="", temperature=1.0)),
+            await _submit(queue, InferenceJob(text="二", ref_audio_path="", temperature=0.7)),
+            await _submit(queue, InferenceJob(text="三", ref_audio_path="", temperature=1.0)),
+            await _submit(queue, InferenceJob(text="四", ref_audio_path="", temperature=1.0, seed=42)),
+        ]
+        scheduler.ensure_running()
+        await asyncio.wait_for(asyncio.gather(*(job.future for job in jobs)), timeout=10)
+
+    asyncio.run(run())
+    print(f"批大小: {batch_sizes}")
+    assert batch_sizes == [1, 1, 1, 1]
+
+
+def test_stale_jobs_dropped():
+    """已取消或已过截止时间的任务不交给模型"""
+    print("\n测试: 丢弃已取消/超时任务")
+    batch_sizes: list[int] = []
+
+    async def run():
+        queue, scheduler = _make_scheduler(batch_sizes)
+        cancelled = await _submit(queue, InferenceJob(text="取消", ref_audio_path=""))
+        expired = await _submit(queue, InferenceJob(text="超时", ref_audio_path="", deadline=time.time() - 1))
+        live = await _submit(queue, InferenceJob(text="正常", ref_audio_path=""))
+        cancelled.future.cancel()
+        scheduler.ensure_running()
+        await asyncio.wait_for(live.future, timeout=10)
+        try:
+            await expired.future
+        except DeadlineExceeded:
+            pass
+        else:
+            raise AssertionError("超时任务应抛出 DeadlineExceeded")
+        return scheduler.get_stats()
+
+    stats = asyncio.run(run())
+    print(f"批大小: {batch_sizes}, 统计: {stats}")
+    assert batch_sizes == [1]
+    assert stats["jobs_dropped"] == 2
+
+
+def test_dispatch_error_propagates():
+    """批量推理失败时批内所有任务收到同一异常，调度器继续处理后续任务"""
+    print("\n测试: 推理失败")
+    calls: list[int] = []
+
+    async def run():
+        queue = TTSQueue(10)
+
+        async def dispatch(batch):
+            calls.append(len(batch))
+            if len(calls) == 1:
+                raise RuntimeError("模拟推理失败")
+            return [job.text for job in batch]
+
+        scheduler = BatchScheduler(queue, dispatch, max_batch_size=4, max_wait_ms=20)
+        failed = [await _submit(queue, InferenceJob(text=str(i), ref_audio_path="")) for i in range(2)]
+        scheduler.ensure_running()
+        outcomes = await asyncio.gather(*(job.future for job in failed), return_exceptions=True)
+        assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+        after = await _submit(queue, InferenceJob(text="ok", ref_audio_path=""))
+        assert await asyncio.wait_for(after.future, timeout=5) == "ok"
+
+    asyncio.run(run())
+    print(f"批次: {calls}")
+    assert calls == [2, 1]
+
+
+def test_inflight_job_aborted():
+    """推理中的任务被放弃后在下一个生成步骤停止，不等整段推理完成"""
+    print("\n测试: 取消推理中的任务")
+
+    async def run():
+        engine = TTSModelEngine()
+        engine.model = MockIndexTTS("cpu")
+        job = InferenceJob(text="一二三四五", ref_audio_path="")
+        loop = asyncio.get_event_loop()
+        loop.call_later(0.1, job.future.cancel)
+        started = time.perf_counter()
+        outputs = await engine._dispatch_batch([job])
+        return outputs, time.perf_counter() - started
+
+    outputs, elapsed = asyncio.run(run())
+    print(f"耗时: {elapsed:.2f}s")
+    assert elapsed < 0.4
+    assert len(outputs[0]) == 0
+
+
+def main():
+    print("=" * 60)
+    print("批处理调度器测试")
+    print("=" * 60)
+    test_compatible_jobs_are_batched()
+    test_incompatible_jobs_not_mixed()
+    test_stale_jobs_dropped()
+    test_dispatch_error_propagates()
+    test_inflight_job_aborted()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()
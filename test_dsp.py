@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""音频 DSP 工具测试（离线运行）"""
+import numpy as np
+
+from app.utils.dsp import resample, time_stretch
+
+
+def _sine(freq: float, sample_rate: int, seconds: float = 1.0) -> np.ndarray:
+    t = np.arange(int(sample_rate * seconds)) / sample_rate
+    return (0.5 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def _peak_hz(audio: np.ndarray, sample_rate: int) -> float:
+    spectrum = np.abs(np.fft.rfft(audio * np.hanning(len(audio))))
+    return float(np.argmax(spectrum)) * sample_rate / len(audio)
+
+
+def test_resample():
+    """输出长度按采样率比例变化，正弦频率保持不变"""
+    print("\n测试: 重采样")
+    audio = _sine(440, 24000)
+    for target_sr in (16000, 22050, 44100, 48000):
+        output = resample(audio, 24000, target_sr)
+        peak = _peak_hz(output, target_sr)
+        print(f"24000 -> {target_sr}: {len(output)} 样本, 峰值 {peak:.1f} Hz")
+        assert output.dtype == np.float32
+        assert len(output) == -(-len(audio) * target_sr // 24000)
+        assert abs(peak - 440) < 2
+    assert np.array_equal(resample(audio, 24000, 24000), audio)
+    # 高于目标奈奎斯特频率的成分被抗混叠滤波器滤除，不会折叠到低频
+    aliased = resample(_sine(10000, 24000), 24000, 16000)
+    print(f"10 kHz -> 16000: 峰值幅度 {np.abs(aliased).max():.4f}")
+    assert np.abs(aliased[100:-100]).max() < 0.05
+    assert len(resample(np.zeros(0, dtype=np.float32), 24000, 16000)) == 0
+
+
+def test_time_stretch():
+    """输出长度约为 len / speed，音高不变"""
+    print("\n测试: 变速不变调")
+    sample_rate = 24000
+    audio = _sine(220, sample_rate)
+    for speed in (0.5, 0.8, 1.25, 2.0):
+        output = time_stretch(audio, speed, sample_rate)
+        peak = _peak_hz(output, sample_rate)
+        print(f"speed={speed}: {len(output)} 样本, 峰值 {peak:.1f} Hz")
+        assert abs(len(output) - len(audio) / speed) <= 1
+        assert abs(peak - 220) < 3
+    assert np.array_equal(time_stretch(audio, 1.0, sample_rate), audio)
+
+
+def main():
+    print("=" * 60)
+    print("音频 DSP 工具测试")
+    print("=" * 60)
+    test_resample()
+    test_time_stretch()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""本地词典情感分类测试（离线运行）"""
+from app.core.config import settings
+from app.services.emotion_lexicon import LexiconClassifier
+
+_classifier = LexiconClassifier(settings.sentiment_labels)
+
+
+def test_clear_emotions():
+    """关键词明确的文本归到对应情感"""
+    print("\n测试: 明确情感")
+    cases = {
+        "今天好开心": "happy",
+        "I am so happy!": "happy",
+        "气死我了，闭嘴！": "angry",
+        "我好难过……": "sad",
+    }
+    for text, expected in cases.items():
+        label, confidence = _classifier.classify(text)
+        print(f"{text} -> {label} ({confidence})")
+        assert label == expected and confidence > 0
+
+
+def test_negation():
+    """否定词后的关键词不计分，没有其他线索时为中性"""
+    print("\n测试: 否定")
+    for text in ("不开心", "I am not happy", "I'm not really happy"):
+        label, confidence = _classifier.classify(text)
+        print(f"{text} -> {label} ({confidence})")
+        assert (label, confidence) == ("neutral", 0.0)
+
+
+def test_exclamation_intensifies():
+    """叹号加强已有情绪、提高置信度，没有情绪时不凭空产生"""
+    print("\n测试: 叹号加强")
+    _, plain = _classifier.classify("开心")
+    _, intense = _classifier.classify("太开心了！！！")
+    print(f"开心: {plain}, 太开心了！！！: {intense}")
+    assert intense > plain
+    assert _classifier.classify("今天天气！！！") == ("neutral", 0.0)
+
+
+def test_label_mapping():
+    """部署标签集中没有的情感映射为 neutral/default"""
+    print("\n测试: 标签映射")
+    classifier = LexiconClassifier(["happy", "default"])
+    assert classifier.classify("气死我了")[0] == "default"
+    assert classifier.classify("嗯")[0] == "default"
+
+
+def main():
+    print("=" * 60)
+    print("本地词典情感分类测试")
+    print("=" * 60)
+    test_clear_emotions()
+    test_negation()
+    test_exclamation_intensifies()
+    test_label_mapping()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""集群负载均衡代理测试（离线运行：在本机启动两个模拟后端）"""
+import asyncio
+import socket
+
+import httpx
+import uvicorn
+import websockets
+from fastapi import FastAPI, WebSocket
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.proxy import STRATEGY_VOICE_AFFINITY, BackendPool, create_app
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _fake_backend(name: str, reject: bool = False) -> FastAPI:
+    """模拟 TTS 实例：合成接口返回实例名，WebSocket 回显文本"""
+    app = FastAPI()
+
+    @app.get("/v1/queue/status")
+    async def status():
+        return {"queue_length": 0, "estimated_wait_seconds": 0.0}
+
+    @app.post("/v1/audio/speech")
+    async def speech():
+        if reject:
+            return JSONResponse(status_code=429, content={"detail": "busy"}, headers={"Retry-After": "1"})
+        return {"backend": name}
+
+    @app.websocket("/v1/audio/ws")
+    async def ws(websocket: WebSocket):
+        await websocket.accept()
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            await websocket.send_text(f"{name}:{message.get('text')}")
+
+    return app
+
+
+def test_least_outstanding_and_health():
+    """选择未完成请求最少的后端；连续失败后摘除，恢复后重新加入"""
+    print("\n测试: 选择与健康检查")
+    pool = BackendPool(["http://a", "http://b"], fall=2, rise=2)
+    a, b = pool.backends
+    a.outstanding = 3
+    assert pool.pick() is b
+
+    pool.mark_failure(b)
+    assert b.healthy
+    pool.mark_failure(b)
+    assert not b.healthy
+    assert pool.pick() is a
+
+    pool.mark_success(b)
+    assert not b.healthy
+    pool.mark_success(b)
+    assert b.healthy
+    print("✓ 选择与摘除正确")
+
+
+def test_voice_affinity_is_stable():
+    """voice_affinity 策略下同一音色固定在同一实例，负载过高时溢出"""
+    print("\n测试: 音色粘性路由")
+    pool = BackendPool(["http://a", "http://b", "http://c"], strategy=STRATEGY_VOICE_AFFINITY)
+    owner = pool.pick_for_voice("girl_01")
+    assert all(pool.pick_for_voice("girl_01") is owner for _ in range(10))
+
+    owner.outstanding = 10
+    spilled = pool.pick_for_voice("girl_01")
+    assert spilled is not owner
+    print(f"✓ 统计: {pool.affinity_stats}")
+
+
+def test_root_health_is_local():
+    """代理根路径由代理自身响应，后端全部不可用时同样返回 200"""
+    print("\n测试: 代理健康检查")
+    pool = BackendPool([f"http://127.0.0.1:{_free_port()}"])
+    pool.backends[0].healthy = False
+    response = TestClient(create_app(pool)).get("/")
+    print(f"响应: {response.json()}")
+    assert response.status_code == 200
+    assert response.json()["mode"] == "load_balancer" and response.json()["healthy_backends"] == 0
+
+
+def test_forwarding_http_and_websocket():
+    """HTTP 请求在后端返回 429 时换实例重试；WebSocket 会话双向透传"""
+    print("\n测试: 转发")
+    busy_port, free_port, proxy_port = _free_port(), _free_port(), _free_port()
+    pool = BackendPool([f"http://127.0.0.1:{busy_port}", f"http://127.0.0.1:{free_port}"])
+    servers = [
+        uvicorn.Server(uvicorn.Config(_fake_backend("busy", reject=True), port=busy_port, log_level="error")),
+        uvicorn.Server(uvicorn.Config(_fake_backend("free"), port=free_port, log_level="error")),
+        uvicorn.Server(uvicorn.Config(create_app(pool), port=proxy_port, log_level="error")),
+    ]
+
+    async def run():
+        tasks = [asyncio.ensure_future(server.serve()) for server in servers]
+        try:
+            while not all(server.started for server in servers):
+                await asyncio.sleep(0.05)
+            async with httpx.AsyncClient() as client:
+                for _ in range(4):
+                    response = await client.post(f"http://127.0.0.1:{proxy_port}/v1/audio/speech", json={})
+                    assert response.status_code == 200
+                    assert response.json() == {"backend": "free"}
+
+            async with websockets.connect(f"ws://127.0.0.1:{proxy_port}/v1/audio/ws") as ws:
+                await ws.send("你好")
+                reply = await asyncio.wait_for(ws.recv(), timeout=5)
+                assert reply.endswith(":你好")
+                assert sum(backend.outstanding for backend in pool.backends) == 1
+            await asyncio.sleep(0.2)
+            assert sum(backend.outstanding for backend in pool.backends) == 0
+        finally:
+            for server in servers:
+                server.should_exit = True
+            await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    print("✓ HTTP 重试与 WebSocket 透传正常")
+
+
+def main():
+    print("=" * 60)
+    print("负载均衡代理测试")
+    print("=" * 60)
+    test_least_outstanding_and_health()
+    test_voice_affinity_is_stable()
+    test_root_health_is_local()
+    test_forwarding_http_and_websocket()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""模型副本池测试（离线运行：副本进程加载 MockIndexTTS，CPU 即可）"""
+import asyncio
+import glob
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from app.core.batching import InferenceJob
+from app.core.config import settings
+from app.core.replicas import ReplicaDied, ReplicaPool
+
+
+def _reference_wav() -> Path:
+    path = Path(tempfile.mkdtemp()) / "default.wav"
+    sf.write(str(path), np.random.default_rng(0).uniform(-0.1, 0.1, 8000).astype(np.float32), 16000)
+    return path
+
+
+def _start_pool(devices: list[str]) -> tuple[ReplicaPool, Path]:
+    wav = _reference_wav()
+    pool = ReplicaPool(devices)
+    pool.start([wav])
+    return pool, wav
+
+
+def _jobs(wav: Path, texts: list[str]) -> list[InferenceJob]:
+    return [InferenceJob(text=text, ref_audio_path=str(wav)) for text in texts]
+
+
+def _shared_segments() -> set[str]:
+    return set(glob.glob("/dev/shm/psm_*"))
+
+
+def test_pool_runs_batches():
+    """两个副本并行执行批次，音频经共享内存完整传回"""
+    print("\n测试: 副本池推理")
+    pool, wav = _start_pool(["cpu", "cpu"])
+    try:
+        async def run():
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                pool.run(_jobs(wav, ["你好", "世界"])),
+                pool.run(_jobs(wav, ["并行"]))
+            )
+            return results, time.perf_counter() - started
+
+        (first, second), elapsed = asyncio.run(run())
+        print(f"耗时: {elapsed:.2f}s, 统计: {pool.get_stats()}")
+        assert [len(audio) for audio in first] == [int(settings.sample_rate * 0.2)] * 2
+        assert len(second[0]) == int(settings.sample_rate * 0.2)
+        # Mock 单批耗时 0.5 秒，两个副本应并行而不是串行
+        assert elapsed < 0.95
+        assert sum(replica["batches"] for replica in pool.get_stats()["replicas"]) == 2
+    finally:
+        pool.close()
+
+
+def test_dead_replica_is_respawned():
+    """进程退出的副本不再放回空闲队列，后台重启后重新参与推理"""
+    print("\n测试: 副本进程退出")
+    pool, wav = _start_pool(["cpu"])
+    try:
+        async def run():
+            replica = pool.replicas[0]
+            replica.process.kill()
+            replica.process.join()
+            try:
+                await pool.run(_jobs(wav, ["一"]))
+            except ReplicaDied as e:
+                print(f"✓ 检测到副本退出: {e}")
+            else:
+                raise AssertionError("应抛出 ReplicaDied")
+
+            # 等待后台重启完成后再次推理（pool.run 会等到重启的副本回到空闲队列）
+            audio = await asyncio.wait_for(pool.run(_jobs(wav, ["二"])), timeout=120)
+            return audio
+
+        audio = asyncio.run(run())
+        stats = pool.get_stats()["replicas"][0]
+        print(f"副本状态: {stats}")
+        assert len(audio[0]) == int(settings.sample_rate * 0.1)
+        assert stats["alive"] and stats["restarts"] == 1
+    finally:
+        pool.close()
+
+
+def test_cancel_releases_shared_memory():
+    """调用方取消后，副本完成的批次结果被释放，副本回到空闲队列"""
+    print("\n测试: 取消时释放共享内存")
+    pool, wav = _start_pool(["cpu"])
+    try:
+        before = _shared_segments()
+
+        async def run():
+            task = asyncio.ensure_future(pool.run(_jobs(wav, ["取消的批次"])))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            # Mock 推理约 0.5 秒，等待回复到达并被回调处理
+            for _ in range(50):
+                await asyncio.sleep(0.1)
+                if pool._idle_queue().qsize() == 1:
+                    break
+            return pool._idle_queue().qsize()
+
+        idle = asyncio.run(run())
+        leaked = _shared_segments() - before
+        print(f"空闲副本: {idle}, 遗留共享内存: {leaked}")
+        assert idle == 1
+        assert not leaked
+    finally:
+        pool.close()
+
+
+def main():
+    print("=" * 60)
+    print("模型副本池测试")
+    print("=" * 60)
+    test_pool_runs_batches()
+    test_dead_replica_is_respawned()
+    test_cancel_releases_shared_memory()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""优先级请求队列测试（离线运行，不需要启动服务）"""
+import asyncio
+import random
+
+from app.core.request_queue import PRIORITY_BATCH, PRIORITY_INTERACTIVE, TTSQueue
+
+
+def test_priority_order():
+    """interactive 请求先于 batch 请求出队，同一优先级内先进先出"""
+    print("\n测试: 优先级与先进先出")
+
+    async def run():
+        queue = TTSQueue(10)
+        await queue.add("b1", PRIORITY_BATCH)
+        await queue.add("i1", PRIORITY_INTERACTIVE)
+        await queue.add("b2", PRIORITY_BATCH)
+        await queue.add("i2", PRIORITY_INTERACTIVE)
+        return [(await queue.get()).request_id for _ in range(4)]
+
+    order = asyncio.run(run())
+    print(f"出队顺序: {order}")
+    assert order == ["i1", "i2", "b1", "b2"]
+
+
+def test_positions_and_removal():
+    """位置查询考虑高优先级积压与已移除的请求"""
+    print("\n测试: 位置与移除")
+
+    async def run():
+        queue = TTSQueue(10)
+        for request_id in ("b1", "b2", "b3"):
+            await queue.add(request_id, PRIORITY_BATCH)
+        ok, position = await queue.add("i1", PRIORITY_INTERACTIVE)
+        assert ok and position == 1
+        assert await queue.get_position("b3") == 4
+
+        await queue.remove("b2")
+        assert await queue.get_position("b3") == 3
+        assert await queue.get_position("b2") == -1
+
+        item = await queue.get()
+        assert item.request_id == "i1"
+        assert await queue.get_position("i1") == 0
+        assert await queue.get_position("b1") == 1
+        assert await queue.get_position("b3") == 2
+
+    asyncio.run(run())
+    print("✓ 位置正确")
+
+
+def test_not_ready_is_overtaken():
+    """未就绪的请求占住位置但被其后已就绪的请求越过，mark_ready 后按原位置调度"""
+    print("\n测试: 未就绪请求")
+
+    async def run():
+        queue = TTSQueue(10)
+        await queue.add("auto", PRIORITY_INTERACTIVE, ready=False)
+        await queue.add("plain", PRIORITY_INTERACTIVE)
+        assert await queue.get_position("plain") == 2
+
+        first = await queue.get()
+        assert first.request_id == "plain"
+
+        waiter = asyncio.ensure_future(queue.get())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await queue.mark_ready("auto")
+        second = await asyncio.wait_for(waiter, timeout=1)
+        assert second.request_id == "auto"
+
+    asyncio.run(run())
+    print("✓ 就绪顺序正确")
+
+
+def test_queue_full():
+    """超过 max_size 时拒绝入队"""
+    print("\n测试: 队列已满")
+
+    async def run():
+        queue = TTSQueue(2)
+        assert (await queue.add("a"))[0]
+        assert (await queue.add("b"))[0]
+        assert await queue.add("c") == (False, -1)
+        status = await queue.get_status()
+        assert status["queue_length"] == 2 and not status["can_submit"]
+
+    asyncio.run(run())
+    print("✓ 队列已满时拒绝")
+
+
+def test_get_matching_stops_at_incompatible_head():
+    """get_matching 不越过不满足条件的队首"""
+    print("\n测试: get_matching")
+
+    async def run():
+        queue = TTSQueue(10)
+        await queue.add("x", payload="a")
+        await queue.add("y", payload="b")
+        assert (await queue.get_matching(lambda item: item.payload == "b", timeout=0.05)) is None
+        item = await queue.get_matching(lambda item: item.payload == "a", timeout=0.05)
+        assert item.request_id == "x"
+
+    asyncio.run(run())
+    print("✓ 保持队首顺序")
+
+
+def test_positions_after_random_removal():
+    """随机移除与出队后，位置与朴素列表一致（覆盖已移除序号的截断）"""
+    print("\n测试: 随机移除后的位置")
+
+    async def run():
+        rng = random.Random(0)
+        queue = TTSQueue(1000)
+        expected = []
+        next_id = 0
+        for _ in range(600):
+            action = rng.random()
+            if action < 0.5 or not expected:
+                request_id = f"r{next_id}"
+                next_id += 1
+                await queue.add(request_id, PRIORITY_BATCH)
+                expected.append(request_id)
+            elif action < 0.8:
+                request_id = rng.choice(expected)
+                await queue.remove(request_id)
+                expected.remove(request_id)
+            else:
+                item = await queue.get()
+                assert item.request_id == expected.pop(0)
+                await queue.remove(item.request_id)
+            for request_id in rng.sample(expected, min(5, len(expected))):
+                assert await queue.get_position(request_id) == expected.index(request_id) + 1
+
+    asyncio.run(run())
+    print("✓ 位置正确")
+
+
+def main():
+    print("=" * 60)
+    print("优先级请求队列测试")
+    print("=" * 60)
+    test_priority_order()
+    test_positions_and_removal()
+    test_not_ready_is_overtaken()
+    test_queue_full()
+    test_get_matching_stops_at_incompatible_head()
+    test_positions_after_random_removal()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""情感分析批处理测试（离线运行：以模拟的 OpenAI 兼容客户端代替远程 LLM）"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.core.config import settings
+from app.services.sentiment import SentimentAnalyzer
+
+
+class FakeClient:
+    """记录每次请求的 prompt，由 reply(prompt) 生成回复内容"""
+
+    def __init__(self, reply, delay: float = 0.0):
+        self.prompts: list[str] = []
+        self.reply = reply
+        self.delay = delay
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        prompt = messages[0]["content"]
+        self.prompts.append(prompt)
+        await asyncio.sleep(self.delay)
+        message = SimpleNamespace(content=self.reply(prompt))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def _label_for(text: str) -> str:
+    return "sad" if "难过" in text else "happy"
+
+
+def _reply(prompt: str) -> str:
+    """批量 prompt 返回 JSON 数组，单条 prompt 返回标签"""
+    if "JSON 字符串数组" in prompt:
+        numbered = prompt.rsplit("待分析文本：", 1)[1].strip().splitlines()
+        texts = [json.loads(line.split(". ", 1)[1]) for line in numbered]
+        return json.dumps([_label_for(text) for text in texts])
+    return _label_for(prompt.rsplit("待分析文本：", 1)[1])
+
+
+def _analyzer(client: FakeClient) -> SentimentAnalyzer:
+    """LLM 后端 + 仅内存缓存的分析器（需在事件循环内创建）"""
+    original = settings.sentiment_cache_path
+    settings.sentiment_cache_path = ""
+    try:
+        analyzer = SentimentAnalyzer()
+    finally:
+        settings.sentiment_cache_path = original
+    analyzer.enabled = True
+    analyzer.backend = "llm"
+    analyzer.client = client
+    return analyzer
+
+
+def test_concurrent_texts_share_one_request():
+    """同一窗口内的多条文本合并为一次 LLM 请求，标签按顺序分发"""
+    print("\n测试: 合并请求")
+    client = FakeClient(_reply)
+
+    async def run():
+        analyzer = _analyzer(client)
+        texts = ["今天真开心", "我好难过", "太棒了", "有点难过"]
+        labels = await asyncio.gather(*(analyzer.analyze(text) for text in texts))
+        return labels, analyzer.get_stats()
+
+    labels, stats = asyncio.run(run())
+    print(f"标签: {labels}, 请求数: {len(client.prompts)}, 统计: {stats['batch']}")
+    assert labels == ["happy", "sad", "happy", "sad"]
+    assert len(client.prompts) == 1
+    assert stats["batch"] == {"requests": 1, "texts": 4, "fallbacks": 0}
+
+
+def test_batch_split_by_max_size():
+    """待分析文本超过 sentiment_batch_max_size 时拆分为多次请求"""
+    print("\n测试: 批次拆分")
+    client = FakeClient(_reply)
+
+    async def run():
+        analyzer = _analyzer(client)
+        return await asyncio.gather(*(analyzer.analyze(f"第{i}句") for i in range(settings.sentiment_batch_max_size + 2)))
+
+    labels = asyncio.run(run())
+    print(f"请求数: {len(client.prompts)}")
+    assert labels == ["happy"] * (settings.sentiment_batch_max_size + 2)
+    assert len(client.prompts) == 2
+
+
+def test_invalid_batch_response_falls_back():
+    """批量响应无法解析时逐条重试"""
+    print("\n测试: 批量响应无效")
+    client = FakeClient(lambda prompt: "happy" if "JSON 字符串数组" in prompt else _reply(prompt))
+
+    async def run():
+        analyzer = _analyzer(client)
+        labels = await asyncio.gather(analyzer.analyze("开心"), analyzer.analyze("难过"))
+        return labels, analyzer.get_stats()
+
+    labels, stats = asyncio.run(run())
+    print(f"标签: {labels}, 请求数: {len(client.prompts)}")
+    assert labels == ["happy", "sad"]
+    assert len(client.prompts) == 3
+    assert stats["batch"]["fallbacks"] == 1
+
+
+def test_single_flight_and_cache():
+    """相同文本的并发分析只请求一次；首个调用方被取消不影响其他等待者，结果写入缓存"""
+    print("\n测试: 相同文本合并与缓存")
+    client = FakeClient(_reply, delay=0.1)
+
+    async def run():
+        analyzer = _analyzer(client)
+        leader = asyncio.ensure_future(analyzer.analyze("我好难过"))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(analyzer.analyze("我好难过"))
+        await asyncio.sleep(0.05)
+        leader.cancel()
+        label = await asyncio.wait_for(follower, timeout=5)
+        cached = await analyzer.analyze("我好难过")
+        return label, cached
+
+    label, cached = asyncio.run(run())
+    print(f"标签: {label}, 缓存: {cached}, 请求数: {len(client.prompts)}")
+    assert label == cached == "sad"
+    assert len(client.prompts) == 1
+
+
+def test_close_cancels_inflight_batches():
+    """发出的批次在完成前保持引用，关闭时取消并通知等待方"""
+    print("\n测试: 关闭时取消批次")
+    client = FakeClient(_reply, delay=10)
+
+    async def run():
+        analyzer = _analyzer(client)
+        pending = asyncio.ensure_future(analyzer.analyze("今天真开心"))
+        await asyncio.sleep(settings.sentiment_batch_wait_ms / 1000 + 0.05)
+        inflight = len(analyzer._batch_tasks)
+        await analyzer.close()
+        outcome = (await asyncio.gather(pending, return_exceptions=True))[0]
+        return inflight, outcome, len(analyzer._batch_tasks)
+
+    inflight, outcome, remaining = asyncio.run(run())
+    print(f"关闭前批次: {inflight}, 关闭后批次: {remaining}, 等待方结果: {outcome!r}")
+    assert inflight == 1 and remaining == 0
+    assert isinstance(outcome, asyncio.CancelledError)
+
+
+def test_hybrid_escalates_low_confidence():
+    """hybrid 后端：词典置信度达到阈值时本地返回，低于阈值才请求 LLM"""
+    print("\n测试: hybrid 转交阈值")
+    client = FakeClient(lambda prompt: "sad")
+
+    async def run():
+        analyzer = _analyzer(client)
+        analyzer.backend = "hybrid"
+        confident = await analyzer.analyze("太开心了！！！")  # 置信度 1.0
+        uncertain = await analyzer.analyze("今天天气不错")  # 无线索，置信度 0
+        return confident, uncertain, analyzer.get_stats()["lexicon"]
+
+    original = settings.sentiment_lexicon_min_confidence
+    settings.sentiment_lexicon_min_confidence = 0.6
+    try:
+        confident, uncertain, stats = asyncio.run(run())
+    finally:
+        settings.sentiment_lexicon_min_confidence = original
+    print(f"结果: {confident}, {uncertain}, 统计: {stats}, 请求数: {len(client.prompts)}")
+    assert confident == "happy" and uncertain == "sad"
+    assert stats == {"local": 1, "escalated": 1}
+    assert len(client.prompts) == 1 and "今天天气不错" in client.prompts[0]
+
+
+def test_hybrid_without_llm_uses_lexicon():
+    """hybrid 后端未配置 LLM 时，低置信度结果也直接采用词典结果"""
+    print("\n测试: hybrid 无 LLM")
+
+    async def run():
+        analyzer = _analyzer(None)
+        analyzer.backend = "hybrid"
+        return await analyzer.analyze("笑"), analyzer.get_stats()["lexicon"]  # 置信度约 0.33
+
+    label, stats = asyncio.run(run())
+    assert label == "happy" and stats == {"local": 1, "escalated": 0}
+
+
+def main():
+    print("=" * 60)
+    print("情感分析批处理测试")
+    print("=" * 60)
+    test_concurrent_texts_share_one_request()
+    test_batch_split_by_max_size()
+    test_invalid_batch_response_falls_back()
+    test_single_flight_and_cache()
+    test_close_cancels_inflight_batches()
+    test_hybrid_escalates_low_confidence()
+    test_hybrid_without_llm_uses_lexicon()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""说话人特征缓存测试（离线运行，CPU 即可）"""
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+import torch
+
+from app.core.config import settings
+from app.core.inference import TTSModelEngine
+from app.core.speaker_cache import IndexTTS2SpeakerSlot, SpeakerCacheManager, SpeakerFeatureStore
+
+
+def _indextts2_like() -> SimpleNamespace:
+    """只带 IndexTTS2 缓存槽位属性的替身"""
+    return SimpleNamespace(
+        device="cpu",
+        cache_spk_cond=None,
+        cache_s2mel_style=None,
+        cache_s2mel_prompt=None,
+        cache_mel=None,
+        cache_spk_audio_prompt=None,
+        cache_emo_cond=None,
+        cache_emo_audio_prompt=None,
+    )
+
+
+class _FakeIndexTTS2:
+    """infer() 像 IndexTTS2 一样把参考音频特征写入缓存槽位，并记录计算次数"""
+
+    def __init__(self):
+        self.__dict__.update(vars(_indextts2_like()))
+        self.computed = 0
+
+    def infer(self, spk_audio_prompt, text, output_path=None, **generation_kwargs):
+        if self.cache_spk_audio_prompt != spk_audio_prompt:
+            self.computed += 1
+            for attr in IndexTTS2SpeakerSlot.SPEAKER_ATTRS.values():
+                setattr(self, attr, torch.rand(3))
+            self.cache_spk_audio_prompt = spk_audio_prompt
+        return None
+
+
+class _MultiSpeakerModel:
+    """按参考音频保存特征的多音色模型替身，每个音色 16 字节"""
+
+    def __init__(self):
+        self.features: dict[str, dict] = {}
+
+    def compute(self, audio_path: Path) -> bool:
+        self.features[str(audio_path)] = {"spk_cond": torch.zeros(4)}
+        return True
+
+    def export_speaker_features(self, audio_path: str):
+        return self.features.get(audio_path)
+
+    def import_speaker_features(self, audio_path: str, features: dict):
+        self.features[audio_path] = features
+
+    def drop_speaker_features(self, audio_path: str):
+        self.features.pop(audio_path, None)
+
+
+def _manager(device_entries: int, host_entries: int, pinned=None) -> SpeakerCacheManager:
+    model = _MultiSpeakerModel()
+    return SpeakerCacheManager(model, model.compute, 16 * device_entries, 16 * host_entries, pinned)
+
+
+def _slot_engine(cache_dir: Path) -> TTSModelEngine:
+    engine = TTSModelEngine()
+    engine.model = _FakeIndexTTS2()
+    engine.speaker_slot = IndexTTS2SpeakerSlot(engine.model)
+    engine._fingerprint = "fp"
+    return engine
+
+
+def test_store_roundtrip():
+    """特征按原 dtype 还原，内存映射加载的张量可写且不影响磁盘文件"""
+    print("\n测试: 磁盘特征缓存读写")
+    store = SpeakerFeatureStore(Path(tempfile.mkdtemp()), "fp")
+    features = {
+        "spk_cond": torch.arange(6, dtype=torch.float16).reshape(2, 3),
+        "mel": torch.ones(4, dtype=torch.bfloat16),
+    }
+    store.save("ab" * 32, features)
+
+    loaded = store.load("ab" * 32)
+    assert loaded["spk_cond"].dtype == torch.float16 and loaded["mel"].dtype == torch.bfloat16
+    assert torch.equal(loaded["spk_cond"], features["spk_cond"])
+    loaded["spk_cond"].zero_()
+    assert torch.equal(store.load("ab" * 32)["spk_cond"], features["spk_cond"])
+
+
+def test_indextts2_slot():
+    """导出当前槽位中的参考音频特征，导入后槽位指向该参考音频"""
+    print("\n测试: IndexTTS2 缓存槽位")
+    model = _indextts2_like()
+    assert IndexTTS2SpeakerSlot.is_supported(model)
+    slot = IndexTTS2SpeakerSlot(model)
+    assert slot.export_speaker_features("a.wav") is None
+
+    for attr in IndexTTS2SpeakerSlot.SPEAKER_ATTRS.values():
+        setattr(model, attr, torch.rand(2))
+    model.cache_spk_audio_prompt = "a.wav"
+    model.cache_emo_cond = torch.rand(2)
+    model.cache_emo_audio_prompt = "a.wav"
+    exported = slot.export_speaker_features("a.wav")
+    assert set(exported) == {"spk_cond", "s2mel_style", "s2mel_prompt", "mel", "emo_cond"}
+
+    other = _indextts2_like()
+    IndexTTS2SpeakerSlot(other).import_speaker_features("a.wav", exported)
+    assert other.cache_spk_audio_prompt == "a.wav" and other.cache_emo_audio_prompt == "a.wav"
+    assert torch.equal(other.cache_mel, model.cache_mel)
+    assert IndexTTS2SpeakerSlot(other).get_cache_info() == {"speaker_cache_size": 1, "current": "a.wav"}
+    assert not IndexTTS2SpeakerSlot.is_supported(SimpleNamespace())
+
+
+def test_slot_warmup_uses_disk_cache():
+    """IndexTTS2 预热：首次启动计算并写入磁盘，再次启动直接从磁盘加载"""
+    print("\n测试: IndexTTS2 预热与磁盘特征缓存")
+    workdir = Path(tempfile.mkdtemp())
+    wav_file = workdir / "voice.wav"
+    wav_file.write_bytes(b"RIFF-fake-audio")
+    original = (settings.enable_speaker_feature_cache, settings.speaker_cache_dir)
+    settings.enable_speaker_feature_cache, settings.speaker_cache_dir = True, workdir / "features"
+    try:
+        first = _slot_engine(workdir)
+        assert first._warmup_voice(wav_file)
+        second = _slot_engine(workdir)
+        assert second._warmup_voice(wav_file)
+    finally:
+        settings.enable_speaker_feature_cache, settings.speaker_cache_dir = original
+
+    print(f"首次: {first.feature_cache_stats}, 再次: {second.feature_cache_stats}")
+    assert first.model.computed == 1 and first.feature_cache_stats["computed"] == 1
+    assert second.model.computed == 0 and second.feature_cache_stats["loaded"] == 1
+    assert second.speaker_slot.holds(str(wav_file))
+    assert torch.equal(second.model.cache_mel, first.model.cache_mel)
+
+
+def test_manager_lru_eviction():
+    """超出设备预算时淘汰最久未用的音色，并转存到主机内存"""
+    print("\n测试: 设备层 LRU 淘汰")
+    manager = _manager(device_entries=2, host_entries=10)
+    manager.ensure("voices/a/ref.wav")
+    manager.ensure("voices/b/ref.wav")
+    manager.ensure("voices/a/ref.wav")  # a 变为最近使用
+    manager.ensure("voices/c/ref.wav")
+
+    stats = manager.get_stats()
+    print(stats)
+    assert list(manager._device) == ["voices/a/ref.wav", "voices/c/ref.wav"]
+    assert list(manager._host) == ["voices/b/ref.wav"]
+    assert "voices/b/ref.wav" not in manager.model.features
+    assert stats["hits"] == 1 and stats["misses"] == 3 and stats["evictions"] == 1
+    assert stats["device_bytes"] == 32 and stats["host_bytes"] == 16
+
+
+def test_manager_pinned_survive():
+    """固定的音色不被淘汰，取消固定后按预算回收"""
+    print("\n测试: 固定音色")
+    manager = _manager(device_entries=1, host_entries=10, pinned=["a"])
+    manager.ensure("voices/a/ref.wav")
+    manager.ensure("voices/b/ref.wav")
+    manager.ensure("voices/c/ref.wav")
+    assert list(manager._device) == ["voices/a/ref.wav", "voices/c/ref.wav"]
+    assert list(manager._host) == ["voices/b/ref.wav"]
+    assert "voices/c/ref.wav" in manager.model.features  # 刚加载的音色不会被立即淘汰
+
+    manager.unpin("a")
+    assert list(manager._device) == ["voices/c/ref.wav"]
+    assert "voices/a/ref.wav" in manager._host
+    print(manager.get_stats())
+
+
+def test_manager_host_reload():
+    """主机层命中时导回设备，不调用加载函数"""
+    print("\n测试: 主机层回迁")
+    manager = _manager(device_entries=1, host_entries=10)
+    loads = []
+    manager._loader = lambda path: loads.append(path) or manager.model.compute(path)
+    manager.ensure("voices/a/ref.wav")
+    manager.ensure("voices/b/ref.wav")
+    manager.ensure("voices/a/ref.wav")
+
+    stats = manager.get_stats()
+    print(stats)
+    assert len(loads) == 2 and stats["host_hits"] == 1
+    assert "voices/a/ref.wav" in manager.model.features
+    assert list(manager._host) == ["voices/b/ref.wav"]
+    assert stats["host_bytes"] == 16
+
+
+def test_manager_host_budget_drops():
+    """主机层超出预算时丢弃最早转存的音色，之后只能重新加载"""
+    print("\n测试: 主机层丢弃")
+    manager = _manager(device_entries=1, host_entries=1)
+    for name in ("a", "b", "c"):
+        manager.ensure(f"voices/{name}/ref.wav")
+
+    stats = manager.get_stats()
+    print(stats)
+    assert stats["evictions"] == 2 and stats["drops"] == 1
+    assert list(manager._host) == ["voices/b/ref.wav"]
+    manager.ensure("voices/a/ref.wav")
+    assert manager.get_stats()["misses"] == 4
+
+
+def main():
+    print("=" * 60)
+    print("说话人特征缓存测试")
+    print("=" * 60)
+    test_store_roundtrip()
+    test_indextts2_slot()
+    test_slot_warmup_uses_disk_cache()
+    test_manager_lru_eviction()
+    test_manager_pinned_survive()
+    test_manager_host_reload()
+    test_manager_host_budget_drops()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""文本前端测试（离线运行）"""
+from app.services.text_frontend import TextFrontend, read_integer
+
+_frontend = TextFrontend(enabled=True, cache_size=0)
+
+
+def test_read_integer():
+    """万、亿分组读法，亿以上的部分整体作为亿的系数"""
+    print("\n测试: 整数读法")
+    cases = {
+        "10": "十",
+        "10010": "一万零一十",
+        "100000001": "一亿零一",
+        "120000000": "一亿二千万",
+        "1000000000000": "一万亿",
+        "1234567890123": "一万二千三百四十五亿六千七百八十九万零一百二十三",
+        "1000100010001": "一万零一亿零一万零一",
+    }
+    for digits, expected in cases.items():
+        print(f"{digits} -> {read_integer(digits)}")
+        assert read_integer(digits) == expected
+    assert read_integer("12345678901234567") == "一二三四五六七八九零一二三四五六七"
+
+
+def test_fractions():
+    """分数读作"几分之几"，日期与分母为 0 的写法不受影响"""
+    print("\n测试: 分数")
+    cases = {
+        "我吃了3/4个苹果": "我吃了四分之三个苹果",
+        "约有1/10的人": "约有十分之一的人",
+        "-3/4的概率": "负四分之三的概率",
+        "2024/1/5出发": "二零二四年一月五日出发",
+    }
+    for text, expected in cases.items():
+        print(f"{text} -> {_frontend.normalize(text)}")
+        assert _frontend.normalize(text) == expected
+    assert "分之" not in _frontend.normalize("比分是3/0")
+
+
+def test_long_numbers():
+    """长金额按数值读，手机号与证件号逐位读出"""
+    print("\n测试: 长数字")
+    cases = {
+        "共1000000000000元": "共一万亿元",
+        "电话13812345678": "电话一三八一二三四五六七八",
+        "证件号110101199003074578": "证件号一一零一零一一九九零零三零七四五七八",
+    }
+    for text, expected in cases.items():
+        print(f"{text} -> {_frontend.normalize(text)}")
+        assert _frontend.normalize(text) == expected
+
+
+def test_hyphen_and_versions():
+    """字母后的连字符不读作负号，多段点号的版本号逐段读出"""
+    print("\n测试: 连字符与版本号")
+    cases = {
+        "COVID-19疫情": "C O V I D-十九疫情",
+        "升级到GPT-4了": "升级到G P T-四了",
+        "温度-5度": "温度负五度",
+        "x=-2时": "x=负二时",
+        "version 1.2.3 发布": "version 一点二点三 发布",
+        "版本10.15.2": "版本十点十五点二",
+        "价格3.5元": "价格三点五元",
+    }
+    for text, expected in cases.items():
+        print(f"{text} -> {_frontend.normalize(text)}")
+        assert _frontend.normalize(text) == expected
+    assert "负" not in _frontend.normalize("型号A-1")
+
+
+def main():
+    print("=" * 60)
+    print("文本前端测试")
+    print("=" * 60)
+    test_read_integer()
+    test_fractions()
+    test_long_numbers()
+    test_hyphen_and_versions()
+    print("\n全部通过")
+
+
+if __name__ == "__main__":
+    main()